@@ -0,0 +1,253 @@
+"""Throughput benchmarks for the video engine.
+
+Writes deterministic synthetic videos with cv2.VideoWriter, then times trim,
+resize (every interpolation), FPS change and frame extraction (every image
+format) on them through videoEngine.run_job, the same path the GUI and the
+headless CLI use. Results are JSON: frames/sec and peak RSS per case, plus
+enough about the machine to know which runs are comparable.
+
+    python benchmark.py -o baseline.json
+    python benchmark.py --full -o after.json --compare baseline.json
+
+Each case runs in a fresh process so its peak RSS is its own; --in-process
+skips that (faster, but peak RSS then only ever grows).
+"""
+import argparse
+import contextlib
+import json
+import multiprocessing
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+from dataclasses import asdict, dataclass
+from datetime import datetime
+
+import cv2
+import numpy as np
+
+from videoEngine import IMAGE_FORMATS, INTERPOLATIONS, ExtractJob, ProcessJob, run_job
+
+RESULTS_VERSION = 1
+CODEC_EXTENSIONS = {'mp4v': '.mp4', 'MJPG': '.avi', 'XVID': '.avi'}
+OPERATIONS = ['trim', 'resize', 'fps', 'extract']
+QUICK = {'resolutions': ['320x240', '1280x720'], 'frames': [90], 'codecs': ['mp4v']}
+FULL = {'resolutions': ['320x240', '1280x720', '1920x1080'], 'frames': [90, 300], 'codecs': list(CODEC_EXTENSIONS)}
+EXTRACT_MAX_FRAMES = 60 # Extraction is dominated by image encoding; a prefix is enough
+SOURCE_FPS = 30.0
+
+
+@dataclass
+class Case:
+    op: str
+    variant: str # Interpolation, image format, or '' for trim and fps
+    resolution: str # 'WxH'
+    frames: int
+    codec: str
+
+    @property
+    def name(self):
+        op = f"{self.op}-{self.variant}" if self.variant else self.op
+        return f"{op}/{self.resolution}/{self.frames}f/{self.codec}"
+
+
+def parse_resolution(text):
+    width, height = (int(v) for v in text.lower().split('x'))
+    return width, height
+
+
+def synthetic_video_path(workdir, resolution, frames, codec):
+    return os.path.join(workdir, f"src_{resolution}_{frames}_{codec}{CODEC_EXTENSIONS[codec]}")
+
+
+def write_synthetic_video(path, size, frames, codec, fps=SOURCE_FPS):
+    """A moving gradient with a bouncing box and the frame number: fully deterministic, and
+    compressible like real footage rather than like noise."""
+    width, height = size
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*codec), fps, size)
+    if not writer.isOpened(): raise IOError(f"Codec {codec} cannot write {path}")
+    x = np.arange(width, dtype=np.uint16)[None, :]
+    y = np.arange(height, dtype=np.uint16)[:, None]
+    box = max(8, min(width, height) // 6)
+    try:
+        for i in range(frames):
+            frame = np.empty((height, width, 3), np.uint8)
+            frame[..., 0] = ((x + 3 * i) * 255 // max(1, width)) & 0xFF
+            frame[..., 1] = ((y + 2 * i) * 255 // max(1, height)) & 0xFF
+            frame[..., 2] = ((x + y + 5 * i) // 2) & 0xFF
+            bx = (7 * i) % max(1, width - box)
+            by = (5 * i) % max(1, height - box)
+            frame[by:by + box, bx:bx + box] = (255, 255, 255)
+            cv2.putText(frame, str(i), (8, height - 8), cv2.FONT_HERSHEY_SIMPLEX, max(0.4, height / 480), (0, 0, 0), 2)
+            writer.write(frame)
+    finally:
+        writer.release()
+    return path
+
+
+def build_cases(resolutions, frame_counts, codecs, operations):
+    cases = []
+    for resolution in resolutions:
+        for frames in frame_counts:
+            for codec in codecs:
+                for op in operations:
+                    variants = {'resize': list(INTERPOLATIONS), 'extract': IMAGE_FORMATS}.get(op, [''])
+                    cases.extend(Case(op, variant, resolution, frames, codec) for variant in variants)
+    return cases
+
+
+def job_for_case(case, source, out_dir):
+    """The ProcessJob or ExtractJob a case times, writing below ``out_dir``."""
+    width, height = parse_resolution(case.resolution)
+    out_path = os.path.join(out_dir, 'out' + CODEC_EXTENSIONS[case.codec])
+    duration = case.frames / SOURCE_FPS
+    if case.op == 'trim': return ProcessJob(source, out_path, start_sec=duration / 4, end_sec=duration * 3 / 4)
+    if case.op == 'resize':
+        return ProcessJob(source, out_path, width=max(2, width // 2), height=max(2, height // 2), interpolation=case.variant)
+    if case.op == 'fps': return ProcessJob(source, out_path, output_fps=SOURCE_FPS / 2)
+    return ExtractJob(source, os.path.join(out_dir, 'frames'), 0, min(case.frames, EXTRACT_MAX_FRAMES) - 1, case.variant)
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process in MiB, or None where it cannot be read."""
+    try:
+        import resource
+    except ImportError: # Windows
+        try:
+            import psutil
+            return psutil.Process().memory_info().peak_wset / 2**20
+        except (ImportError, AttributeError):
+            return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 2**20 if sys.platform == 'darwin' else peak / 2**10 # Bytes on macOS, KiB elsewhere
+
+
+def run_case(case, source, repeat=1):
+    """Runs ``case`` ``repeat`` times and returns its result dict (best time of the repeats)."""
+    best = None
+    frames = 0
+    for _ in range(max(1, repeat)):
+        out_dir = tempfile.mkdtemp(prefix='cropvideo_bench_')
+        try:
+            job = job_for_case(case, source, out_dir)
+            with contextlib.redirect_stdout(sys.stderr): # Engine log lines must not end up in the JSON
+                start = time.perf_counter()
+                frames = run_job(job)
+                seconds = time.perf_counter() - start
+        finally:
+            shutil.rmtree(out_dir, ignore_errors=True)
+        best = seconds if best is None else min(best, seconds)
+    result = asdict(case)
+    result.update(name=case.name, output_frames=frames, seconds=round(best, 4),
+                  fps=round(frames / best, 2) if best > 0 else None, peak_rss_mb=peak_rss_mb())
+    if result['peak_rss_mb'] is not None: result['peak_rss_mb'] = round(result['peak_rss_mb'], 1)
+    return result
+
+
+def _run_case_isolated(case_fields, source, repeat):
+    return run_case(Case(**case_fields), source, repeat)
+
+
+def machine_info():
+    return {'platform': platform.platform(), 'python': platform.python_version(), 'opencv': cv2.__version__,
+            'numpy': np.__version__, 'cpu_count': os.cpu_count(), 'opencv_threads': cv2.getNumThreads()}
+
+
+def run_benchmarks(cases, workdir, repeat=1, isolate=True, log=print):
+    """Creates the synthetic sources in ``workdir`` and runs ``cases``; returns the results document."""
+    sources = {}
+    for case in cases:
+        key = (case.resolution, case.frames, case.codec)
+        if key in sources: continue
+        path = synthetic_video_path(workdir, *key)
+        if not os.path.exists(path): write_synthetic_video(path, parse_resolution(case.resolution), case.frames, case.codec)
+        sources[key] = path
+
+    results = []
+    pool = multiprocessing.get_context('spawn').Pool(1, maxtasksperchild=1) if isolate else None
+    try:
+        for n, case in enumerate(cases, 1):
+            source = sources[(case.resolution, case.frames, case.codec)]
+            try:
+                if pool: result = pool.apply(_run_case_isolated, (asdict(case), source, repeat))
+                else: result = run_case(case, source, repeat)
+            except Exception as e:
+                result = dict(asdict(case), name=case.name, error=str(e))
+            results.append(result)
+            if 'error' in result: log(f"[{n}/{len(cases)}] {case.name}: {result['error']}")
+            else: log(f"[{n}/{len(cases)}] {case.name}: {result['fps']} fps, peak RSS {result['peak_rss_mb']} MiB")
+    finally:
+        if pool: pool.close(); pool.join()
+    return {'version': RESULTS_VERSION, 'created': datetime.now().isoformat(timespec='seconds'),
+            'machine': machine_info(), 'repeat': repeat, 'results': results}
+
+
+def compare_results(baseline, current, tolerance=0.10):
+    """Pairs cases by name. Returns ``(rows, regressions)``; a regression is a case whose
+    fps dropped by more than ``tolerance`` (a fraction) against the baseline."""
+    before = {r['name']: r for r in baseline.get('results', []) if r.get('fps')}
+    rows, regressions = [], []
+    for result in current['results']:
+        old = before.get(result['name'])
+        if not old or not result.get('fps'): continue
+        ratio = result['fps'] / old['fps']
+        rows.append((result['name'], old['fps'], result['fps'], ratio))
+        if ratio < 1 - tolerance: regressions.append(result['name'])
+    return rows, regressions
+
+
+def build_arg_parser():
+    parser = argparse.ArgumentParser(description="Benchmark videoEngine throughput on synthetic videos.")
+    parser.add_argument('--full', action='store_true', help="All resolutions, lengths and codecs (slow)")
+    parser.add_argument('--resolutions', help="Comma separated WxH list, e.g. 640x360,1920x1080")
+    parser.add_argument('--frames', help="Comma separated source lengths in frames")
+    parser.add_argument('--codecs', help=f"Comma separated FourCCs out of {', '.join(CODEC_EXTENSIONS)}")
+    parser.add_argument('--ops', default=','.join(OPERATIONS), help="Comma separated operations to time")
+    parser.add_argument('--repeat', type=int, default=1, help="Runs per case; the fastest counts")
+    parser.add_argument('--workdir', help="Keep the synthetic sources here (reused by later runs)")
+    parser.add_argument('--in-process', action='store_true', help="Do not start a fresh process per case")
+    parser.add_argument('-o', '--output', help="Write the JSON results to this file instead of stdout")
+    parser.add_argument('--compare', metavar='BASELINE', help="Results JSON to compare against")
+    parser.add_argument('--tolerance', type=float, default=0.10,
+                        help="With --compare, the fps drop (fraction) counted as a regression")
+    return parser
+
+
+def main(argv=None):
+    args = build_arg_parser().parse_args(argv)
+    matrix = FULL if args.full else QUICK
+    resolutions = args.resolutions.split(',') if args.resolutions else matrix['resolutions']
+    frame_counts = [int(v) for v in args.frames.split(',')] if args.frames else matrix['frames']
+    codecs = args.codecs.split(',') if args.codecs else matrix['codecs']
+    operations = args.ops.split(',')
+    unknown = [c for c in codecs if c not in CODEC_EXTENSIONS] + [o for o in operations if o not in OPERATIONS]
+    if unknown: print(f"Unknown codec or operation: {', '.join(unknown)}", file=sys.stderr); return 2
+    cases = build_cases(resolutions, frame_counts, codecs, operations)
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix='cropvideo_bench_src_')
+    os.makedirs(workdir, exist_ok=True)
+    log = lambda line: print(line, file=sys.stderr, flush=True)
+    try:
+        document = run_benchmarks(cases, workdir, args.repeat, not args.in_process, log)
+    finally:
+        if not args.workdir: shutil.rmtree(workdir, ignore_errors=True)
+
+    text = json.dumps(document, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f: f.write(text + '\n')
+    else:
+        print(text)
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f: baseline = json.load(f)
+        rows, regressions = compare_results(baseline, document, args.tolerance)
+        for name, old_fps, new_fps, ratio in rows:
+            log(f"{name}: {old_fps} -> {new_fps} fps ({(ratio - 1) * 100:+.1f}%){'  REGRESSION' if name in regressions else ''}")
+        if regressions: return 1
+    return 1 if any('error' in r for r in document['results']) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,12 +1,26 @@
 import tkinter as tk
 from tkinter import ttk, filedialog, messagebox
-import cv2
 import threading
+import multiprocessing
 import os
+import sys
+import argparse
 import webbrowser
-from datetime import timedelta
-import math
 import locale # For potential number formatting
+import time
+import re
+from dataclasses import replace
+import cv2
+from PIL import Image, ImageTk
+from videoEngine import (format_time, time_str_to_seconds, JobError, ProcessJob, ExtractJob, INTERPOLATIONS,
+                         parse_aspect, lock_aspect, largest_centered_crop, parse_rendition, parse_filter,
+                         Rotate, Flip, Levels, Grayscale, IMAGE_FORMATS, ENCODER_PRESETS, FRAME_CONTAINERS,
+                         CHECKPOINT_FILE, frame_output_path, ProgressTracker, ProbeCache, default_worker_count, default_cache_dir,
+                         probe_video, load_frame_index, plan_video_processing, plan_frame_extraction,
+                         process_video, extract_frames, expand_inputs, JobQueue, StageTimer, PreviewDecoder,
+                         thumbnail_frames, thumbnail_strip, SceneDetection, SCENE_THRESHOLDS, detect_scenes,
+                         FrameDedup, PERCEPTUAL_HASHES, DEDUP_MAP_FILE,
+                         scene_output_path, range_output_path, parse_seconds, parse_time_ranges)
 
 # --- Language Dictionary ---
 LANGUAGES = {
@@ -19,6 +33,10 @@ LANGUAGES = {
         'resolution_label': "Resolution:",
         'fps_label': "FPS:",
         'frames_label': "Total Frames:",
+        'use_frame_index': "Exact frame index (scans the file once, then reused)",
+        'frames_exact': "(exact)",
+        'set_start_button': "Set Start",
+        'set_end_button': "Set End",
         'na': "N/A",
         'error': "Error",
         'warning': "Warning",
@@ -33,6 +51,24 @@ LANGUAGES = {
         'height_label': "Target Height:",
         'fps_change_frame': "FPS Change (Output)", # No longer a frame label
         'enable_fps_change': "Enable FPS Change",
+        'enable_spatial_crop': "Enable Spatial Crop (region of the frame)",
+        'crop_x_label': "X:",
+        'crop_y_label': "Y:",
+        'crop_w_label': "Width:",
+        'crop_h_label': "Height:",
+        'crop_lock_aspect': "Lock aspect",
+        'crop_aspects': ["Source", "16:9", "4:3", "1:1", "9:16"],
+        'crop_center_button': "Center",
+        'filters_label': "Filters (also applied to extracted frames):",
+        'rotate_label': "Rotate:",
+        'flip_h_label': "Mirror",
+        'flip_v_label': "Flip vertically",
+        'grayscale_label': "Grayscale",
+        'brightness_label': "Brightness:",
+        'contrast_label': "Contrast:",
+        'renditions_label': "Extra outputs:",
+        'renditions_hint': "e.g. 1280x720, 854x480@15",
+        'extract_same_pass': "Also extract frames in the same pass (frame extraction settings)",
         'output_fps_label': "Output FPS:",
         'output_video_frame': "Output Video File", # Changed key slightly
         'save_as_button': "Save As...",
@@ -49,6 +85,7 @@ LANGUAGES = {
         'extracting': "Extracting frame",
         'of': "of",
         'frames': "frames",
+        'progress_detail': "{:.1f}% - {:.1f} fps - ETA {}",
         'complete_process': "Video processing complete! Output saved to",
         'complete_extract': "Frame extraction complete! Frames saved to",
         'error_loading': "Failed to load video info:",
@@ -57,7 +94,8 @@ LANGUAGES = {
         'error_input_file': "Please select a valid input video file.",
         'error_output_file': "Please specify an output video file path for processing.", # Added context
         'error_output_dir': "Please select a valid output directory for frames.",
-        'error_no_op_video': "Please enable Time Crop, Resizing, or FPS Change to process video.", # Changed
+        'error_no_op_video': "Nothing to do: enable a time crop or cut list, resizing, an FPS change, a crop, a filter, "
+                             "extra outputs, frame extraction in the same pass or splitting into scenes.",
         'error_no_op_frames': "No frame range specified for extraction.", # Changed message
         # 'error_both_ops': "Cannot enable both Video Processing and Frame Extraction simultaneously. Please choose one.", # No longer needed
         'error_invalid_time': "Invalid time format. Use HH:MM:SS or HH:MM:SS.ms",
@@ -68,6 +106,24 @@ LANGUAGES = {
         'error_invalid_res_int': "Target Width and Height must be integers.",
         'error_invalid_res_positive': "Target Width and Height must be positive.",
         'error_invalid_fps_format': "Output FPS must be a valid number.",
+        'error_invalid_interpolation': "Unknown interpolation method: {}",
+        'error_invalid_crop': "The crop region must have a positive size and lie inside the {} frame.",
+        'error_invalid_crop_int': "Crop X, Y, Width and Height must be integers.",
+        'error_invalid_rendition': "Extra outputs are comma separated WxH, WxH@FPS or @FPS, each optionally followed by =file:",
+        'error_output_clash': "Two outputs of the job would write to the same file: {}",
+        'error_invalid_filter': "This filter cannot be applied here: {}",
+        'error_invalid_levels': "Brightness and contrast must be numbers.",
+        'error_invalid_encoding': "Invalid image encoder settings: {}",
+        'error_invalid_container': "Unknown frame container: {}",
+        'error_resume_container': "Frames stored in a {} archive cannot be resumed; save them as image files or npy.",
+        'error_invalid_scene_detection': "Invalid scene detection settings: {}",
+        'error_invalid_dedup': "Invalid duplicate frame settings: {}",
+        'error_resume_dedup': "Skipping near-duplicate frames cannot be combined with resuming.",
+        'error_split_outputs': "Splitting into scenes cannot be combined with extra outputs or frame extraction in the same pass.",
+        'error_resume_combination': "Resuming cannot be combined with extra outputs, frame extraction in the same pass, scene splitting or a cut list.",
+        'error_resume_needs_ffmpeg': "Resuming a job of more than one segment (over 9000 frames, or with segment workers) needs ffmpeg on PATH to join the segments without re-encoding them.",
+        'error_ranges_combination': "A cut list cannot be combined with start/end times, scene splitting, extra outputs or frame extraction in the same pass.",
+        'error_invalid_cut_list': "The cut list must be START-END time ranges separated by commas, e.g. 00:00:10-00:00:20, 75-90.5",
         'error_invalid_fps_positive': "Output FPS must be a positive number.",
         'error_invalid_frame_int': "Start and End frame numbers must be integers.",
         'error_invalid_frame_positive': "Frame numbers must be non-negative.",
@@ -85,6 +141,40 @@ LANGUAGES = {
         'output_dir_label': "Output Directory:",
         'browse_dir_button': "Browse...",
         'img_format_label': "Image Format:",
+        'sampling_label': "Sampling:",
+        'sampling_modes': ["Every frame", "Every N frames", "Every T seconds", "Keyframes only", "First frame of each scene",
+                           "Frames listed in N / T (e.g. 12,40,300)"],
+        'sampling_value_label': "N / T:",
+        'encoder_label': "Encoding:",
+        'encoder_presets': ["Default", "Fastest (larger files)", "Smallest (slower)"],
+        'container_label': "Save as:",
+        'containers': ["Image files", "One .tar archive", "One .zip archive", "NumPy array (.npy, raw frames)"], # Same order as FRAME_CONTAINERS
+        'error_invalid_sampling': "Frame step must be a positive integer and the interval a positive number of seconds.",
+        'batch_button': "Batch Queue...",
+        'resume_label': "Resume if interrupted",
+        'split_scenes_label': "Split into one file per scene",
+        'cut_list_label': "Cut list:",
+        'split_ranges_label': "One file per range",
+        'dedup_label': "Skip near-duplicate frames",
+        'batch_title': "Batch Queue",
+        'batch_add_files': "Add Files...",
+        'batch_pattern_label': "Pattern:",
+        'batch_add_pattern': "Add",
+        'batch_clear': "Clear",
+        'batch_task_label': "Task:",
+        'batch_tasks': ["Process video", "Extract frames"],
+        'batch_jobs_label': "Concurrent jobs:",
+        'batch_start': "Start",
+        'batch_cancel': "Cancel",
+        'batch_hint': "Each input uses the settings of the main window; outputs are written next to it (_processed / _frames).",
+        'batch_col_file': "File",
+        'batch_col_status': "Status",
+        'batch_col_progress': "Progress",
+        'batch_statuses': {'queued': "Queued", 'running': "Running", 'done': "Done", 'failed': "Failed", 'cancelled': "Cancelled"},
+        'batch_summary': "Batch finished: {} done, {} failed, {} cancelled",
+        'error_batch_empty': "Add at least one input file to the queue.",
+        'error_invalid_jobs': "Concurrent jobs must be a positive integer.",
+        'error_batch_output_clash': "Several inputs would write to the same output:",
         'github_link': "https://github.com/dependon/CropVideo"
     },
     'zh': {
@@ -96,6 +186,10 @@ LANGUAGES = {
         'resolution_label': "分辨率:",
         'fps_label': "帧率:",
         'frames_label': "总帧数:",
+        'use_frame_index': "精确帧索引 (扫描一次文件，之后复用)",
+        'frames_exact': "(精确)",
+        'set_start_button': "设为开始",
+        'set_end_button': "设为结束",
         'na': "不可用",
         'error': "错误",
         'warning': "警告",
@@ -112,6 +206,24 @@ LANGUAGES = {
         'height_label': "目标高度:",
         'fps_change_frame': "帧率变更 (输出)",
         'enable_fps_change': "启用帧率变更",
+        'enable_spatial_crop': "启用画面裁剪 (帧内区域)",
+        'crop_x_label': "X:",
+        'crop_y_label': "Y:",
+        'crop_w_label': "宽度:",
+        'crop_h_label': "高度:",
+        'crop_lock_aspect': "锁定宽高比",
+        'crop_aspects': ["原始", "16:9", "4:3", "1:1", "9:16"],
+        'crop_center_button': "居中",
+        'filters_label': "滤镜 (同样用于提取的帧):",
+        'rotate_label': "旋转:",
+        'flip_h_label': "水平镜像",
+        'flip_v_label': "垂直翻转",
+        'grayscale_label': "灰度",
+        'brightness_label': "亮度:",
+        'contrast_label': "对比度:",
+        'renditions_label': "附加输出:",
+        'renditions_hint': "例如 1280x720, 854x480@15",
+        'extract_same_pass': "同时在同一遍解码中提取帧 (使用帧提取设置)",
         'output_fps_label': "输出帧率:",
         'output_video_frame': "输出视频文件", # Changed key slightly
         'save_as_button': "另存为...",
@@ -127,6 +239,7 @@ LANGUAGES = {
         'extracting': "正在提取第",
         'of': "帧 (共",
         'frames': "帧)",
+        'progress_detail': "{:.1f}% - {:.1f} 帧/秒 - 剩余 {}",
         'complete_process': "视频处理完成! 输出已保存至",
         'complete_extract': "帧提取完成! 帧已保存至",
         'error_loading': "加载视频信息失败:",
@@ -135,7 +248,8 @@ LANGUAGES = {
         'error_input_file': "请选择一个有效的输入视频文件。",
         'error_output_file': "请指定用于视频处理的输出文件路径。", # Added context
         'error_output_dir': "请选择一个有效的帧输出目录。",
-        'error_no_op_video': "请至少启用时间裁剪、调整大小或帧率变更中的一项来处理视频。", # Changed
+        'error_no_op_video': "没有可执行的处理：请至少启用时间裁剪或剪辑列表、调整大小、帧率变更、画面裁剪、滤镜、"
+                             "附加输出、同一遍的帧提取或按场景拆分中的一项。",
         'error_no_op_frames': "未指定用于提取的帧范围。", # Changed message
         # 'error_both_ops': "无法同时启用视频处理和帧提取。请选择其中一项。", # No longer needed
         'error_invalid_time': "无效的时间格式。请使用 HH:MM:SS 或 HH:MM:SS.ms",
@@ -146,6 +260,24 @@ LANGUAGES = {
         'error_invalid_res_int': "目标宽度和高度必须是整数。",
         'error_invalid_res_positive': "目标宽度和高度必须为正数。",
         'error_invalid_fps_format': "输出帧率必须是一个有效的数字。",
+        'error_invalid_interpolation': "未知的插值方法: {}",
+        'error_invalid_crop': "裁剪区域的尺寸必须为正，并且位于 {} 的画面之内。",
+        'error_invalid_crop_int': "裁剪的 X、Y、宽度和高度必须是整数。",
+        'error_invalid_rendition': "附加输出以逗号分隔, 每项为 宽x高、宽x高@帧率 或 @帧率, 可在后面加 =文件:",
+        'error_output_clash': "任务的两个输出会写入同一个文件: {}",
+        'error_invalid_filter': "无法在此应用该滤镜: {}",
+        'error_invalid_levels': "亮度和对比度必须是数字。",
+        'error_invalid_encoding': "图片编码参数无效: {}",
+        'error_invalid_container': "未知的帧保存方式: {}",
+        'error_resume_container': "保存在 {} 归档中的帧无法继续提取, 请保存为图片文件或 npy。",
+        'error_invalid_scene_detection': "场景检测参数无效: {}",
+        'error_invalid_dedup': "重复帧参数无效: {}",
+        'error_resume_dedup': "跳过近似重复帧不能与中断后继续同时使用。",
+        'error_split_outputs': "按场景拆分不能与附加输出或同一遍的帧提取同时使用。",
+        'error_resume_combination': "中断后继续不能与附加输出、同一遍的帧提取、按场景拆分或剪辑列表同时使用。",
+        'error_resume_needs_ffmpeg': "超过一段（多于 9000 帧，或使用分段进程）的任务要中断后继续，需要 PATH 中有 ffmpeg，才能不重新编码地合并各段。",
+        'error_ranges_combination': "剪辑列表不能与开始/结束时间、按场景拆分、附加输出或同一遍的帧提取同时使用。",
+        'error_invalid_cut_list': "剪辑列表必须是以逗号分隔的 开始-结束 时间段，例如 00:00:10-00:00:20, 75-90.5",
         'error_invalid_fps_positive': "输出帧率必须为正数。",
         'error_invalid_frame_int': "开始和结束帧号必须是整数。",
         'error_invalid_frame_positive': "帧号必须是非负数。",
@@ -163,57 +295,53 @@ LANGUAGES = {
         'output_dir_label': "输出目录:",
         'browse_dir_button': "浏览...",
         'img_format_label': "图片格式:",
+        'sampling_label': "采样方式:",
+        'sampling_modes': ["每一帧", "每 N 帧", "每 T 秒", "仅关键帧", "每个场景的第一帧", "N / T 中列出的帧 (如 12,40,300)"],
+        'sampling_value_label': "N / T:",
+        'encoder_label': "编码:",
+        'encoder_presets': ["默认", "最快 (文件较大)", "最小 (较慢)"],
+        'container_label': "保存为:",
+        'containers': ["图片文件", "单个 .tar 归档", "单个 .zip 归档", "NumPy 数组 (.npy, 原始帧)"],
+        'error_invalid_sampling': "帧间隔必须是正整数，时间间隔必须是正数（秒）。",
+        'batch_button': "批量队列...",
+        'resume_label': "中断后可继续",
+        'split_scenes_label': "按场景拆分为多个文件",
+        'cut_list_label': "剪辑列表:",
+        'split_ranges_label': "每个时间段一个文件",
+        'dedup_label': "跳过近似重复的帧",
+        'batch_title': "批量队列",
+        'batch_add_files': "添加文件...",
+        'batch_pattern_label': "匹配模式:",
+        'batch_add_pattern': "添加",
+        'batch_clear': "清空",
+        'batch_task_label': "任务:",
+        'batch_tasks': ["处理视频", "提取帧"],
+        'batch_jobs_label': "并发任务数:",
+        'batch_start': "开始",
+        'batch_cancel': "取消",
+        'batch_hint': "每个输入使用主窗口的设置，输出保存在输入文件旁 (_processed / _frames)。",
+        'batch_col_file': "文件",
+        'batch_col_status': "状态",
+        'batch_col_progress': "进度",
+        'batch_statuses': {'queued': "排队中", 'running': "运行中", 'done': "完成", 'failed': "失败", 'cancelled': "已取消"},
+        'batch_summary': "批量处理结束: {} 个完成, {} 个失败, {} 个取消",
+        'error_batch_empty': "请至少向队列添加一个输入文件。",
+        'error_invalid_jobs': "并发任务数必须是正整数。",
+        'error_batch_output_clash': "多个输入会写入同一个输出:",
         'github_link': "https://github.com/dependon/CropVideo"
     }
 }
 
 
-# --- Helper Functions ---
-
-def format_time(seconds):
-    """Converts seconds to HH:MM:SS.ms format accurately using integer math."""
-    if seconds is None or math.isnan(seconds) or seconds < 0:
-        seconds = 0
-    try:
-        # Create timedelta object
-        delta = timedelta(seconds=seconds)
-
-        # Extract total days, remaining seconds, and microseconds
-        days = delta.days
-        secs = delta.seconds
-        microsecs = delta.microseconds
-
-        # Calculate total hours, minutes, seconds
-        total_hours = days * 24 + secs // 3600
-        total_minutes = (secs % 3600) // 60
-        total_seconds = secs % 60
-        total_milliseconds = microsecs // 1000
-
-        return f"{int(total_hours):02}:{int(total_minutes):02}:{int(total_seconds):02}.{int(total_milliseconds):03}"
-    except OverflowError:
-         # Handle potential overflow for extremely large second values if necessary
-         print(f"Warning: format_time encountered very large number: {seconds}")
-         return "00:00:00.000" # Or some other indicator
-
-
-def time_str_to_seconds(time_str):
-    """Converts HH:MM:SS or HH:MM:SS.ms string to seconds"""
-    if not time_str: return None
-    try:
-        parts = time_str.split(':')
-        if len(parts) != 3: return None
-        seconds_parts = parts[2].split('.')
-        sec = int(seconds_parts[0])
-        ms = int(seconds_parts[1]) if len(seconds_parts) > 1 else 0
-        if len(seconds_parts) > 1 and len(seconds_parts[1]) > 3:
-             ms = int(seconds_parts[1][:3])
-        # Ensure components are non-negative after parsing
-        if sec < 0 or ms < 0 or int(parts[0]) < 0 or int(parts[1]) < 0:
-             return None # Or raise ValueError
-        total_seconds = int(parts[0]) * 3600 + int(parts[1]) * 60 + sec + ms / 1000.0
-        return total_seconds
-    except Exception:
-        return None
+PROGRESS_POLL_MS = 100 # UI refresh rate for worker progress (10 Hz)
+TRACE_DIR_ENV = 'CROPVIDEO_TRACE_DIR' # When set, every job saves stage timings and a trace there
+PROBE_CACHE_FILE = 'probe.json' # Inside default_cache_dir()
+SAMPLING_MODES = ['all', 'every_n', 'every_sec', 'keyframes', 'scenes', 'list'] # Same order as LANGUAGES 'sampling_modes'
+ENCODER_PRESET_NAMES = list(ENCODER_PRESETS) # Same order as LANGUAGES 'encoder_presets'
+PREVIEW_SIZE = (240, 135) # Preview frames are scaled down to fit this box
+THUMBNAIL_HEIGHT = 40 # Filmstrip under the input path
+THUMBNAIL_GAP = 2
+THUMBNAIL_MAX = 16
 
 # --- Main Application Class ---
 
@@ -297,28 +425,72 @@ class VideoProcessorApp:
 
         self.enable_fps_change = tk.BooleanVar(value=False)
         self.output_fps_str = tk.StringVar(value="0")
+        self.enable_spatial_crop = tk.BooleanVar(value=False)
+        self.crop_x_str = tk.StringVar(value="0")
+        self.crop_y_str = tk.StringVar(value="0")
+        self.crop_w_str = tk.StringVar(value="0")
+        self.crop_h_str = tk.StringVar(value="0")
+        self.crop_lock_aspect = tk.BooleanVar(value=False)
+        self._locking_aspect = False # Guards the width/height traces against each other
+        self.rotate_var = tk.StringVar(value="0")
+        self.flip_h_var = tk.BooleanVar(value=False)
+        self.flip_v_var = tk.BooleanVar(value=False)
+        self.grayscale_var = tk.BooleanVar(value=False)
+        self.brightness_str = tk.StringVar(value="0")
+        self.contrast_str = tk.StringVar(value="1.0")
+        self.renditions_str = tk.StringVar(value="")
+        self.extract_same_pass = tk.BooleanVar(value=False)
 
         self.enable_frame_extract = tk.BooleanVar(value=False) # Keep for enabling controls
+        self.resume_var = tk.BooleanVar(value=False)
+        self.split_scenes_var = tk.BooleanVar(value=False)
+        self.cut_list_str = tk.StringVar(value="") # START-END ranges kept instead of the start/end time
+        self.split_ranges_var = tk.BooleanVar(value=False)
+        self.dedup_var = tk.BooleanVar(value=False)
         self.start_frame_str = tk.StringVar(value="0")
         self.end_frame_str = tk.StringVar(value="0")
         self.image_format_var = tk.StringVar(value="png")
+        self.sampling_mode_var = tk.StringVar()
+        self.sampling_value_str = tk.StringVar(value="1")
+        self.encoder_preset_var = tk.StringVar()
+        self.container_var = tk.StringVar()
 
         self.status_text = tk.StringVar(value=f"{self.texts['status_label']} {self.texts['idle']}")
         self.progress_var = tk.DoubleVar(value=0.0)
         self.processing_active = False
+        self.progress = ProgressTracker() # Written by workers, polled by _poll_progress
+        self.progress_status_key = 'processing'
 
-        self.video_capture = None
         self.video_duration_sec = 0
         self.video_fps = 0
         self.video_width = 0
         self.video_height = 0
         self.total_frames = 0
+        self.probe_cache = ProbeCache(os.path.join(default_cache_dir(), PROBE_CACHE_FILE))
+        self.use_frame_index = tk.BooleanVar(value=False)
+        self.frame_index = None # FrameIndex of frame_index_path, built in the background
+        self.frame_index_path = None
+        self.batch_window = None
+        self.preview = None # PreviewDecoder of the loaded input
+        self.preview_frame_var = tk.DoubleVar(value=0)
+        self.preview_time_str = tk.StringVar(value="")
+        self._preview_photo = None # Keeps the shown PhotoImage alive
+        self._preview_shown = None
+        self.thumbnail_stop = None # threading.Event of the filmstrip being generated
+        self._thumbnail_photos = {}
+        self._thumbnail_frames = []
+        self._thumbnail_step = 0
 
         # Link checkboxes to update widget states
         self.enable_time_crop.trace_add("write", self.update_widget_states)
         self.enable_res_scale.trace_add("write", self.update_widget_states)
         self.enable_fps_change.trace_add("write", self.update_widget_states)
+        self.enable_spatial_crop.trace_add("write", self.update_widget_states)
+        self.crop_w_str.trace_add("write", lambda *_: self._apply_crop_aspect('width'))
+        self.crop_h_str.trace_add("write", lambda *_: self._apply_crop_aspect('height'))
+        self.crop_lock_aspect.trace_add("write", lambda *_: self._apply_crop_aspect('width'))
         self.enable_frame_extract.trace_add("write", self.update_widget_states)
+        self.use_frame_index.trace_add("write", lambda *_: self._request_frame_index())
 
         # --- UI Layout ---
         self.main_frame = ttk.Frame(root, padding="15")
@@ -358,6 +530,9 @@ class VideoProcessorApp:
         self.input_browse_button = ttk.Button(self.input_frame, text=self.texts['browse_button'], command=self.browse_input,
                                            style='Accent.TButton')
         self.input_browse_button.grid(row=0, column=2, sticky=tk.E, padx=WIDGET_PADX, pady=WIDGET_PADY)
+        self.thumbnail_canvas = tk.Canvas(self.input_frame, height=THUMBNAIL_HEIGHT, highlightthickness=0) # Filmstrip; click to seek
+        self.thumbnail_canvas.grid(row=1, column=0, columnspan=3, sticky=(tk.W, tk.E), padx=WIDGET_PADX, pady=WIDGET_PADY)
+        self.thumbnail_canvas.bind('<Button-1>', self._on_thumbnail_click)
 
         # Video Info Section
         self.info_frame = ttk.LabelFrame(self.main_frame, text=self.texts['video_information'], padding=FRAME_PADDING)
@@ -370,6 +545,23 @@ class VideoProcessorApp:
         self.info_fps_label.grid(row=1, column=0, sticky=tk.W, padx=WIDGET_PADX, pady=WIDGET_PADY)
         self.info_frames_label = ttk.Label(self.info_frame, textvariable=self.original_frame_count_str)
         self.info_frames_label.grid(row=1, column=1, sticky=tk.W, padx=WIDGET_PADX, pady=WIDGET_PADY)
+        self.frame_index_check = ttk.Checkbutton(self.info_frame, text=self.texts['use_frame_index'], variable=self.use_frame_index)
+        self.frame_index_check.grid(row=2, column=0, columnspan=2, sticky=tk.W, padx=WIDGET_PADX, pady=WIDGET_PADY)
+        self.info_frame.columnconfigure(2, weight=1)
+        self.preview_label = ttk.Label(self.info_frame) # Shows the frame under the timeline cursor
+        self.preview_label.grid(row=0, column=2, rowspan=3, sticky=tk.E, padx=WIDGET_PADX, pady=WIDGET_PADY)
+        self.timeline_frame = ttk.Frame(self.info_frame)
+        self.timeline_frame.grid(row=3, column=0, columnspan=3, sticky=(tk.W, tk.E))
+        self.timeline_frame.columnconfigure(0, weight=1)
+        self.timeline_scale = ttk.Scale(self.timeline_frame, from_=0, to=0, variable=self.preview_frame_var, command=self._on_scrub)
+        self.timeline_scale.grid(row=0, column=0, sticky=(tk.W, tk.E), padx=WIDGET_PADX, pady=WIDGET_PADY)
+        ttk.Label(self.timeline_frame, textvariable=self.preview_time_str, width=12).grid(row=0, column=1, sticky=tk.W)
+        self.set_start_button = ttk.Button(self.timeline_frame, text=self.texts['set_start_button'],
+                                           command=lambda: self._set_trim_point(self.start_time_str))
+        self.set_start_button.grid(row=0, column=2, padx=(WIDGET_PADX, 2))
+        self.set_end_button = ttk.Button(self.timeline_frame, text=self.texts['set_end_button'],
+                                         command=lambda: self._set_trim_point(self.end_time_str))
+        self.set_end_button.grid(row=0, column=3, padx=(2, WIDGET_PADX))
 
         # --- Video Processing Options Frame ---
         self.video_processing_frame = ttk.LabelFrame(self.main_frame, text=self.texts['video_processing_options_frame'], padding="5")
@@ -389,6 +581,14 @@ class VideoProcessorApp:
         self.end_time_label.grid(row=1, column=2, sticky=tk.W, padx=5)
         self.end_time_entry = ttk.Entry(self.time_frame, textvariable=self.end_time_str, width=15, state=tk.DISABLED, font=('Arial', 10))
         self.end_time_entry.grid(row=1, column=3, sticky=tk.W, padx=5)
+        self.split_scenes_check = ttk.Checkbutton(self.time_frame, text=self.texts['split_scenes_label'], variable=self.split_scenes_var)
+        self.split_scenes_check.grid(row=2, column=0, columnspan=4, sticky=tk.W, padx=5, pady=(5, 0))
+        self.cut_list_label = ttk.Label(self.time_frame, text=self.texts['cut_list_label'])
+        self.cut_list_label.grid(row=3, column=0, sticky=tk.W, padx=5, pady=(5, 0))
+        self.cut_list_entry = ttk.Entry(self.time_frame, textvariable=self.cut_list_str, width=40, state=tk.DISABLED, font=('Arial', 10))
+        self.cut_list_entry.grid(row=3, column=1, columnspan=3, sticky=(tk.W, tk.E), padx=5, pady=(5, 0))
+        self.split_ranges_check = ttk.Checkbutton(self.time_frame, text=self.texts['split_ranges_label'], variable=self.split_ranges_var)
+        self.split_ranges_check.grid(row=4, column=0, columnspan=4, sticky=tk.W, padx=5, pady=(5, 0))
 
         # Resolution Scaling Controls
         self.res_frame = ttk.Frame(self.video_processing_frame, padding="5")
@@ -414,9 +614,58 @@ class VideoProcessorApp:
         self.fps_entry = ttk.Entry(self.fps_frame, textvariable=self.output_fps_str, width=10, state=tk.DISABLED)
         self.fps_entry.grid(row=1, column=1, sticky=tk.W, padx=5)
 
+        # Spatial Crop Controls
+        self.crop_frame = ttk.Frame(self.video_processing_frame, padding="5")
+        self.crop_frame.grid(row=3, column=0, columnspan=4, sticky=(tk.W, tk.E), pady=2)
+        self.crop_check = ttk.Checkbutton(self.crop_frame, text=self.texts['enable_spatial_crop'], variable=self.enable_spatial_crop)
+        self.crop_check.grid(row=0, column=0, columnspan=8, sticky=tk.W, padx=5, pady=(0, 5))
+        self.crop_entries = []
+        self.crop_labels = []
+        for column, (label_key, var) in enumerate([('crop_x_label', self.crop_x_str), ('crop_y_label', self.crop_y_str),
+                                                   ('crop_w_label', self.crop_w_str), ('crop_h_label', self.crop_h_str)]):
+            label = ttk.Label(self.crop_frame, text=self.texts[label_key])
+            label.grid(row=1, column=2 * column, sticky=tk.W, padx=5)
+            entry = ttk.Entry(self.crop_frame, textvariable=var, width=7, state=tk.DISABLED)
+            entry.grid(row=1, column=2 * column + 1, sticky=tk.W, padx=5)
+            self.crop_labels.append((label, label_key))
+            self.crop_entries.append(entry)
+        self.crop_lock_check = ttk.Checkbutton(self.crop_frame, text=self.texts['crop_lock_aspect'], variable=self.crop_lock_aspect)
+        self.crop_lock_check.grid(row=2, column=0, columnspan=2, sticky=tk.W, padx=5, pady=(5, 0))
+        self.crop_aspect_combo = ttk.Combobox(self.crop_frame, values=self.texts['crop_aspects'], state='readonly', width=8)
+        self.crop_aspect_combo.current(0)
+        self.crop_aspect_combo.grid(row=2, column=2, columnspan=2, sticky=tk.W, padx=5, pady=(5, 0))
+        self.crop_aspect_combo.bind('<<ComboboxSelected>>', lambda e: self._apply_crop_aspect('width'))
+        self.crop_center_button = ttk.Button(self.crop_frame, text=self.texts['crop_center_button'], command=self.center_crop)
+        self.crop_center_button.grid(row=2, column=4, columnspan=2, sticky=tk.W, padx=5, pady=(5, 0))
+
+        # Filter Controls (shared with frame extraction)
+        self.filters_frame = ttk.Frame(self.video_processing_frame, padding="5")
+        self.filters_frame.grid(row=4, column=0, columnspan=4, sticky=(tk.W, tk.E), pady=2)
+        self.filters_label = ttk.Label(self.filters_frame, text=self.texts['filters_label'])
+        self.filters_label.grid(row=0, column=0, columnspan=6, sticky=tk.W, padx=5, pady=(0, 5))
+        self.rotate_label = ttk.Label(self.filters_frame, text=self.texts['rotate_label'])
+        self.rotate_label.grid(row=1, column=0, sticky=tk.W, padx=5)
+        self.rotate_combo = ttk.Combobox(self.filters_frame, textvariable=self.rotate_var, values=["0", "90", "180", "270"],
+                                         state='readonly', width=5)
+        self.rotate_combo.grid(row=1, column=1, sticky=tk.W, padx=5)
+        self.flip_h_check = ttk.Checkbutton(self.filters_frame, text=self.texts['flip_h_label'], variable=self.flip_h_var)
+        self.flip_h_check.grid(row=1, column=2, sticky=tk.W, padx=5)
+        self.flip_v_check = ttk.Checkbutton(self.filters_frame, text=self.texts['flip_v_label'], variable=self.flip_v_var)
+        self.flip_v_check.grid(row=1, column=3, sticky=tk.W, padx=5)
+        self.grayscale_check = ttk.Checkbutton(self.filters_frame, text=self.texts['grayscale_label'], variable=self.grayscale_var)
+        self.grayscale_check.grid(row=1, column=4, sticky=tk.W, padx=5)
+        self.brightness_label = ttk.Label(self.filters_frame, text=self.texts['brightness_label'])
+        self.brightness_label.grid(row=2, column=0, sticky=tk.W, padx=5, pady=(5, 0))
+        self.brightness_entry = ttk.Entry(self.filters_frame, textvariable=self.brightness_str, width=7)
+        self.brightness_entry.grid(row=2, column=1, sticky=tk.W, padx=5, pady=(5, 0))
+        self.contrast_label = ttk.Label(self.filters_frame, text=self.texts['contrast_label'])
+        self.contrast_label.grid(row=2, column=2, sticky=tk.W, padx=5, pady=(5, 0))
+        self.contrast_entry = ttk.Entry(self.filters_frame, textvariable=self.contrast_str, width=7)
+        self.contrast_entry.grid(row=2, column=3, sticky=tk.W, padx=5, pady=(5, 0))
+
         # Output Video File Controls
         self.output_video_frame_widget = ttk.LabelFrame(self.video_processing_frame, text=self.texts['output_video_frame'], padding="10") # Renamed var
-        self.output_video_frame_widget.grid(row=3, column=0, columnspan=4, sticky=(tk.W, tk.E), pady=(10,5))
+        self.output_video_frame_widget.grid(row=5, column=0, columnspan=4, sticky=(tk.W, tk.E), pady=(10,5))
         self.output_video_frame_widget.columnconfigure(1, weight=1)
         self.output_file_label = ttk.Label(self.output_video_frame_widget, text=self.texts['file_label'])
         self.output_file_label.grid(row=0, column=0, sticky=tk.W, padx=5, pady=5)
@@ -425,6 +674,15 @@ class VideoProcessorApp:
         self.output_browse_button = ttk.Button(self.output_video_frame_widget, text=self.texts['save_as_button'], command=self.browse_output_video,
                                            style='Accent.TButton')
         self.output_browse_button.grid(row=0, column=2, sticky=tk.E, padx=5, pady=5)
+        self.renditions_label = ttk.Label(self.output_video_frame_widget, text=self.texts['renditions_label'])
+        self.renditions_label.grid(row=1, column=0, sticky=tk.W, padx=5, pady=5)
+        self.renditions_entry = ttk.Entry(self.output_video_frame_widget, textvariable=self.renditions_str, width=40)
+        self.renditions_entry.grid(row=1, column=1, sticky=(tk.W, tk.E), padx=5, pady=5)
+        self.renditions_hint_label = ttk.Label(self.output_video_frame_widget, text=self.texts['renditions_hint'])
+        self.renditions_hint_label.grid(row=1, column=2, sticky=tk.W, padx=5, pady=5)
+        self.extract_same_pass_check = ttk.Checkbutton(self.output_video_frame_widget, text=self.texts['extract_same_pass'],
+                                                       variable=self.extract_same_pass, state=tk.DISABLED)
+        self.extract_same_pass_check.grid(row=2, column=0, columnspan=3, sticky=tk.W, padx=5, pady=(0, 5))
 
         # --- Frame Extraction Options Frame ---
         self.frame_extract_options_frame = ttk.LabelFrame(self.main_frame, text=self.texts['frame_extract_options_frame'], padding="10")
@@ -452,10 +710,34 @@ class VideoProcessorApp:
         self.output_dir_button.grid(row=2, column=3, sticky=tk.E, padx=5, pady=5)
         self.img_format_label = ttk.Label(self.frame_extract_options_frame, text=self.texts['img_format_label'])
         self.img_format_label.grid(row=3, column=0, sticky=tk.W, padx=5, pady=5)
-        self.img_format_combo = ttk.Combobox(self.frame_extract_options_frame, textvariable=self.image_format_var, values=['png', 'jpg', 'bmp', 'tiff'], state='readonly', width=8)
+        self.img_format_combo = ttk.Combobox(self.frame_extract_options_frame, textvariable=self.image_format_var, values=IMAGE_FORMATS, state='readonly', width=8)
         self.img_format_combo.current(0)
         self.img_format_combo.config(state=tk.DISABLED)
         self.img_format_combo.grid(row=3, column=1, sticky=tk.W, padx=5, pady=5)
+        self.encoder_label = ttk.Label(self.frame_extract_options_frame, text=self.texts['encoder_label'])
+        self.encoder_label.grid(row=3, column=2, sticky=tk.W, padx=5, pady=5)
+        self.encoder_combo = ttk.Combobox(self.frame_extract_options_frame, textvariable=self.encoder_preset_var, values=self.texts['encoder_presets'], state='readonly', width=20)
+        self.encoder_combo.current(0)
+        self.encoder_combo.config(state=tk.DISABLED)
+        self.encoder_combo.grid(row=3, column=3, sticky=tk.W, padx=5, pady=5)
+        self.sampling_label = ttk.Label(self.frame_extract_options_frame, text=self.texts['sampling_label'])
+        self.sampling_label.grid(row=4, column=0, sticky=tk.W, padx=5, pady=5)
+        self.sampling_combo = ttk.Combobox(self.frame_extract_options_frame, textvariable=self.sampling_mode_var, values=self.texts['sampling_modes'], state='readonly', width=16)
+        self.sampling_combo.current(0)
+        self.sampling_combo.config(state=tk.DISABLED)
+        self.sampling_combo.grid(row=4, column=1, sticky=tk.W, padx=5, pady=5)
+        self.sampling_value_label = ttk.Label(self.frame_extract_options_frame, text=self.texts['sampling_value_label'])
+        self.sampling_value_label.grid(row=4, column=2, sticky=tk.W, padx=5, pady=5)
+        self.sampling_value_entry = ttk.Entry(self.frame_extract_options_frame, textvariable=self.sampling_value_str, width=10, state=tk.DISABLED)
+        self.sampling_value_entry.grid(row=4, column=3, sticky=tk.W, padx=5, pady=5)
+        self.container_label = ttk.Label(self.frame_extract_options_frame, text=self.texts['container_label'])
+        self.container_label.grid(row=5, column=0, sticky=tk.W, padx=5, pady=5)
+        self.container_combo = ttk.Combobox(self.frame_extract_options_frame, textvariable=self.container_var, values=self.texts['containers'], state='readonly', width=28)
+        self.container_combo.current(0)
+        self.container_combo.config(state=tk.DISABLED)
+        self.container_combo.grid(row=5, column=1, columnspan=2, sticky=tk.W, padx=5, pady=5)
+        self.dedup_check = ttk.Checkbutton(self.frame_extract_options_frame, text=self.texts['dedup_label'], variable=self.dedup_var, state=tk.DISABLED)
+        self.dedup_check.grid(row=5, column=3, sticky=tk.W, padx=5, pady=5)
 
 
         # --- Action Buttons Frame ---
@@ -468,6 +750,12 @@ class VideoProcessorApp:
         self.extract_frames_button = ttk.Button(action_button_frame, text=self.texts['extract_frames_button'], command=self.start_frame_extraction, width=20)
         self.extract_frames_button.pack(side=tk.LEFT, padx=10)
 
+        self.batch_button = ttk.Button(action_button_frame, text=self.texts['batch_button'], command=self.open_batch_window, width=20)
+        self.batch_button.pack(side=tk.LEFT, padx=10)
+
+        self.resume_check = ttk.Checkbutton(action_button_frame, text=self.texts['resume_label'], variable=self.resume_var)
+        self.resume_check.pack(side=tk.LEFT, padx=10)
+
         # --- Progress Bar and Status ---
         self.progress_bar = ttk.Progressbar(self.main_frame, variable=self.progress_var, maximum=100)
         self.progress_bar.grid(row=6, column=0, columnspan=3, sticky=(tk.W, tk.E), pady=2)
@@ -525,20 +813,43 @@ class VideoProcessorApp:
         self.original_resolution_str.set(f"{self.texts['resolution_label']} {self.texts['na'] if self.video_width == 0 else f'{self.video_width}x{self.video_height}'}")
         self.original_fps_str.set(f"{self.texts['fps_label']} {self.texts['na'] if self.video_fps == 0 else f'{self.video_fps:.2f}'}")
         self.original_frame_count_str.set(f"{self.texts['frames_label']} {self.texts['na'] if self.total_frames == 0 else self.total_frames}")
+        if self.frame_index is not None: self._show_indexed_frame_count()
+        self.frame_index_check.config(text=self.texts['use_frame_index'])
+        self.set_start_button.config(text=self.texts['set_start_button'])
+        self.set_end_button.config(text=self.texts['set_end_button'])
 
         # Video Processing Section
         self.video_processing_frame.config(text=self.texts['video_processing_options_frame'])
         self.time_check.config(text=self.texts['enable_time_crop'])
+        self.split_scenes_check.config(text=self.texts['split_scenes_label'])
+        self.cut_list_label.config(text=self.texts['cut_list_label'])
+        self.split_ranges_check.config(text=self.texts['split_ranges_label'])
+        self.dedup_check.config(text=self.texts['dedup_label'])
         self.start_time_label.config(text=self.texts['start_time_label'])
         self.end_time_label.config(text=self.texts['end_time_label'])
         self.res_check.config(text=self.texts['enable_res_scale'])
         self.res_w_label.config(text=self.texts['width_label'])
         self.res_h_label.config(text=self.texts['height_label'])
         self.fps_check.config(text=self.texts['enable_fps_change'])
+        self.crop_check.config(text=self.texts['enable_spatial_crop'])
+        for label, label_key in self.crop_labels: label.config(text=self.texts[label_key])
+        self.crop_lock_check.config(text=self.texts['crop_lock_aspect'])
+        aspect_index = self.crop_aspect_combo.current()
+        self.crop_aspect_combo.config(values=self.texts['crop_aspects'])
+        self.crop_aspect_combo.current(max(0, aspect_index))
+        self.crop_center_button.config(text=self.texts['crop_center_button'])
         self.fps_label_widget.config(text=self.texts['output_fps_label'])
+        for widget, key in ((self.filters_label, 'filters_label'), (self.rotate_label, 'rotate_label'),
+                            (self.flip_h_check, 'flip_h_label'), (self.flip_v_check, 'flip_v_label'),
+                            (self.grayscale_check, 'grayscale_label'), (self.brightness_label, 'brightness_label'),
+                            (self.contrast_label, 'contrast_label')):
+            widget.config(text=self.texts[key])
         self.output_video_frame_widget.config(text=self.texts['output_video_frame'])
         self.output_file_label.config(text=self.texts['file_label'])
         self.output_browse_button.config(text=self.texts['save_as_button'])
+        self.renditions_label.config(text=self.texts['renditions_label'])
+        self.renditions_hint_label.config(text=self.texts['renditions_hint'])
+        self.extract_same_pass_check.config(text=self.texts['extract_same_pass'])
 
         # Frame Extraction Section
         self.frame_extract_options_frame.config(text=self.texts['frame_extract_options_frame'])
@@ -548,10 +859,26 @@ class VideoProcessorApp:
         self.output_dir_label.config(text=self.texts['output_dir_label'])
         self.output_dir_button.config(text=self.texts['browse_dir_button'])
         self.img_format_label.config(text=self.texts['img_format_label'])
+        self.sampling_label.config(text=self.texts['sampling_label'])
+        self.sampling_value_label.config(text=self.texts['sampling_value_label'])
+        sampling_index = self.sampling_combo.current()
+        self.sampling_combo.config(values=self.texts['sampling_modes'])
+        self.sampling_combo.current(max(0, sampling_index))
+        self.encoder_label.config(text=self.texts['encoder_label'])
+        encoder_index = self.encoder_combo.current()
+        self.encoder_combo.config(values=self.texts['encoder_presets'])
+        self.encoder_combo.current(max(0, encoder_index))
+        self.container_label.config(text=self.texts['container_label'])
+        container_index = self.container_combo.current()
+        self.container_combo.config(values=self.texts['containers'])
+        self.container_combo.current(max(0, container_index))
 
         # Action Buttons
         self.process_video_button.configure(text=self.texts['process_video_button'])
         self.extract_frames_button.configure(text=self.texts['extract_frames_button'])
+        self.batch_button.configure(text=self.texts['batch_button'])
+        self.resume_check.configure(text=self.texts['resume_label'])
+        if self.batch_window is not None: self.batch_window.update_language()
 
         # Status & Link
         current_status = self.status_text.get().split(LANGUAGES['en']['status_label'])[-1].split(LANGUAGES['zh']['status_label'])[-1].strip()
@@ -597,30 +924,12 @@ class VideoProcessorApp:
         self.root.update_idletasks()
 
         try:
-            if self.video_capture and self.video_capture.isOpened(): self.video_capture.release()
-            self.video_capture = cv2.VideoCapture(path)
-            if not self.video_capture.isOpened(): raise IOError(f"Cannot open: {path}")
-
-            self.video_fps = self.video_capture.get(cv2.CAP_PROP_FPS)
-            self.total_frames = int(self.video_capture.get(cv2.CAP_PROP_FRAME_COUNT))
-            self.video_width = int(self.video_capture.get(cv2.CAP_PROP_FRAME_WIDTH))
-            self.video_height = int(self.video_capture.get(cv2.CAP_PROP_FRAME_HEIGHT))
-
-            if not self.video_fps or self.video_fps <= 0:
-                print(f"Warning: Invalid FPS ({self.video_fps}) read for {path}. Using 30.0.")
-                self.video_fps = 30.0
-            if not self.total_frames or self.total_frames < 0:
-                 print(f"Warning: Invalid frame count ({self.total_frames}) read for {path}. Using 0.")
-                 self.total_frames = 0
-
-            if self.total_frames > 0 and self.video_fps > 0:
-                self.video_duration_sec = self.total_frames / self.video_fps
-                # --- DEBUG PRINT ---
-                print(f"Calculated Duration (seconds): {self.video_duration_sec}")
-                print(f"Total Frames: {self.total_frames}, FPS: {self.video_fps}")
-                # --- END DEBUG ---
-            else:
-                 self.video_duration_sec = 0
+            info = probe_video(path, self.probe_cache)
+            self.video_fps = info.fps
+            self.total_frames = info.total_frames
+            self.video_width = info.width
+            self.video_height = info.height
+            self.video_duration_sec = info.duration
 
             formatted_duration = format_time(self.video_duration_sec)
              # --- DEBUG PRINT ---
@@ -637,17 +946,23 @@ class VideoProcessorApp:
             self.scale_width_str.set(str(self.video_width))
             self.scale_height_str.set(str(self.video_height))
             self.output_fps_str.set(f"{self.video_fps:.2f}")
+            self.crop_x_str.set("0")
+            self.crop_y_str.set("0")
+            self.crop_w_str.set(str(self.video_width))
+            self.crop_h_str.set(str(self.video_height))
             self.start_frame_str.set("0")
             self.end_frame_str.set(str(max(0, self.total_frames - 1)))
 
             self.status_text.set(f"{self.texts['status_label']} {self.texts['loaded']} '{os.path.basename(path)}'")
+            self._open_preview(path)
+            self._open_thumbnails(path)
+            self._request_frame_index()
 
         except Exception as e:
             self.show_error_message('error', 'error_loading', f"\n{e}")
             self._reset_video_properties() # Reset display on error
             self.status_text.set(f"{self.texts['status_label']} {self.texts['error_loading']}")
         finally:
-             if self.video_capture: self.video_capture.release(); self.video_capture = None
              self.update_widget_states("","","") # Update states after loading
 
     def _reset_video_properties(self):
@@ -657,15 +972,183 @@ class VideoProcessorApp:
         self.video_width = 0
         self.video_height = 0
         self.total_frames = 0
+        self.frame_index = None
+        self.frame_index_path = None
+        self._close_preview()
+        self._close_thumbnails()
         self.original_duration_str.set(f"{self.texts['duration_label']} {self.texts['na']}")
         self.original_resolution_str.set(f"{self.texts['resolution_label']} {self.texts['na']}")
         self.original_fps_str.set(f"{self.texts['fps_label']} {self.texts['na']}")
         self.original_frame_count_str.set(f"{self.texts['frames_label']} {self.texts['na']}")
-        self.mutex_warning_str.set("")
+        if hasattr(self, 'mutex_warning_str'):
+            self.mutex_warning_str.set("")
         # Also reset default input values? Optional, maybe keep last entered.
         # self.start_time_str.set(format_time(0)) ... etc.
 
 
+    def _request_frame_index(self):
+        """Loads or builds the frame index of the current input on a background thread."""
+        path = self.input_path.get()
+        if not self.use_frame_index.get() or self.total_frames == 0 or self.frame_index_path == path: return
+        self.frame_index_path = path
+        def worker():
+            try: index = load_frame_index(path, build=True)
+            except Exception as e:
+                print(f"Could not index {path}: {e}")
+                index = None
+            self.root.after(0, self._apply_frame_index, path, index)
+        threading.Thread(target=worker, daemon=True).start()
+
+    def _apply_frame_index(self, path, index):
+        if path != self.input_path.get() or self.frame_index_path != path: return # Input changed meanwhile
+        if index is None:
+            self.frame_index_path = None; return
+        if self.end_frame_str.get() == str(max(0, self.total_frames - 1)): # Still the default: use the exact end
+            self.end_frame_str.set(str(max(0, index.frame_count - 1)))
+        self.frame_index = index
+        self.total_frames = index.frame_count
+        self._show_indexed_frame_count()
+        if self.preview is not None and self.preview.path == path:
+            self.preview.index = index # Exact seeks from now on
+            self.timeline_scale.config(to=max(0, self.total_frames - 1))
+
+    def _show_indexed_frame_count(self):
+        self.original_frame_count_str.set(f"{self.texts['frames_label']} {self.total_frames} {self.texts['frames_exact']}")
+
+    def _current_frame_index(self, path):
+        """The FrameIndex to plan with, if enabled and built for ``path``."""
+        if self.use_frame_index.get() and self.frame_index is not None and self.frame_index_path == path:
+            return self.frame_index
+        return None
+
+
+    # --- Preview ---
+    def _open_preview(self, path):
+        """Starts decoding previews of ``path`` in the background and shows its first frame."""
+        self._close_preview()
+        decoder = PreviewDecoder(path, PREVIEW_SIZE)
+        decoder.on_frame = lambda frame_index: self.root.after(0, self._show_preview, decoder, frame_index) # Worker thread
+        self.preview = decoder
+        self.timeline_scale.config(to=max(0, self.total_frames - 1))
+        self.preview_frame_var.set(0)
+        self._on_scrub(0)
+
+    def _close_preview(self):
+        if self.preview is not None: self.preview.close()
+        self.preview = None
+        self._preview_photo = None
+        self._preview_shown = None
+        self.preview_label.config(image='')
+        self.preview_time_str.set("")
+
+    def _on_scrub(self, value):
+        """Timeline moved: shows the frame if cached, else asks the decoder for it. Never decodes here."""
+        if self.preview is None: return
+        frame_index = int(float(value))
+        self.preview_time_str.set(format_time(frame_index / self.video_fps) if self.video_fps else "")
+        if frame_index == self._preview_shown: return
+        frame = self.preview.request(frame_index)
+        if frame is not None: self._show_preview_image(frame_index, frame)
+
+    def _show_preview(self, decoder, frame_index):
+        if decoder is not self.preview or frame_index != int(self.preview_frame_var.get()): return # Moved on meanwhile
+        frame = decoder.get(frame_index)
+        if frame is not None: self._show_preview_image(frame_index, frame)
+
+    def _show_preview_image(self, frame_index, frame):
+        self._preview_photo = ImageTk.PhotoImage(Image.fromarray(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)))
+        self.preview_label.config(image=self._preview_photo)
+        self._preview_shown = frame_index
+
+    def _set_trim_point(self, time_var):
+        """Copies the timeline position into the start or end time entry."""
+        if self.preview is None or not self.video_fps: return
+        time_var.set(format_time(int(self.preview_frame_var.get()) / self.video_fps))
+        self.enable_time_crop.set(True)
+
+
+    # --- Thumbnails ---
+    def _open_thumbnails(self, path):
+        """Fills the filmstrip with thumbnails of ``path`` as a background thread reads (or loads cached) them."""
+        self._close_thumbnails()
+        if self.total_frames == 0 or not self.video_height: return
+        width = max(1, round(THUMBNAIL_HEIGHT * self.video_width / self.video_height))
+        self._thumbnail_step = width + THUMBNAIL_GAP
+        canvas_width = self.thumbnail_canvas.winfo_width()
+        if canvas_width <= 1: canvas_width = 640 # Not laid out yet
+        count = max(1, min(THUMBNAIL_MAX, canvas_width // self._thumbnail_step))
+        index = self._current_frame_index(path)
+        self._thumbnail_frames = thumbnail_frames(index.frame_count if index else self.total_frames, count, index)
+        stop = threading.Event()
+        self.thumbnail_stop = stop
+        def worker():
+            try:
+                thumbnail_strip(path, count, THUMBNAIL_HEIGHT, index, stop=stop,
+                                on_thumbnail=lambda i, image: self.root.after(0, self._show_thumbnail, stop, i, image))
+            except Exception as e:
+                print(f"Could not read thumbnails of {path}: {e}")
+        threading.Thread(target=worker, daemon=True).start()
+
+    def _close_thumbnails(self):
+        if self.thumbnail_stop is not None: self.thumbnail_stop.set()
+        self.thumbnail_stop = None
+        self._thumbnail_photos = {}
+        self._thumbnail_frames = []
+        self.thumbnail_canvas.delete('all')
+
+    def _show_thumbnail(self, stop, i, image):
+        if stop is not self.thumbnail_stop: return # Another input was loaded meanwhile
+        photo = ImageTk.PhotoImage(Image.fromarray(cv2.cvtColor(image, cv2.COLOR_BGR2RGB)))
+        self._thumbnail_photos[i] = photo # Keeps it alive
+        self.thumbnail_canvas.create_image(i * self._thumbnail_step, 0, anchor=tk.NW, image=photo)
+
+    def _on_thumbnail_click(self, event):
+        """Moves the timeline to the frame of the clicked thumbnail."""
+        i = event.x // self._thumbnail_step if self._thumbnail_step else -1
+        if self.preview is None or not 0 <= i < len(self._thumbnail_frames): return
+        self.preview_frame_var.set(self._thumbnail_frames[i])
+        self._on_scrub(self._thumbnail_frames[i])
+
+
+    def _selected_crop_aspect(self):
+        """Width/height chosen in the aspect combobox; 'Source' is the loaded video's."""
+        index = max(0, self.crop_aspect_combo.current())
+        if index == 0: return self.video_width / self.video_height if self.video_height else None
+        return parse_aspect(LANGUAGES['en']['crop_aspects'][index])
+
+    def _apply_crop_aspect(self, keep):
+        """With the aspect locked, recomputes the crop side the user did not just edit."""
+        if self._locking_aspect or not self.crop_lock_aspect.get(): return
+        aspect = self._selected_crop_aspect()
+        try: width, height = int(self.crop_w_str.get()), int(self.crop_h_str.get())
+        except ValueError: return
+        if not aspect or width <= 0 or height <= 0: return
+        width, height = lock_aspect(width, height, aspect, keep)
+        self._locking_aspect = True
+        try:
+            self.crop_w_str.set(str(width))
+            self.crop_h_str.set(str(height))
+        finally:
+            self._locking_aspect = False
+
+    def center_crop(self):
+        """Centers the crop region; with the aspect locked, makes it the largest one that fits."""
+        if not self.video_width or not self.video_height: return
+        aspect = self._selected_crop_aspect() if self.crop_lock_aspect.get() else None
+        try: width, height = int(self.crop_w_str.get()), int(self.crop_h_str.get())
+        except ValueError: width, height = self.video_width, self.video_height
+        if aspect: x, y, width, height = largest_centered_crop(self.video_width, self.video_height, aspect)
+        else:
+            width, height = min(max(1, width), self.video_width), min(max(1, height), self.video_height)
+            x, y = (self.video_width - width) // 2, (self.video_height - height) // 2
+        self._locking_aspect = True
+        try:
+            for var, value in zip((self.crop_x_str, self.crop_y_str, self.crop_w_str, self.crop_h_str), (x, y, width, height)):
+                var.set(str(value))
+        finally:
+            self._locking_aspect = False
+
+
     # --- UI State Management ---
     def update_widget_states(self, var_name, index, mode):
         """Enables/disables sub-widgets based on their parent checkbox state."""
@@ -673,6 +1156,7 @@ class VideoProcessorApp:
         time_state = tk.NORMAL if self.enable_time_crop.get() else tk.DISABLED
         self.start_time_entry.config(state=time_state)
         self.end_time_entry.config(state=time_state)
+        self.cut_list_entry.config(state=time_state)
 
         res_state = tk.NORMAL if self.enable_res_scale.get() else tk.DISABLED
         self.res_w_entry.config(state=res_state)
@@ -681,6 +1165,12 @@ class VideoProcessorApp:
         fps_state = tk.NORMAL if self.enable_fps_change.get() else tk.DISABLED
         self.fps_entry.config(state=fps_state)
 
+        crop_state = tk.NORMAL if self.enable_spatial_crop.get() else tk.DISABLED
+        for entry in self.crop_entries: entry.config(state=crop_state)
+        self.crop_lock_check.config(state=crop_state)
+        self.crop_aspect_combo.config(state='readonly' if crop_state == tk.NORMAL else tk.DISABLED)
+        self.crop_center_button.config(state=crop_state)
+
         # Frame extraction widgets
         frame_state = tk.NORMAL if self.enable_frame_extract.get() else tk.DISABLED
         self.start_frame_entry.config(state=frame_state)
@@ -688,6 +1178,12 @@ class VideoProcessorApp:
         self.output_dir_entry.config(state=frame_state)
         self.output_dir_button.config(state=frame_state)
         self.img_format_combo.config(state='readonly' if frame_state == tk.NORMAL else tk.DISABLED)
+        self.sampling_combo.config(state='readonly' if frame_state == tk.NORMAL else tk.DISABLED)
+        self.encoder_combo.config(state='readonly' if frame_state == tk.NORMAL else tk.DISABLED)
+        self.container_combo.config(state='readonly' if frame_state == tk.NORMAL else tk.DISABLED)
+        self.sampling_value_entry.config(state=frame_state)
+        self.dedup_check.config(state=frame_state)
+        self.extract_same_pass_check.config(state=frame_state) # Uses the frame extraction settings
 
 
     def update_progress(self, value, text_key, *args):
@@ -716,11 +1212,114 @@ class VideoProcessorApp:
          self.processing_active = False
          self.process_video_button.config(state=tk.NORMAL)
          self.extract_frames_button.config(state=tk.NORMAL)
+         self.batch_button.config(state=tk.NORMAL)
          # return value is optional, useful if chained like: return self.reset_processing_state()
 
 
+    def _poll_progress(self):
+        """Copies the worker's ProgressTracker into the UI, PROGRESS_POLL_MS apart."""
+        if not self.processing_active or self.progress.finished: return
+        snap = self.progress.snapshot()
+        if snap.done > 0:
+            eta = format_time(snap.eta) if snap.eta is not None else self.texts['na']
+            detail = self.texts['progress_detail'].format(snap.percent, snap.fps, eta)
+            self.progress_var.set(snap.percent)
+            self.status_text.set(f"{self.texts['status_label']} {self.texts[self.progress_status_key]} {detail}")
+        self.root.after(PROGRESS_POLL_MS, self._poll_progress)
+
+
     # --- Processing Logic ---
 
+    def _begin_processing(self, status_key, progress_key):
+        """Disables the action buttons and starts progress polling before a worker starts."""
+        self.processing_active = True
+        self.process_video_button.config(state=tk.DISABLED)
+        self.extract_frames_button.config(state=tk.DISABLED) # Disable both
+        self.batch_button.config(state=tk.DISABLED)
+        self.progress_var.set(0)
+        self.progress.reset()
+        self.progress_status_key = progress_key
+        self.root.after(0, self.update_progress, 0.0, status_key)
+        self.root.after(PROGRESS_POLL_MS, self._poll_progress)
+
+    def open_batch_window(self):
+        if self.batch_window is None: self.batch_window = BatchWindow(self)
+        else: self.batch_window.window.deiconify(); self.batch_window.window.lift()
+
+    def collect_filters(self):
+        """Filters from the filter controls, or None after showing why not (main thread only)."""
+        filters = []
+        rotation = int(self.rotate_var.get() or 0)
+        if rotation: filters.append(Rotate(rotation))
+        if self.flip_h_var.get() or self.flip_v_var.get(): filters.append(Flip(self.flip_h_var.get(), self.flip_v_var.get()))
+        try: levels = Levels(float(self.brightness_str.get()), float(self.contrast_str.get()))
+        except ValueError: self.show_error_message('error', 'error_invalid_levels'); return None
+        if levels != Levels(): filters.append(levels)
+        if self.grayscale_var.get(): filters.append(Grayscale())
+        return filters
+
+    def collect_process_job(self, in_path, out_path, extract_dir=None):
+        """ProcessJob from the video processing controls, or None after showing why not (main thread only).
+
+        Frames extracted in the same pass go to ``extract_dir``, by default the frame extraction directory.
+        """
+        job = ProcessJob(in_path, out_path, pipeline_workers=default_worker_count())
+        job.filters = self.collect_filters()
+        if job.filters is None: return None
+        if self.enable_time_crop.get() and self.cut_list_str.get().strip():
+            try: job.ranges = parse_time_ranges(self.cut_list_str.get())
+            except ValueError: self.show_error_message('error', 'error_invalid_cut_list'); return None
+            job.split_ranges = self.split_ranges_var.get()
+        elif self.enable_time_crop.get():
+            job.start_sec = time_str_to_seconds(self.start_time_str.get())
+            job.end_sec = time_str_to_seconds(self.end_time_str.get())
+            if job.start_sec is None or job.end_sec is None: self.show_error_message('error', 'error_invalid_time'); return None
+        if self.enable_res_scale.get():
+            try:
+                job.width = int(self.scale_width_str.get())
+                job.height = int(self.scale_height_str.get())
+            except ValueError: self.show_error_message('error', 'error_invalid_res_positive'); return None
+        if self.enable_fps_change.get():
+            try: job.output_fps = float(self.output_fps_str.get())
+            except ValueError: self.show_error_message('error', 'error_invalid_fps_positive'); return None
+        if self.enable_spatial_crop.get():
+            try: job.crop = tuple(int(v.get()) for v in (self.crop_x_str, self.crop_y_str, self.crop_w_str, self.crop_h_str))
+            except ValueError: self.show_error_message('error', 'error_invalid_crop_int'); return None
+        specs = [spec.strip() for spec in self.renditions_str.get().split(',') if spec.strip()]
+        try: job.renditions = [parse_rendition(spec, out_path) for spec in specs]
+        except ValueError: self.show_error_message('error', 'error_invalid_rendition', self.renditions_str.get()); return None
+        if self.enable_frame_extract.get() and self.extract_same_pass.get():
+            job.extract = self.collect_extract_job(in_path, extract_dir if extract_dir is not None else self.output_dir_str.get())
+            if job.extract is None: return None
+        job.resume = self.resume_var.get()
+        if self.split_scenes_var.get(): job.split_scenes = SceneDetection()
+        return job
+
+    def collect_extract_job(self, in_path, output_dir):
+        """ExtractJob from the frame extraction controls, or None after showing why not (main thread only)."""
+        try:
+            job = ExtractJob(in_path, output_dir,
+                             int(self.start_frame_str.get()), int(self.end_frame_str.get()), # Inclusive end
+                             self.image_format_var.get(), writer_workers=default_worker_count())
+        except ValueError: self.show_error_message('error', 'error_invalid_frame_int'); return None
+        sampling_mode = SAMPLING_MODES[max(0, self.sampling_combo.current())]
+        try:
+            if sampling_mode == 'every_n': job.frame_step = int(self.sampling_value_str.get())
+            elif sampling_mode == 'every_sec': job.interval_sec = float(self.sampling_value_str.get())
+            elif sampling_mode == 'keyframes': job.keyframes_only = True
+            elif sampling_mode == 'scenes': job.scenes = SceneDetection()
+            elif sampling_mode == 'list':
+                job.frame_list = [int(v) for v in self.sampling_value_str.get().split(',') if v.strip()]
+                if not job.frame_list: raise ValueError("no frames listed")
+        except ValueError: self.show_error_message('error', 'error_invalid_sampling'); return None
+        job.encoding = ENCODER_PRESETS[ENCODER_PRESET_NAMES[max(0, self.encoder_combo.current())]]
+        job.container = FRAME_CONTAINERS[max(0, self.container_combo.current())]
+        job.resume = self.resume_var.get()
+        if self.dedup_var.get(): job.dedup = FrameDedup()
+        job.filters = self.collect_filters()
+        if job.filters is None: return None
+        return job
+
     def start_video_processing(self):
         """Validates and starts the video processing thread."""
         if self.processing_active: return
@@ -728,64 +1327,23 @@ class VideoProcessorApp:
         if not in_path or not os.path.exists(in_path):
             self.show_error_message('error', 'error_input_file'); return
 
-        # Check if any video processing option is actually enabled
-        if not (self.enable_time_crop.get() or self.enable_res_scale.get() or self.enable_fps_change.get()):
-             self.show_error_message('error', 'error_no_op_video'); return
-
-        out_path = self.output_path.get()
-        if not out_path:
-            self.show_error_message('error', 'error_output_file'); return
+        job = self.collect_process_job(in_path, self.output_path.get())
+        if job is None: return
 
         # --- Reload video info for validation (get fresh values) ---
-        temp_cap = cv2.VideoCapture(in_path)
-        if not temp_cap.isOpened(): self.show_error_message('error', 'error_loading', in_path); return
-        original_fps = temp_cap.get(cv2.CAP_PROP_FPS)
-        original_total_frames = int(temp_cap.get(cv2.CAP_PROP_FRAME_COUNT))
-        original_width = int(temp_cap.get(cv2.CAP_PROP_FRAME_WIDTH))
-        original_height = int(temp_cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
-        temp_cap.release()
-        if original_fps is None or original_fps <= 0: original_fps = 30.0
-        if original_total_frames <= 0: original_total_frames = 0
-        original_duration_sec = original_total_frames / original_fps if original_fps > 0 else 0
-
-        # --- Parameter Validation ---
-        start_sec, end_sec = 0, original_duration_sec
-        if self.enable_time_crop.get():
-            start_sec = time_str_to_seconds(self.start_time_str.get())
-            end_sec = time_str_to_seconds(self.end_time_str.get())
-            if start_sec is None or end_sec is None: self.show_error_message('error', 'error_invalid_time'); return
-            if start_sec < 0 or end_sec < 0: self.show_error_message('error', 'error_negative_time'); return
-            if end_sec <= start_sec: self.show_error_message('error', 'error_end_before_start'); return
-            if end_sec > original_duration_sec: end_sec = original_duration_sec
-            if start_sec >= original_duration_sec and original_duration_sec > 0: self.show_error_message('error', 'error_start_too_late'); return
-
-        target_w, target_h = original_width, original_height
-        if self.enable_res_scale.get():
-            try:
-                target_w = int(self.scale_width_str.get())
-                target_h = int(self.scale_height_str.get())
-                if target_w <= 0 or target_h <= 0: raise ValueError()
-            except ValueError: self.show_error_message('error', 'error_invalid_res_positive'); return
+        try: info = probe_video(in_path, self.probe_cache)
+        except IOError: self.show_error_message('error', 'error_loading', in_path); return
 
-        output_fps = original_fps
-        if self.enable_fps_change.get():
-            try:
-                output_fps = float(self.output_fps_str.get())
-                if output_fps <= 0: raise ValueError()
-            except ValueError: self.show_error_message('error', 'error_invalid_fps_positive'); return
+        try: plan = plan_video_processing(job, info, self._current_frame_index(in_path))
+        except JobError as je: self.show_error_message('error', je.key, *je.params); return
+        if plan.end_capped:
+            self.show_warning_message('warning', 'warning_end_time_capped', format_time(info.duration))
+        if plan.extract and plan.extract.end_capped:
+            self.show_warning_message('warning', 'error_invalid_frame_range', f"\nEnd frame capped to {plan.extract.end_frame}")
 
         # --- Start Thread ---
-        self.processing_active = True
-        self.process_video_button.config(state=tk.DISABLED)
-        self.extract_frames_button.config(state=tk.DISABLED) # Disable both
-        self.progress_var.set(0)
-        self.root.after(0, self.update_progress, 0.0, 'starting_process')
-
-        process_thread = threading.Thread(
-            target=self.perform_video_processing,
-            args=(in_path, out_path, start_sec, end_sec, target_w, target_h,
-                  output_fps, original_fps, original_total_frames, original_duration_sec),
-            daemon=True)
+        self._begin_processing('starting_process', 'processing')
+        process_thread = threading.Thread(target=self.perform_video_processing, args=(job, plan), daemon=True)
         process_thread.start()
 
     def start_frame_extraction(self):
@@ -795,221 +1353,741 @@ class VideoProcessorApp:
         if not in_path or not os.path.exists(in_path):
             self.show_error_message('error', 'error_input_file'); return
 
-        out_dir = self.output_dir_str.get()
-        img_format = self.image_format_var.get()
-        if not out_dir:
-            self.show_error_message('error', 'error_output_dir'); return
-
-        # Try to create output directory if it doesn't exist
-        try:
-            if not os.path.isdir(out_dir):
-                 print(f"Output directory '{out_dir}' does not exist. Attempting to create.")
-                 os.makedirs(out_dir, exist_ok=True)
-                 if not os.path.isdir(out_dir): # Check again after creation attempt
-                      raise OSError(f"Failed to create directory: {out_dir}")
-        except OSError as e:
-            self.show_error_message('error', 'error_output_dir', f"\n{self.texts['check_permissions']} ({e})"); return
+        job = self.collect_extract_job(in_path, self.output_dir_str.get())
+        if job is None: return
 
         # --- Reload video info for validation ---
-        temp_cap = cv2.VideoCapture(in_path)
-        if not temp_cap.isOpened(): self.show_error_message('error', 'error_loading', in_path); return
-        original_total_frames = int(temp_cap.get(cv2.CAP_PROP_FRAME_COUNT))
-        temp_cap.release()
-        if original_total_frames <= 0: original_total_frames = 0
+        try: info = probe_video(in_path, self.probe_cache)
+        except IOError: self.show_error_message('error', 'error_loading', in_path); return
 
-        # --- Parameter Validation ---
-        try:
-            start_frame = int(self.start_frame_str.get())
-            end_frame = int(self.end_frame_str.get()) # Inclusive end
-            if start_frame < 0 or end_frame < 0: raise ValueError(self.texts['error_invalid_frame_positive'])
-            if end_frame < start_frame: raise ValueError(self.texts['error_invalid_frame_order'])
-            # Check range against actual frames
-            if original_total_frames > 0:
-                if start_frame >= original_total_frames : raise ValueError(self.texts['error_invalid_frame_range'])
-                if end_frame >= original_total_frames:
-                    self.show_warning_message('warning', 'error_invalid_frame_range', f"\nEnd frame capped to {original_total_frames - 1}")
-                    end_frame = original_total_frames - 1 # Adjust end frame
-            elif start_frame > 0 or end_frame > 0: # If video has 0 frames, only 0-0 range is valid
-                 raise ValueError(self.texts['error_invalid_frame_range'])
-
-        except ValueError as ve:
-             # Check if the error message is one of our specific ones
-             if str(ve) in [self.texts['error_invalid_frame_positive'], self.texts['error_invalid_frame_order'], self.texts['error_invalid_frame_range']]:
-                 self.show_error_message('error', str(ve))
-             else: # General integer conversion error
-                 self.show_error_message('error', 'error_invalid_frame_int')
-             return
+        try: plan = plan_frame_extraction(job, info, self._current_frame_index(in_path))
+        except JobError as je:
+            if je.key == 'error_output_dir' and je.params:
+                self.show_error_message('error', 'error_output_dir', f"\n{self.texts['check_permissions']} ({je.params[0]})")
+            else:
+                self.show_error_message('error', je.key, *je.params)
+            return
+        if plan.end_capped:
+            self.show_warning_message('warning', 'error_invalid_frame_range', f"\nEnd frame capped to {plan.end_frame}")
 
         # --- Start Thread ---
-        self.processing_active = True
-        self.process_video_button.config(state=tk.DISABLED) # Disable both
-        self.extract_frames_button.config(state=tk.DISABLED)
-        self.progress_var.set(0)
-        self.root.after(0, self.update_progress, 0.0, 'starting_extract')
-
+        self._begin_processing('starting_extract', 'extracting')
         extract_thread = threading.Thread(
             target=self.perform_frame_extraction,
-            args=(in_path, out_dir, start_frame, end_frame, img_format, original_total_frames),
+            args=(job, plan, info.total_frames),
             daemon=True)
         extract_thread.start()
 
 
-    def perform_video_processing(self, in_path, out_path, start_sec, end_sec,
-                                 target_w, target_h,
-                                 output_fps, original_fps, original_total_frames, original_duration_sec):
+    def perform_video_processing(self, job, plan):
         """Worker thread function for video processing."""
-        cap = None
-        out = None
-        try:
-            cap = cv2.VideoCapture(in_path)
-            if not cap.isOpened(): raise IOError(f"Cannot open input: {in_path}")
-
-            # Get original dimensions from video
-            original_width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
-            original_height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
-
-            # Calculate frame range based on ORIGINAL FPS
-            start_frame = 0
-            end_frame = original_total_frames
-            if self.enable_time_crop.get(): # Check flag from main thread var
-                # Display capped time warning if applicable (check original UI value vs capped value)
-                original_end_time_str = self.end_time_str.get() # Access UI var safely
-                if end_sec < original_duration_sec and time_str_to_seconds(original_end_time_str) > original_duration_sec:
-                     self.root.after(0, self.show_warning_message, 'warning', 'warning_end_time_capped', format_time(original_duration_sec))
-                start_frame = max(0, int(start_sec * original_fps))
-                end_frame = min(original_total_frames, math.ceil(end_sec * original_fps))
-                if end_frame >= original_total_frames : end_frame = original_total_frames # Ensure not out of bounds
-
-
-            out_width, out_height = original_width, original_height
-            is_resizing_needed = False
-            if self.enable_res_scale.get(): # Check flag
-                out_width, out_height = target_w, target_h
-                # Check if resize is actually necessary
-                if out_width != int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)) or out_height != int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)):
-                    is_resizing_needed = True
-
-            # Setup Video Writer
-            fourcc = cv2.VideoWriter_fourcc(*'mp4v')
-            if out_path.lower().endswith('.avi'): fourcc = cv2.VideoWriter_fourcc(*'XVID')
-            elif out_path.lower().endswith('.mov'): fourcc = cv2.VideoWriter_fourcc(*'mp4v')
-            elif out_path.lower().endswith('.mkv'): fourcc = cv2.VideoWriter_fourcc(*'X264')
-            out = cv2.VideoWriter(out_path, fourcc, output_fps, (out_width, out_height))
-            if not out.isOpened(): raise IOError(f"Cannot open video writer for: {out_path}")
-
-            # Process Frames
-            current_frame_index = 0
-            processed_frames_count = 0
-            frames_to_process = max(0, end_frame - start_frame)
-
-            if start_frame > 0:
-                 cap.set(cv2.CAP_PROP_POS_FRAMES, start_frame)
-                 # Verify seek accuracy (optional but good)
-                 # actual_start = int(cap.get(cv2.CAP_PROP_POS_FRAMES))
-                 # if abs(actual_start - start_frame) > 1: print(f"Warning: Seek accuracy issue? Requested {start_frame}, got {actual_start}")
-                 current_frame_index = start_frame # Track precisely
-
-            while True:
-                if current_frame_index >= end_frame: break
-                ret, frame = cap.read()
-                if not ret: break
-
-                if current_frame_index >= start_frame:
-                    output_frame = frame
-                    if is_resizing_needed: # Apply resizing only if needed and enabled
-                         output_frame = cv2.resize(frame, (out_width, out_height), interpolation=cv2.INTER_AREA)
-
-                    if output_frame is None or output_frame.size == 0:
-                         print(f"Warning: Frame {current_frame_index} empty after processing, skipping.")
-                         current_frame_index += 1; continue
-
-                    out.write(output_frame)
-                    processed_frames_count += 1
-
-                    if frames_to_process > 0 :
-                        progress = (processed_frames_count / frames_to_process) * 100
-                        # Update less frequently for performance? e.g., every 10 frames
-                        # if processed_frames_count % 10 == 0:
-                        self.root.after(0, self.update_progress, progress, 'processing', progress)
-
-                current_frame_index += 1
-
-            self.root.after(0, self.update_progress, 100.0, 'complete_process', os.path.basename(out_path))
+        def on_warning(key, *params):
+            self.root.after(0, self.show_warning_message, 'warning', key, *params)
 
+        timer = StageTimer() if os.environ.get(TRACE_DIR_ENV) else None
+        try:
+            process_video(job, plan, self.progress, on_warning, timer)
+            self.progress.finish()
+            output = job.output_path
+            if job.split: output = scene_output_path(job.output_path, 1) + " ..."
+            elif job.ranges and job.split_ranges: output = range_output_path(job.output_path, 1) + " ..."
+            self.root.after(0, self.update_progress, 100.0, 'complete_process', os.path.basename(output))
         except Exception as e:
-            error_details = str(e)
             print(f"Error in perform_video_processing: {e}") # Log detailed error
-            self.root.after(0, self.update_progress, 0.0, 'error_processing', error_details)
-            try:
-                if out and out.isOpened(): out.release()
-                if os.path.exists(out_path): os.remove(out_path); print(f"Removed partial file: {out_path}")
-            except OSError as os_err: print(f"Could not remove output file {out_path}: {os_err}")
+            self.progress.finish()
+            self.root.after(0, self.update_progress, 0.0, 'error_processing', str(e))
         finally:
-            if cap and cap.isOpened(): cap.release()
-            if out and out.isOpened(): out.release()
+            save_timer_files(timer, os.environ.get(TRACE_DIR_ENV), 'process')
             self.root.after(0, self.reset_processing_state)
 
 
-    def perform_frame_extraction(self, in_path, out_dir, start_frame, end_frame, img_format, total_video_frames):
+    def perform_frame_extraction(self, job, plan, total_video_frames):
         """Worker thread function for frame extraction."""
-        cap = None
+        def on_warning(key, *params):
+            self.root.after(0, self.show_warning_message, 'warning', key, *params)
+
+        timer = StageTimer() if os.environ.get(TRACE_DIR_ENV) else None
         try:
-            cap = cv2.VideoCapture(in_path)
-            if not cap.isOpened(): raise IOError(f"Cannot open input: {in_path}")
+            extract_frames(job, plan, total_video_frames, self.progress, on_warning, timer)
+            self.progress.finish()
+            self.root.after(0, self.update_progress, 100.0, 'complete_extract', frame_output_path(job))
+        except Exception as e:
+            print(f"Error in perform_frame_extraction: {e}") # Log detailed error
+            self.progress.finish()
+            self.root.after(0, self.update_progress, 0.0, 'error_extracting', str(e))
+        finally:
+            save_timer_files(timer, os.environ.get(TRACE_DIR_ENV), 'extract')
+            self.root.after(0, self.reset_processing_state)
 
-            # Process Frames
-            current_frame_index = 0
-            extracted_count = 0
-            frames_to_extract_total = max(0, (end_frame - start_frame) + 1) # Inclusive range
-            frame_num_width = len(str(total_video_frames)) if total_video_frames > 0 else 4 # Padding width
 
-            if start_frame > 0:
-                cap.set(cv2.CAP_PROP_POS_FRAMES, start_frame)
-                current_frame_index = start_frame
+def save_timer_files(timer, directory, name):
+    """Writes ``<name>-<time>.json`` (stage summary) and ``.trace.json`` (Chrome trace) for a StageTimer."""
+    if timer is None or not directory: return
+    prefix = os.path.join(directory, f"{name}-{time.strftime('%Y%m%d-%H%M%S')}")
+    try:
+        os.makedirs(directory, exist_ok=True)
+        timer.save_summary(prefix + '.json')
+        timer.save_trace(prefix + '.trace.json')
+        print(f"Timings saved to {prefix}.json and {prefix}.trace.json")
+    except OSError as e:
+        print(f"Warning: Could not save timings to {directory}: {e}")
+
+
+class BatchWindow:
+    """Queue of input files run as one job each, with the main window's current settings.
+
+    Jobs run on a videoEngine.JobQueue from a background thread; the table is
+    refreshed by polling the items every PROGRESS_POLL_MS, like the main
+    progress bar. Closing the window only hides it, so a running batch and
+    its results stay available.
+    """
+    def __init__(self, app):
+        self.app = app
+        self.texts = app.texts
+        self.paths = []
+        self.rows = {} # tree row id -> BatchItem of the current run
+        self.job_queue = None
+        self.pattern_str = tk.StringVar()
+        self.jobs_str = tk.StringVar(value=str(default_worker_count()))
+        self.status_text = tk.StringVar()
+
+        self.window = tk.Toplevel(app.root)
+        self.window.title(self.texts['batch_title'])
+        self.window.protocol("WM_DELETE_WINDOW", self.window.withdraw)
+        self.window.columnconfigure(0, weight=1)
+        self.window.rowconfigure(1, weight=1)
+
+        add_frame = ttk.Frame(self.window, padding="10")
+        add_frame.grid(row=0, column=0, sticky=(tk.W, tk.E))
+        add_frame.columnconfigure(2, weight=1)
+        self.add_files_button = ttk.Button(add_frame, text=self.texts['batch_add_files'], command=self.add_files)
+        self.add_files_button.grid(row=0, column=0, padx=5)
+        self.pattern_label = ttk.Label(add_frame, text=self.texts['batch_pattern_label'])
+        self.pattern_label.grid(row=0, column=1, padx=5)
+        ttk.Entry(add_frame, textvariable=self.pattern_str, width=40).grid(row=0, column=2, sticky=(tk.W, tk.E), padx=5)
+        self.add_pattern_button = ttk.Button(add_frame, text=self.texts['batch_add_pattern'], command=self.add_pattern)
+        self.add_pattern_button.grid(row=0, column=3, padx=5)
+        self.clear_button = ttk.Button(add_frame, text=self.texts['batch_clear'], command=self.clear)
+        self.clear_button.grid(row=0, column=4, padx=5)
+
+        table_frame = ttk.Frame(self.window, padding=(10, 0))
+        table_frame.grid(row=1, column=0, sticky=(tk.W, tk.E, tk.N, tk.S))
+        table_frame.columnconfigure(0, weight=1)
+        table_frame.rowconfigure(0, weight=1)
+        self.tree = ttk.Treeview(table_frame, columns=('status', 'progress'), height=12)
+        self.tree.column('#0', width=420)
+        self.tree.column('status', width=90)
+        self.tree.column('progress', width=220)
+        self.tree.grid(row=0, column=0, sticky=(tk.W, tk.E, tk.N, tk.S))
+        scrollbar = ttk.Scrollbar(table_frame, orient=tk.VERTICAL, command=self.tree.yview)
+        scrollbar.grid(row=0, column=1, sticky=(tk.N, tk.S))
+        self.tree.configure(yscrollcommand=scrollbar.set)
+
+        run_frame = ttk.Frame(self.window, padding="10")
+        run_frame.grid(row=2, column=0, sticky=(tk.W, tk.E))
+        self.task_label = ttk.Label(run_frame, text=self.texts['batch_task_label'])
+        self.task_label.grid(row=0, column=0, padx=5)
+        self.task_combo = ttk.Combobox(run_frame, values=self.texts['batch_tasks'], state='readonly', width=16)
+        self.task_combo.current(0)
+        self.task_combo.grid(row=0, column=1, padx=5)
+        self.jobs_label = ttk.Label(run_frame, text=self.texts['batch_jobs_label'])
+        self.jobs_label.grid(row=0, column=2, padx=5)
+        ttk.Entry(run_frame, textvariable=self.jobs_str, width=5).grid(row=0, column=3, padx=5)
+        self.start_button = ttk.Button(run_frame, text=self.texts['batch_start'], command=self.start, style='Accent.TButton')
+        self.start_button.grid(row=0, column=4, padx=5)
+        self.cancel_button = ttk.Button(run_frame, text=self.texts['batch_cancel'], command=self.cancel, state=tk.DISABLED)
+        self.cancel_button.grid(row=0, column=5, padx=5)
+        self.hint_label = ttk.Label(self.window, text=self.texts['batch_hint'], wraplength=700)
+        self.hint_label.grid(row=3, column=0, sticky=tk.W, padx=15)
+        ttk.Label(self.window, textvariable=self.status_text).grid(row=4, column=0, sticky=tk.W, padx=15, pady=(5, 10))
+        self.update_language()
+
+    def update_language(self):
+        self.texts = self.app.texts
+        self.window.title(self.texts['batch_title'])
+        self.add_files_button.config(text=self.texts['batch_add_files'])
+        self.pattern_label.config(text=self.texts['batch_pattern_label'])
+        self.add_pattern_button.config(text=self.texts['batch_add_pattern'])
+        self.clear_button.config(text=self.texts['batch_clear'])
+        self.tree.heading('#0', text=self.texts['batch_col_file'])
+        self.tree.heading('status', text=self.texts['batch_col_status'])
+        self.tree.heading('progress', text=self.texts['batch_col_progress'])
+        self.task_label.config(text=self.texts['batch_task_label'])
+        task_index = self.task_combo.current()
+        self.task_combo.config(values=self.texts['batch_tasks'])
+        self.task_combo.current(max(0, task_index))
+        self.jobs_label.config(text=self.texts['batch_jobs_label'])
+        self.start_button.config(text=self.texts['batch_start'])
+        self.cancel_button.config(text=self.texts['batch_cancel'])
+        self.hint_label.config(text=self.texts['batch_hint'])
+        self._refresh_rows()
+
+    @property
+    def running(self):
+        return self.job_queue is not None
+
+    def add_files(self):
+        paths = filedialog.askopenfilenames(parent=self.window, title=self.texts['batch_add_files'],
+                                            filetypes=[("Video Files", "*.mp4 *.avi *.mov *.mkv"), ("All Files", "*.*")])
+        self._add_paths(paths)
+
+    def add_pattern(self):
+        try: self._add_paths(expand_inputs([self.pattern_str.get().strip()]))
+        except OSError as e: self.app.show_error_message('error', 'error_input_file', f"\n{e}")
+
+    def _add_paths(self, paths):
+        if self.running: return
+        for path in paths:
+            if path in self.paths or not os.path.isfile(path): continue
+            self.paths.append(path)
+            self.tree.insert('', tk.END, iid=str(len(self.paths) - 1), text=path,
+                             values=(self.texts['batch_statuses']['queued'], ''))
+
+    def clear(self):
+        if self.running: return
+        self.tree.delete(*self.tree.get_children())
+        self.paths = []
+        self.rows = {}
+        self.status_text.set('')
+
+    def start(self):
+        if self.running or self.app.processing_active: return
+        if not self.paths: self.app.show_error_message('error', 'error_batch_empty'); return
+        try:
+            max_concurrent = int(self.jobs_str.get())
+            if max_concurrent <= 0: raise ValueError
+        except ValueError: self.app.show_error_message('error', 'error_invalid_jobs'); return
 
-            while current_frame_index <= end_frame: # Loop until end_frame is processed
-                ret, frame = cap.read()
-                if not ret:
-                    print(f"Warning: Failed read at frame {current_frame_index}, stopping.")
-                    self.root.after(0, self.show_warning_message, 'warning', 'error_extracting', f"Read failed at frame {current_frame_index}")
-                    break # Exit loop if video ends early
+        jobs = []
+        for path in self.paths:
+            base, ext = os.path.splitext(path)
+            if self.task_combo.current() == 0: job = self.app.collect_process_job(path, f"{base}_processed{ext}", f"{base}_frames")
+            else: job = self.app.collect_extract_job(path, f"{base}_frames")
+            if job is None: return
+            jobs.append(job)
+        outputs = [job.output_dir if isinstance(job, ExtractJob) else job.output_path for job in jobs]
+        clashes = sorted({out for out in outputs if outputs.count(out) > 1})
+        if clashes: self.app.show_error_message('error', 'error_batch_output_clash', "\n" + "\n".join(clashes)); return
+
+        self.job_queue = JobQueue(max_concurrent, self.app.probe_cache, self.app.use_frame_index.get())
+        self.rows = {str(i): self.job_queue.add(job) for i, job in enumerate(jobs)}
+        self.app.processing_active = True # The main window's single-job buttons wait for the batch
+        for button in (self.app.process_video_button, self.app.extract_frames_button, self.app.batch_button,
+                       self.start_button, self.clear_button, self.add_files_button, self.add_pattern_button):
+            button.config(state=tk.DISABLED)
+        self.cancel_button.config(state=tk.NORMAL)
+        self.job_queue.start()
+        threading.Thread(target=self._wait, daemon=True).start()
+        self.window.after(PROGRESS_POLL_MS, self._poll)
+
+    def cancel(self):
+        if self.running: self.job_queue.cancel()
+
+    def _wait(self):
+        try: self.job_queue.wait()
+        finally: self.app.root.after(0, self._finished)
+
+    def _poll(self):
+        if not self.running: return
+        self._refresh_rows()
+        self.window.after(PROGRESS_POLL_MS, self._poll)
+
+    def _refresh_rows(self):
+        for row, item in self.rows.items():
+            snap = item.progress.snapshot()
+            if item.status == 'failed': detail = self._error_text(item.error)
+            elif item.status == 'done': detail = f"{item.result} {self.texts['frames']}"
+            elif item.status == 'running' and snap.done > 0:
+                eta = format_time(snap.eta) if snap.eta is not None else self.texts['na']
+                detail = self.texts['progress_detail'].format(snap.percent, snap.fps, eta)
+            else: detail = ''
+            self.tree.item(row, values=(self.texts['batch_statuses'][item.status], detail))
+
+    def _error_text(self, error):
+        if not isinstance(error, JobError): return str(error)
+        try: return self.texts[error.key].format(*error.params)
+        except (KeyError, IndexError): return error.key
+
+    def _finished(self):
+        counts = self.job_queue.counts()
+        self._refresh_rows()
+        self.job_queue = None
+        self.status_text.set(self.texts['batch_summary'].format(counts['done'], counts['failed'], counts['cancelled']))
+        for button in (self.start_button, self.clear_button, self.add_files_button, self.add_pattern_button):
+            button.config(state=tk.NORMAL)
+        self.cancel_button.config(state=tk.DISABLED)
+        self.app.reset_processing_state()
+
+
+# --- Headless Command Line ---
+
+def _cli_message(key, *params):
+    """English text for a LANGUAGES key, for console output."""
+    texts = LANGUAGES['en']
+    message = texts.get(key, key)
+    try: message = message.format(*params)
+    except IndexError: pass
+    if params and '{}' not in texts.get(key, ''):
+        message = f"{message} {' '.join(str(p) for p in params)}"
+    return message
+
+
+class _CliProgressPrinter:
+    """Prints a ProgressTracker to stderr from a background thread until stopped."""
+    INTERVAL_SEC = 0.5
+
+    def __init__(self, progress, label):
+        self.progress = progress
+        self.label = label.rstrip('.')
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self._print()
+        sys.stderr.write("\n")
+
+    def _run(self):
+        while not self._stop.wait(self.INTERVAL_SEC):
+            self._print()
+
+    def _print(self):
+        snap = self.progress.snapshot()
+        eta = format_time(snap.eta) if snap.eta is not None else LANGUAGES['en']['na']
+        detail = LANGUAGES['en']['progress_detail'].format(snap.percent, snap.fps, eta)
+        sys.stderr.write(f"\r{self.label}: {detail} ({snap.done}/{snap.total} {LANGUAGES['en']['frames']})  ")
+        sys.stderr.flush()
+
+
+def _time_arg(value):
+    seconds = time_str_to_seconds(value)
+    if seconds is None: raise argparse.ArgumentTypeError(LANGUAGES['en']['error_invalid_time'])
+    return seconds
+
+
+def _crop_arg(value):
+    try:
+        crop = tuple(int(v) for v in value.split(','))
+        if len(crop) == 4: return crop
+    except ValueError: pass
+    raise argparse.ArgumentTypeError(LANGUAGES['en']['error_invalid_crop_int'])
 
-                # Construct filename
-                filename = f"frame_{str(current_frame_index).zfill(frame_num_width)}.{img_format}"
-                filepath = os.path.join(out_dir, filename)
 
-                try:
-                    save_success = cv2.imwrite(filepath, frame)
-                    if not save_success: raise IOError(f"imwrite failed for {filepath}")
-                    extracted_count += 1
+def _aspect_arg(value):
+    try: return parse_aspect(value)
+    except ValueError: raise argparse.ArgumentTypeError(f"Invalid aspect ratio: {value}")
 
-                    if frames_to_extract_total > 0:
-                        progress = (extracted_count / frames_to_extract_total) * 100
-                        # Update less frequently?
-                        # if extracted_count % 5 == 0 or extracted_count == frames_to_extract_total:
-                        self.root.after(0, self.update_progress, progress, 'extracting', current_frame_index, end_frame, progress)
 
-                except Exception as save_err:
-                     print(f"Error saving frame {current_frame_index}: {save_err}")
-                     self.root.after(0, self.show_warning_message, 'warning', 'error_saving_frame', current_frame_index, str(save_err))
-                     # Continue to next frame even if one fails
+def _filter_arg(value):
+    try: return parse_filter(value)
+    except ValueError: raise argparse.ArgumentTypeError(f"Invalid filter: {value}")
 
-                current_frame_index += 1
 
+FILTER_HELP = ("Filter applied to every frame, in the order given (repeatable): crop=X,Y,W,H, resize=WxH[:interpolation], "
+               "rotate=90|180|270, flip=h|v|hv, levels=BRIGHTNESS[,CONTRAST], gray, color=CODE (cv2.COLOR_<CODE>)")
 
-            self.root.after(0, self.update_progress, 100.0, 'complete_extract', out_dir)
 
-        except Exception as e:
-            error_details = str(e)
-            print(f"Error in perform_frame_extraction: {e}") # Log detailed error
-            self.root.after(0, self.update_progress, 0.0, 'error_extracting', error_details)
-        finally:
-            if cap and cap.isOpened(): cap.release()
-            self.root.after(0, self.reset_processing_state)
+def _rendition_arg(value):
+    try: parse_rendition(value, 'out.mp4') # Paths are derived per input later
+    except ValueError: raise argparse.ArgumentTypeError(f"{LANGUAGES['en']['error_invalid_rendition']} {value}")
+    return value
 
 
-# --- Run the Application ---
-if __name__ == "__main__":
+def _read_list(value, parse):
+    """Comma separated values, or @FILE with one per line in the first column (a CSV header line is skipped)."""
+    try:
+        if not value.startswith('@'): return [parse(v.strip()) for v in value.split(',') if v.strip()]
+        with open(value[1:], encoding='utf-8') as f:
+            fields = [re.split(r'[,\s]', line.strip(), 1)[0] for line in f if line.strip() and not line.startswith('#')]
+        try: parse(fields[0]) if fields else None
+        except ValueError: fields = fields[1:] # Header
+        return [parse(v) for v in fields]
+    except (OSError, ValueError) as e:
+        raise argparse.ArgumentTypeError(f"Invalid list {value}: {e}")
+
+
+def _split_at_arg(value):
+    return sorted(set(_read_list(value, int)))
+
+
+def _frames_arg(value):
+    return _read_list(value, int)
+
+
+def _times_arg(value):
+    return _read_list(value, parse_seconds)
+
+
+def _cuts_arg(value):
+    """START-END ranges separated by commas, or @FILE with one range per line."""
+    try:
+        if not value.startswith('@'): return parse_time_ranges(value)
+        with open(value[1:], encoding='utf-8') as f:
+            return parse_time_ranges('\n'.join(line for line in f if not line.startswith('#')))
+    except (OSError, ValueError) as e:
+        raise argparse.ArgumentTypeError(f"Invalid cut list {value}: {e}")
+
+
+def _add_scene_args(parser):
+    parser.add_argument('--scene-metric', choices=list(SCENE_THRESHOLDS), default='diff',
+                        help="diff: mean pixel difference; histogram: brightness distribution, ignores motion")
+    parser.add_argument('--scene-threshold', type=float, metavar='0-1',
+                        help=f"Score starting a new scene (defaults: {', '.join(f'{k} {v}' for k, v in SCENE_THRESHOLDS.items())})")
+    parser.add_argument('--min-scene-frames', type=int, default=SceneDetection.min_scene_frames,
+                        help="Ignore cuts closer than this to the previous one")
+
+
+def _scene_detection_from_args(args):
+    return SceneDetection(args.scene_metric, args.scene_threshold, args.min_scene_frames)
+
+
+INPUT_HELP = "Video file(s); glob patterns such as 'clips/*.mp4' and @list.txt (one path per line) are expanded"
+
+
+def build_arg_parser():
+    parser = argparse.ArgumentParser(prog='cropVideo.py --headless',
+                                     description="Process videos or extract frames without the GUI.")
+    parser.add_argument('--index', action='store_true',
+                        help="Use (and build if needed) the frame index sidecar for exact frame counts and seeking")
+    parser.add_argument('-j', '--jobs', type=int, default=default_worker_count(),
+                        help="With several inputs, how many jobs run at the same time (they share the CPU threads)")
+    parser.add_argument('--timings', metavar='JSON', help="Time each stage (decode, resize, encode, ...) and save a summary")
+    parser.add_argument('--trace', metavar='JSON', help="Save every timed span as a Chrome/Perfetto trace")
+    parser.add_argument('--no-probe-cache', action='store_true',
+                        help=f"Always probe the input instead of using {os.path.join(default_cache_dir(), PROBE_CACHE_FILE)}")
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    info_p = sub.add_parser('info', help="Print video information")
+    info_p.add_argument('input', nargs='+', help=INPUT_HELP)
+
+    proc_p = sub.add_parser('process', help="Trim, resize and/or change FPS of a video")
+    proc_p.add_argument('input', nargs='+', help=INPUT_HELP)
+    proc_p.add_argument('-o', '--output', required=True, help="Output video file (a directory for several inputs)")
+    proc_p.add_argument('--start', type=_time_arg, help="Start time HH:MM:SS[.ms]")
+    proc_p.add_argument('--end', type=_time_arg, help="End time HH:MM:SS[.ms]")
+    proc_p.add_argument('--width', type=int, help="Target width")
+    proc_p.add_argument('--height', type=int, help="Target height")
+    proc_p.add_argument('--fps', type=float, help="Output FPS")
+    proc_p.add_argument('--crop', type=_crop_arg, metavar='X,Y,W,H', help="Keep only this region of the frame")
+    proc_p.add_argument('--crop-aspect', type=_aspect_arg, metavar='W:H',
+                        help="Lock the crop to this aspect (height follows width); alone, the largest centered crop")
+    proc_p.add_argument('--interpolation', choices=list(INTERPOLATIONS), default='area', help="Resize filter")
+    proc_p.add_argument('--pipeline-workers', type=int, default=default_worker_count(),
+                        help="Transform threads between the decoder and encoder threads; 0 processes frames sequentially")
+    proc_p.add_argument('--segment-workers', type=int, default=0,
+                        help="Split the frame range over this many processes and join the parts (for long inputs); "
+                             "needs ffmpeg on PATH to join them without re-encoding, otherwise it is ignored")
+    proc_p.add_argument('--no-buffer-pool', dest='reuse_buffers', action='store_false',
+                        help="Allocate new frame buffers for every frame instead of recycling them")
+    proc_p.add_argument('--filter', action='append', default=[], type=_filter_arg, metavar='SPEC',
+                        help=FILTER_HELP + "; they run after --crop and before --width/--height, also for --extract-dir")
+    proc_p.add_argument('--rendition', action='append', default=[], type=_rendition_arg, metavar='WxH[@FPS][=FILE]',
+                        help="Another output from the same decode (repeatable); "
+                             "without =FILE it is written next to -o as <name>_WxH<ext>")
+    proc_p.add_argument('--resume', action='store_true',
+                        help="Encode in segments kept next to the output until the end, so running the same command "
+                             "again after an interruption only encodes the missing ones")
+    proc_p.add_argument('--split-scenes', action='store_true',
+                        help="Write one file per scene, <output>_scene001<ext> and so on (see the --scene-* options)")
+    proc_p.add_argument('--split-at', type=_split_at_arg, default=[], metavar='FRAMES|@FILE',
+                        help="Also start a new file at these source frames: comma separated, or a file such as "
+                             "the output of the scenes command")
+    proc_p.add_argument('--cuts', type=_cuts_arg, default=[], metavar='RANGES|@FILE',
+                        help="Keep only these time ranges, START-END in seconds or HH:MM:SS[.ms], comma separated "
+                             "or one per line in a file; overlapping ranges are merged and all are cut in one pass")
+    proc_p.add_argument('--split-ranges', action='store_true',
+                        help="With --cuts, write one file per range, <output>_range001<ext> and so on, instead of joining them")
+    _add_scene_args(proc_p)
+    proc_p.add_argument('--extract-dir', help="Also save frames into this directory in the same pass")
+    proc_p.add_argument('--extract-format', choices=IMAGE_FORMATS, default='png', help="Image format for --extract-dir")
+    proc_p.add_argument('--extract-every', type=int, default=1, metavar='N',
+                        help="With --extract-dir, save every Nth frame of the whole input")
+    proc_p.add_argument('--extract-preset', choices=list(ENCODER_PRESETS), default='default',
+                        help="Image encoder settings for --extract-dir")
+    proc_p.add_argument('--extract-container', choices=FRAME_CONTAINERS, default='files',
+                        help="How --extract-dir stores the frames, as for extract --container")
+
+    ext_p = sub.add_parser('extract', help="Extract frames as images")
+    ext_p.add_argument('input', nargs='+', help=INPUT_HELP)
+    ext_p.add_argument('-o', '--output-dir', required=True,
+                       help="Directory for the frames (for several inputs, one subdirectory per input)")
+    ext_p.add_argument('--start-frame', type=int, default=0)
+    ext_p.add_argument('--end-frame', type=int, help="Inclusive; defaults to the last frame")
+    ext_p.add_argument('--format', choices=IMAGE_FORMATS, default='png')
+    ext_p.add_argument('--preset', choices=list(ENCODER_PRESETS), default='default',
+                       help="Encoder settings: fastest (PNG level 0, JPEG 90, lossy WebP) or smallest (PNG level 9, "
+                            "optimized JPEG, lossless WebP); the options below override it")
+    ext_p.add_argument('--jpeg-quality', type=int, metavar='0-100')
+    ext_p.add_argument('--jpeg-optimize', action='store_true', default=None, help="Optimized Huffman tables")
+    ext_p.add_argument('--png-compression', type=int, metavar='0-9', help="zlib level; 0 is fastest, 9 smallest")
+    ext_p.add_argument('--webp-quality', type=int, metavar='1-100', help="Lossy WebP quality")
+    ext_p.add_argument('--webp-lossless', action='store_true', default=None)
+    ext_p.add_argument('--container', choices=FRAME_CONTAINERS, default='files',
+                       help="files: one image per frame; tar/zip: the same images in one uncompressed archive; "
+                            "npy: raw frames (after --filter, e.g. resize=WxH) in one memory-mapped array, "
+                            "plus frames_index.npy with their frame numbers")
+    sampling = ext_p.add_mutually_exclusive_group()
+    sampling.add_argument('--every', type=int, default=1, metavar='N', help="Save every Nth frame")
+    sampling.add_argument('--interval', type=float, metavar='SEC', help="Save one frame every SEC seconds")
+    sampling.add_argument('--keyframes', action='store_true', help="Save only keyframes (I-frames)")
+    sampling.add_argument('--scenes', action='store_true', help="Save only the first frame of every scene")
+    sampling.add_argument('--frames', type=_frames_arg, default=[], metavar='LIST|@FILE',
+                          help="Save exactly these frames: comma separated, or a file (e.g. CSV) with one per line")
+    sampling.add_argument('--times', type=_times_arg, default=[], metavar='LIST|@FILE',
+                          help="Save the frames on screen at these times (seconds or HH:MM:SS.ms), as for --frames")
+    _add_scene_args(ext_p)
+    ext_p.add_argument('--filter', action='append', default=[], type=_filter_arg, metavar='SPEC', help=FILTER_HELP)
+    ext_p.add_argument('--dedup', type=int, nargs='?', const=FrameDedup.max_distance, metavar='BITS',
+                       help=f"Skip frames whose perceptual hash is within BITS (of 64, default {FrameDedup.max_distance}) "
+                            f"of the last saved frame's; {DEDUP_MAP_FILE} lists each skipped frame and the one kept")
+    ext_p.add_argument('--dedup-hash', choices=PERCEPTUAL_HASHES, default='dhash',
+                       help="dhash compares neighbouring pixels, ahash pixels against the mean")
+    ext_p.add_argument('--resume', action='store_true',
+                       help=f"Record the saved frames in {CHECKPOINT_FILE} until the end, so running the same command "
+                            "again after an interruption skips the frames already saved")
+    ext_p.add_argument('--writer-workers', type=int, default=default_worker_count(),
+                       help="Threads encoding and writing images; 0 writes them on the reader thread")
+    ext_p.add_argument('--no-buffer-pool', dest='reuse_buffers', action='store_false',
+                       help="Allocate new frame buffers for every frame instead of recycling them")
+
+    scenes_p = sub.add_parser('scenes', help="List the frames where a new scene starts")
+    scenes_p.add_argument('input', nargs='+', help=INPUT_HELP)
+    scenes_p.add_argument('--start-frame', type=int, default=0)
+    scenes_p.add_argument('--end-frame', type=int, help="Inclusive; defaults to the last frame")
+    _add_scene_args(scenes_p)
+    return parser
+
+
+def _print_info(info, index):
+    print(f"{LANGUAGES['en']['duration_label']} {format_time(info.duration)}")
+    print(f"{LANGUAGES['en']['resolution_label']} {info.width}x{info.height}")
+    print(f"{LANGUAGES['en']['fps_label']} {info.fps:.2f}")
+    print(f"Codec: {info.codec or LANGUAGES['en']['na']}")
+    if index is not None:
+        print(f"{LANGUAGES['en']['frames_label']} {index.frame_count} {LANGUAGES['en']['frames_exact']}")
+        print(f"Keyframes: {len(index.keyframes)}")
+    else:
+        print(f"{LANGUAGES['en']['frames_label']} {info.total_frames}")
+
+
+def _print_scenes(args, path, info, index):
+    """One line per scene: its first frame and start time (the format --split-at @FILE reads)."""
+    detection = _scene_detection_from_args(args)
+    if detection.problems(): raise JobError('error_invalid_scene_detection', ', '.join(detection.problems()))
+    if args.start_frame < 0 or (args.end_frame is not None and args.end_frame < args.start_frame):
+        raise JobError('error_invalid_frame_order')
+    for frame in detect_scenes(path, args.start_frame, args.end_frame, detection, index):
+        print(f"{frame}\t{format_time(frame / info.fps) if info.fps else ''}")
+
+
+def _job_from_args(args, input_path, output, extract_dir=None):
+    """The ProcessJob or ExtractJob for one input of the ``process``/``extract`` commands.
+
+    ``extract_dir`` is where a process job saves frames in the same pass (--extract-dir).
+    """
+    if args.command == 'process':
+        extract = None
+        if extract_dir:
+            extract = ExtractJob(input_path, extract_dir, image_format=args.extract_format, frame_step=args.extract_every,
+                                 writer_workers=max(0, args.pipeline_workers), reuse_buffers=args.reuse_buffers,
+                                 filters=args.filter, encoding=ENCODER_PRESETS[args.extract_preset],
+                                 container=args.extract_container)
+        return ProcessJob(input_path, output, args.start, args.end, args.width, args.height, args.fps,
+                          crop=args.crop, crop_aspect=args.crop_aspect,
+                          pipeline_workers=max(0, args.pipeline_workers), segment_workers=max(0, args.segment_workers),
+                          interpolation=args.interpolation, reuse_buffers=args.reuse_buffers,
+                          filters=args.filter, renditions=[parse_rendition(spec, output) for spec in args.rendition],
+                          extract=extract, resume=args.resume, split_at=args.split_at,
+                          split_scenes=_scene_detection_from_args(args) if args.split_scenes else None,
+                          ranges=args.cuts, split_ranges=args.split_ranges)
+    return ExtractJob(input_path, output, args.start_frame, args.end_frame, args.format,
+                      writer_workers=max(0, args.writer_workers), frame_step=args.every,
+                      interval_sec=args.interval, keyframes_only=args.keyframes, reuse_buffers=args.reuse_buffers,
+                      scenes=_scene_detection_from_args(args) if args.scenes else None,
+                      dedup=FrameDedup(args.dedup_hash, args.dedup) if args.dedup is not None else None,
+                      frame_list=args.frames, time_list=args.times,
+                      filters=args.filter, encoding=_encoding_from_args(args), container=args.container,
+                      resume=args.resume)
+
+
+def _encoding_from_args(args):
+    """The --preset encoder settings with the per-format options given on top."""
+    overrides = {name: getattr(args, name) for name in ('jpeg_quality', 'jpeg_optimize', 'png_compression',
+                                                        'webp_quality', 'webp_lossless')}
+    if overrides['webp_quality'] is not None and overrides['webp_lossless'] is None:
+        overrides['webp_lossless'] = False # An explicit quality means lossy, unless lossless is asked for too
+    return replace(ENCODER_PRESETS[args.preset], **{k: v for k, v in overrides.items() if v is not None})
+
+
+def _report_timings(timer, args):
+    """Prints the stage totals of a --timings/--trace run and writes the requested files."""
+    if timer is None: return
+    summary = timer.summary()
+    print(f"Stage timings (wall {summary['wall_ms'] / 1000:.2f} s):", file=sys.stderr)
+    for stage, s in summary['stages'].items():
+        print(f"  {stage:<14}{s['total_ms']:>10.1f} ms {s['count']:>8} x  mean {s['mean_ms']:.3f} ms  p95 < {s['p95_ms']:g} ms",
+              file=sys.stderr)
+    try:
+        if args.timings: timer.save_summary(args.timings)
+        if args.trace: timer.save_trace(args.trace)
+    except OSError as e:
+        print(f"{LANGUAGES['en']['warning']}: Could not save timings: {e}", file=sys.stderr)
+
+
+def _error_text(error):
+    if isinstance(error, JobError): return _cli_message(error.key, *error.params)
+    return str(error)
+
+
+def run_headless(argv):
+    """Entry point for ``cropVideo.py --headless``. Returns a process exit code."""
+    args = build_arg_parser().parse_args(argv)
+    try: inputs = expand_inputs(args.input)
+    except OSError as e:
+        print(f"{_cli_message('error_input_file')} {e}", file=sys.stderr); return 2
+    cache = None if args.no_probe_cache else ProbeCache(os.path.join(default_cache_dir(), PROBE_CACHE_FILE))
+    timer = StageTimer() if args.timings or args.trace else None
+    if inputs != args.input or len(inputs) != 1:
+        try: return _run_batch(args, inputs, cache, timer)
+        finally: _report_timings(timer, args)
+
+    input_path = inputs[0]
+    if not os.path.exists(input_path):
+        print(_cli_message('error_input_file'), file=sys.stderr); return 2
+    try:
+        info = probe_video(input_path, cache)
+        index = load_frame_index(input_path, build=True) if args.index else None
+    except IOError as e:
+        print(_cli_message('error_loading', e), file=sys.stderr); return 2
+
+    def on_warning(key, *params):
+        print(f"\n{LANGUAGES['en']['warning']}: {_cli_message(key, *params)}", file=sys.stderr)
+
+    try:
+        return _run_single(args, input_path, info, index, on_warning, timer)
+    finally:
+        _report_timings(timer, args)
+
+
+def _run_single(args, input_path, info, index, on_warning, timer):
+    try:
+        if args.command == 'info':
+            _print_info(info, index)
+            return 0
+        if args.command == 'scenes':
+            _print_scenes(args, input_path, info, index)
+            return 0
+
+        if args.command == 'process':
+            job = _job_from_args(args, input_path, args.output, args.extract_dir)
+            plan = plan_video_processing(job, info, index)
+            if plan.end_capped: on_warning('warning_end_time_capped', format_time(info.duration))
+            if plan.extract and plan.extract.end_capped:
+                on_warning('error_invalid_frame_range', f"End frame capped to {plan.extract.end_frame}")
+            progress = ProgressTracker()
+            with _CliProgressPrinter(progress, LANGUAGES['en']['processing']):
+                process_video(job, plan, progress, on_warning, timer)
+                progress.finish()
+            outputs = [job.output_path] + [r.output_path for r in job.renditions]
+            if job.split: # As many scene files as the run wrote
+                outputs = []
+                while os.path.exists(scene_output_path(job.output_path, len(outputs) + 1)):
+                    outputs.append(scene_output_path(job.output_path, len(outputs) + 1))
+            elif job.ranges and job.split_ranges:
+                outputs = [range_output_path(job.output_path, n) for n in range(1, len(plan.ranges) + 1)]
+            for output_path in outputs:
+                print(_cli_message('complete_process', output_path))
+            if job.extract: print(_cli_message('complete_extract', frame_output_path(job.extract)))
+        else:
+            job = _job_from_args(args, input_path, args.output_dir)
+            plan = plan_frame_extraction(job, info, index)
+            if plan.end_capped: on_warning('error_invalid_frame_range', f"End frame capped to {plan.end_frame}")
+            progress = ProgressTracker()
+            with _CliProgressPrinter(progress, LANGUAGES['en']['extracting']):
+                extract_frames(job, plan, info.total_frames, progress, on_warning, timer)
+                progress.finish()
+            print(_cli_message('complete_extract', frame_output_path(job)))
+        return 0
+    except JobError as je:
+        print(f"{LANGUAGES['en']['error']}: {_cli_message(je.key, *je.params)}", file=sys.stderr); return 2
+    except Exception as e:
+        key = 'error_processing' if args.command == 'process' else 'error_extracting'
+        print(f"\n{LANGUAGES['en']['error']}: {_cli_message(key, e)}", file=sys.stderr); return 1
+
+
+def _run_batch(args, inputs, cache, timer=None):
+    """Several inputs (a list, glob or @file): one job each on a JobQueue, one status line per change.
+
+    ``-o`` names a directory; videos are written to ``<dir>/<name>_processed<ext>``
+    and frames to ``<dir>/<name>/``.
+    """
+    missing = [path for path in inputs if not os.path.isfile(path)]
+    if not inputs or missing:
+        print(f"{_cli_message('error_input_file')} {' '.join(missing)}", file=sys.stderr); return 2
+
+    if args.command in ('info', 'scenes'):
+        status = 0
+        for path in inputs:
+            print(f"== {path}")
+            try:
+                info, index = probe_video(path, cache), load_frame_index(path, build=True) if args.index else None
+                if args.command == 'info': _print_info(info, index)
+                else: _print_scenes(args, path, info, index)
+            except IOError as e: print(_cli_message('error_loading', e), file=sys.stderr); status = 2
+            except JobError as je: print(f"{LANGUAGES['en']['error']}: {_error_text(je)}", file=sys.stderr); return 2
+        return status
+
+    jobs = []
+    for path in inputs:
+        name, ext = os.path.splitext(os.path.basename(path))
+        if args.command == 'process':
+            extract_dir = os.path.join(args.extract_dir, name) if args.extract_dir else None
+            jobs.append(_job_from_args(args, path, os.path.join(args.output, f"{name}_processed{ext}"), extract_dir))
+        else: jobs.append(_job_from_args(args, path, os.path.join(args.output_dir, name)))
+    if args.command == 'process': outputs = [r.output_path for job in jobs for r in [job, *job.renditions]]
+    else: outputs = [job.output_dir for job in jobs]
+    clashes = sorted({out for out in outputs if outputs.count(out) > 1})
+    if clashes:
+        print(f"{LANGUAGES['en']['error']}: {_cli_message('error_batch_output_clash')} {', '.join(clashes)}", file=sys.stderr); return 2
+    if args.command == 'process': os.makedirs(args.output, exist_ok=True)
+
+    texts = LANGUAGES['en']
+    def on_change(item):
+        line = f"[{job_queue.items.index(item) + 1}/{len(job_queue.items)}] {texts['batch_statuses'][item.status]}: {item.job.input_path}"
+        if item.status == 'done': line += f" ({item.result} {texts['frames']})"
+        elif item.status == 'failed': line += f" - {_error_text(item.error)}"
+        for key, *params in (item.warnings if item.status in ('done', 'failed') else []):
+            line += f"\n    {texts['warning']}: {_cli_message(key, *params)}"
+        print(line, flush=True)
+
+    job_queue = JobQueue(args.jobs, cache, args.index, on_change, timer)
+    for job in jobs: job_queue.add(job)
+    job_queue.start()
+    try: job_queue.wait()
+    except KeyboardInterrupt:
+        job_queue.cancel() # Let the running jobs finish so no half-written outputs are left
+        job_queue.wait()
+    counts = job_queue.counts()
+    print(_cli_message('batch_summary', counts['done'], counts['failed'], counts['cancelled']))
+    return 0 if counts['done'] == len(jobs) else 1
+
+
+def main(argv=None):
+    multiprocessing.freeze_support() # Segment workers are spawned processes, also in PyInstaller builds
+    argv = sys.argv[1:] if argv is None else argv
+    if '--headless' in argv:
+        return run_headless([a for a in argv if a != '--headless'])
     root = tk.Tk()
     app = VideoProcessorApp(root)
-    root.mainloop()
\ No newline at end of file
+    root.mainloop()
+    return 0
+
+
+# --- Run the Application ---
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,35 @@
+import json
+import cv2
+from benchmark import build_cases, run_benchmarks, compare_results, write_synthetic_video, main
+
+
+def test_synthetic_video_is_deterministic(tmp_path):
+    paths = [write_synthetic_video(str(tmp_path / f'{name}.avi'), (64, 48), 5, 'MJPG') for name in ('a', 'b')]
+    with open(paths[0], 'rb') as a, open(paths[1], 'rb') as b:
+        assert a.read() == b.read()
+    cap = cv2.VideoCapture(paths[0])
+    assert int(cap.get(cv2.CAP_PROP_FRAME_COUNT)) == 5
+    cap.release()
+
+
+def test_run_benchmarks(tmp_path):
+    cases = build_cases(['64x48'], [20], ['mp4v'], ['trim', 'resize', 'fps', 'extract'])
+    assert len(cases) == 2 + 5 + 5  # 每种插值方法和每种图片格式各一个用例
+    document = run_benchmarks(cases, str(tmp_path), isolate=False, log=lambda line: None)
+    results = {r['name']: r for r in document['results']}
+    assert all('error' not in r and r['fps'] > 0 for r in results.values())
+    assert results['trim/64x48/20f/mp4v']['output_frames'] == 10
+    assert results['fps/64x48/20f/mp4v']['output_frames'] == 10
+    assert results['extract-jpg/64x48/20f/mp4v']['output_frames'] == 20
+
+    slower = json.loads(json.dumps(document))
+    slower['results'][0]['fps'] /= 2
+    rows, regressions = compare_results(document, slower)
+    assert len(rows) == len(cases) and regressions == [cases[0].name]
+
+
+def test_benchmark_main(tmp_path, capsys):
+    out = tmp_path / 'results.json'
+    assert main(['--resolutions', '64x48', '--frames', '10', '--ops', 'fps', '--in-process', '-o', str(out)]) == 0
+    assert json.loads(out.read_text())['results'][0]['name'] == 'fps/64x48/10f/mp4v'
+    assert main(['--ops', 'fps', '--codecs', 'H265']) == 2
@@ -5,7 +5,9 @@ import cv2
 import tempfile
 import shutil
 from unittest.mock import MagicMock, patch
-from cropVideo import format_time, time_str_to_seconds, LANGUAGES
+from cropVideo import format_time, time_str_to_seconds, LANGUAGES, run_headless
+from videoEngine import probe_video
+from test_videoEngine import make_video, make_scenes_video
 
 # 测试辅助函数
 def test_format_time():
@@ -23,6 +25,130 @@ def test_time_str_to_seconds():
     assert time_str_to_seconds("invalid") is None  # 无效格式
     assert time_str_to_seconds("00:00:-1.000") is None  # 负值
 
+# 测试无界面命令行
+@pytest.fixture
+def video(tmp_path, monkeypatch):
+    monkeypatch.setenv('XDG_CACHE_HOME', str(tmp_path / 'cache'))
+    return make_video(str(tmp_path / 'input.mp4'))
+
+
+def test_headless_info(video, capsys):
+    assert run_headless(['info', video]) == 0
+    assert "64x48" in capsys.readouterr().out
+    assert run_headless(['--index', 'info', video]) == 0
+    assert "60 (exact)" in capsys.readouterr().out
+
+
+def test_headless_process(video, tmp_path):
+    out_path = str(tmp_path / 'out.mp4')
+    assert run_headless(['process', video, '-o', out_path, '--width', '32', '--height', '24']) == 0
+    assert os.path.exists(out_path)
+    assert run_headless(['process', video, '-o', out_path]) == 2  # 未启用任何处理选项
+
+
+def test_headless_crop_and_filters(video, tmp_path):
+    out_path = str(tmp_path / 'out.mp4')
+    assert run_headless(['process', video, '-o', out_path, '--crop', '8,0,32,32']) == 0
+    assert run_headless(['process', video, '-o', out_path, '--crop', '60,0,32,32']) == 2  # 超出画面
+    assert run_headless(['process', video, '-o', out_path, '--crop-aspect', '1:1']) == 0
+    assert run_headless(['process', video, '-o', out_path, '--filter', 'rotate=90', '--filter', 'gray']) == 0
+    assert run_headless(['process', video, '-o', out_path, '--filter', 'color=BGR2BGRA']) == 2  # 视频不支持4通道
+
+
+def test_headless_timings(video, tmp_path):
+    assert run_headless(['--timings', str(tmp_path / 'timings.json'), '--trace', str(tmp_path / 'trace.json'),
+                         'extract', video, '-o', str(tmp_path / 'frames'), '--end-frame', '4']) == 0
+    assert os.path.exists(tmp_path / 'timings.json') and os.path.exists(tmp_path / 'trace.json')
+    assert len(os.listdir(tmp_path / 'frames')) == 5
+
+
+def test_headless_extract_encoding_and_containers(video, tmp_path):
+    assert run_headless(['extract', video, '-o', str(tmp_path / 'fast'), '--end-frame', '1', '--format', 'jpg',
+                         '--preset', 'fastest', '--jpeg-quality', '70']) == 0
+    assert sorted(os.listdir(tmp_path / 'fast')) == ['frame_00.jpg', 'frame_01.jpg']
+    assert run_headless(['extract', video, '-o', str(tmp_path / 'fast'), '--png-compression', '10']) == 2
+    assert run_headless(['extract', video, '-o', str(tmp_path / 'packed'), '--end-frame', '4', '--container', 'npy',
+                         '--filter', 'resize=16x12']) == 0
+    assert sorted(os.listdir(tmp_path / 'packed')) == ['frames.npy', 'frames_index.npy']
+
+
+def test_headless_resume(video, tmp_path):
+    assert run_headless(['extract', video, '-o', str(tmp_path / 'resumed'), '--end-frame', '2', '--resume']) == 0
+    assert sorted(os.listdir(tmp_path / 'resumed')) == ['frame_00.png', 'frame_01.png', 'frame_02.png']  # 完成后不留检查点
+    assert run_headless(['extract', video, '-o', str(tmp_path / 'resumed'), '--container', 'tar', '--resume']) == 2
+    assert run_headless(['process', video, '-o', str(tmp_path / 'resumed.mp4'), '--resume',
+                         '--extract-dir', str(tmp_path / 'same_pass_resumed')]) == 2  # 多输出的一遍处理不能继续
+
+
+def test_headless_batch(video, tmp_path, capsys):
+    # 批量模式: 通配符输入, -o 为输出目录
+    make_video(str(tmp_path / 'second.mp4'))
+    assert run_headless(['-j', '2', 'process', str(tmp_path / '*.mp4'), '-o', str(tmp_path / 'batch'), '--fps', '15']) == 0
+    assert sorted(os.listdir(tmp_path / 'batch')) == ['input_processed.mp4', 'second_processed.mp4']
+    assert "2 done, 0 failed" in capsys.readouterr().out
+    assert run_headless(['extract', video, str(tmp_path / 'missing.mp4'), '-o', str(tmp_path / 'batch')]) == 2
+
+
+def test_headless_renditions(video, tmp_path):
+    # 一次解码写出多个输出, 同时提取帧
+    out_path = str(tmp_path / 'out.mp4')
+    assert run_headless(['process', video, '-o', out_path, '--width', '32', '--height', '24', '--rendition', '16x12@15',
+                         '--extract-dir', str(tmp_path / 'same_pass'), '--extract-every', '30']) == 0
+    assert os.path.exists(tmp_path / 'out_16x12_15fps.mp4')
+    assert sorted(os.listdir(tmp_path / 'same_pass')) == ['frame_00.png', 'frame_30.png']
+    assert run_headless(['process', video, '-o', out_path, '--rendition', '@15=' + out_path]) == 2  # 与主输出同名
+
+
+@pytest.fixture
+def scenes_video(tmp_path, monkeypatch):
+    monkeypatch.setenv('XDG_CACHE_HOME', str(tmp_path / 'cache'))
+    return make_scenes_video(str(tmp_path / 'scenes.mp4'))
+
+
+def test_headless_scenes(scenes_video, tmp_path, capsys):
+    # 场景检测: 列出切点, 再按切点拆分输出
+    assert run_headless(['scenes', scenes_video]) == 0
+    listing = capsys.readouterr().out
+    assert [line.split('\t')[0] for line in listing.splitlines()] == ['0', '20', '45', '60']
+    (tmp_path / 'cuts.txt').write_text(listing)
+    assert run_headless(['scenes', scenes_video, '--scene-threshold', '2']) == 2
+    os.makedirs(tmp_path / 'split')
+    assert run_headless(['process', scenes_video, '-o', str(tmp_path / 'split' / 'clip.mp4'),
+                         '--split-at', '@' + str(tmp_path / 'cuts.txt')]) == 0
+    assert sorted(os.listdir(tmp_path / 'split')) == [f'clip_scene00{n}.mp4' for n in range(1, 5)]
+    assert run_headless(['extract', scenes_video, '-o', str(tmp_path / 'shots'), '--scenes']) == 0
+    assert sorted(os.listdir(tmp_path / 'shots')) == ['frame_00.png', 'frame_20.png', 'frame_45.png', 'frame_60.png']
+
+
+def test_headless_dedup(scenes_video, tmp_path):
+    assert run_headless(['extract', scenes_video, '-o', str(tmp_path / 'unique'), '--dedup', '--end-frame', '29']) == 0
+    assert len(os.listdir(tmp_path / 'unique')) < 30 and os.path.exists(tmp_path / 'unique' / 'frames_dedup.csv')
+    assert run_headless(['extract', scenes_video, '-o', str(tmp_path / 'unique'), '--dedup', '64']) == 2
+
+
+def test_headless_frame_lists(video, tmp_path):
+    # 按帧号/时间列表提取, 列表可来自带表头的 CSV
+    (tmp_path / 'marks.csv').write_text("time,label\n00:00:01.000,a\n0.5,b\n")
+    assert run_headless(['extract', video, '-o', str(tmp_path / 'listed'), '--frames', '40,2,40']) == 0
+    assert sorted(os.listdir(tmp_path / 'listed')) == ['frame_02.png', 'frame_40.png']
+    assert run_headless(['extract', video, '-o', str(tmp_path / 'marked'), '--times', '@' + str(tmp_path / 'marks.csv')]) == 0
+    assert sorted(os.listdir(tmp_path / 'marked')) == ['frame_15.png', 'frame_30.png']
+
+
+def test_headless_cut_list(video, tmp_path):
+    # 剪辑列表: 多个时间段一次解码, 合并输出或每段一个文件
+    out_path = str(tmp_path / 'out.mp4')
+    (tmp_path / 'ranges.txt').write_text("# keep\n0.5-1\n00:00:00.900-00:00:01.200\n")
+    assert run_headless(['process', video, '-o', out_path, '--cuts', '0-0.2, 1.5-2']) == 0
+    assert probe_video(out_path).total_frames == 21
+    os.makedirs(tmp_path / 'ranges')
+    assert run_headless(['process', video, '-o', str(tmp_path / 'ranges' / 'clip.mp4'), '--cuts', '0-0.2, 1.5-2',
+                         '--split-ranges']) == 0
+    assert sorted(os.listdir(tmp_path / 'ranges')) == ['clip_range001.mp4', 'clip_range002.mp4']
+    assert run_headless(['process', video, '-o', out_path, '--cuts', '@' + str(tmp_path / 'ranges.txt')]) == 0
+    assert probe_video(out_path).total_frames == 21
+    assert run_headless(['process', video, '-o', out_path, '--cuts', '1-2', '--start', '00:00:00.500']) == 2
+
 # 使用mock模拟tkinter，避免创建实际窗口
 @patch('cropVideo.tk.Tk')
 @patch('cropVideo.ttk.Style')
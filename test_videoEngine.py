@@ -0,0 +1,1194 @@
+import os
+import tarfile
+import threading
+import time
+import zipfile
+from dataclasses import replace
+import pytest
+import cv2
+import numpy as np
+import videoEngine
+from videoEngine import (JobError, ProcessJob, ExtractJob, VideoInfo, ProgressTracker, ProbeCache, probe_video,
+                         plan_video_processing, plan_frame_extraction, process_video, extract_frames,
+                         split_frame_range, sample_frames, find_keyframes, seek_to_frame, FrameIndex,
+                         build_frame_index, load_frame_index, frame_index_paths, expand_inputs, thread_budget,
+                         JobQueue, StageTimer, FramePool, lock_aspect, largest_centered_crop, parse_aspect,
+                         Rendition, parse_rendition, Crop, Resize, Rotate, Flip, Levels, Grayscale,
+                         ColorConvert, INTERPOLATIONS, parse_filter, optimize_filters, compile_filters, _SharedFramePool,
+                         ImageEncoding, ENCODER_PRESETS, frame_output_path, frame_index_path, CHECKPOINT_FILE,
+                         PreviewDecoder, thumbnail_frames, thumbnail_strip, thumbnail_cache_path,
+                         SceneDetection, scene_scores, detect_scenes, scene_output_path, FrameDedup, perceptual_hash,
+                         hamming_distance, DEDUP_MAP_FILE, plan_seeks, measure_seek_cost, parse_time_ranges,
+                         range_output_path)
+
+
+def make_video(path, frames=60, size=(64, 48), fps=30.0):
+    """Writes a small synthetic video whose frame i shows i in binary as 8 vertical stripes."""
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'mp4v'), fps, size)
+    stripe = size[0] // 8
+    for i in range(frames):
+        frame = np.zeros((size[1], size[0], 3), np.uint8)
+        for bit in range(8):
+            if (i >> bit) & 1: frame[:, bit * stripe:(bit + 1) * stripe] = 255
+        writer.write(frame)
+    writer.release()
+    return path
+
+
+@pytest.fixture
+def video(tmp_path):
+    return make_video(str(tmp_path / 'input.mp4'))
+
+
+INFO = VideoInfo('in.mp4', 30.0, 300, 640, 480)
+
+
+def test_probe_video(video):
+    info = probe_video(video)
+    assert (info.width, info.height, info.total_frames) == (64, 48, 60)
+    assert info.fps == pytest.approx(30.0)
+    assert info.duration == pytest.approx(2.0)
+
+
+def test_probe_cache(video, tmp_path, monkeypatch):
+    opened = []
+    real_capture = cv2.VideoCapture
+    monkeypatch.setattr('videoEngine.cv2.VideoCapture', lambda *a: opened.append(a) or real_capture(*a))
+    store = str(tmp_path / 'cache' / 'probe.json')
+
+    cache = ProbeCache(store)
+    assert probe_video(video, cache) == probe_video(video, cache)
+    assert len(opened) == 1 and os.path.exists(store)
+
+    info = probe_video(video, ProbeCache(store))  # Loaded from the store, not probed again
+    assert len(opened) == 1
+    assert (info.width, info.height, info.total_frames, info.codec) == (64, 48, 60, 'FMP4')
+
+    make_video(video, frames=30)  # Changing the file invalidates its entry
+    assert probe_video(video, ProbeCache(store)).total_frames == 30
+    assert len(opened) == 2
+
+
+def test_probe_video_missing_file(tmp_path):
+    with pytest.raises(IOError):
+        probe_video(str(tmp_path / 'missing.mp4'))
+
+
+def test_plan_video_processing():
+    plan = plan_video_processing(ProcessJob('in.mp4', 'out.mp4', start_sec=1.0, end_sec=2.5), INFO)
+    assert (plan.start_frame, plan.end_frame, plan.frame_count) == (30, 75, 45)
+    assert not plan.resize_needed
+
+    plan = plan_video_processing(ProcessJob('in.mp4', 'out.mp4', start_sec=0, end_sec=60), INFO)
+    assert plan.end_frame == 300 and plan.end_capped
+
+    plan = plan_video_processing(ProcessJob('in.mp4', 'out.mp4', width=320, height=240), INFO)
+    assert plan.resize_needed and (plan.out_width, plan.out_height) == (320, 240)
+
+
+@pytest.mark.parametrize('job, key', [
+    (ProcessJob('in.mp4', 'out.mp4'), 'error_no_op_video'),
+    (ProcessJob('in.mp4', '', output_fps=10), 'error_output_file'),
+    (ProcessJob('in.mp4', 'out.mp4', start_sec=5, end_sec=2), 'error_end_before_start'),
+    (ProcessJob('in.mp4', 'out.mp4', start_sec=20, end_sec=30), 'error_start_too_late'),
+    (ProcessJob('in.mp4', 'out.mp4', width=0, height=240), 'error_invalid_res_positive'),
+    (ProcessJob('in.mp4', 'out.mp4', output_fps=-1), 'error_invalid_fps_positive'),
+    (ProcessJob('in.mp4', 'out.mp4', width=320, interpolation='bogus'), 'error_invalid_interpolation'),
+    (ProcessJob('in.mp4', 'out.mp4', crop=(600, 0, 100, 100)), 'error_invalid_crop'),
+    (ProcessJob('in.mp4', 'out.mp4', crop=(0, 0, 0, 100)), 'error_invalid_crop'),
+    (ProcessJob('in.mp4', 'out.mp4', crop_aspect=-1.0), 'error_invalid_crop'),
+    (ProcessJob('in.mp4', 'out.mp4', split_at=[30], renditions=[Rendition('b.mp4', 320)]), 'error_split_outputs'),
+    (ProcessJob('in.mp4', 'out.mp4', split_scenes=SceneDetection('edges')), 'error_invalid_scene_detection'),
+    (ProcessJob('in.mp4', 'out.mp4', start_sec=1, ranges=[(2, 3)]), 'error_ranges_combination'),
+    (ProcessJob('in.mp4', 'out.mp4', resume=True, renditions=[Rendition('b.mp4', 320)]), 'error_resume_combination'),
+    (ProcessJob('in.mp4', 'out.mp4', resume=True, extract=ExtractJob('in.mp4', 'frames')), 'error_resume_combination'),
+    (ProcessJob('in.mp4', 'out.mp4', output_fps=10, extract=ExtractJob('in.mp4', 'frames', resume=True)),
+     'error_resume_combination'),
+    (ProcessJob('in.mp4', 'out.mp4', resume=True, split_at=[30]), 'error_resume_combination'),
+    (ProcessJob('in.mp4', 'out.mp4', resume=True, ranges=[(2, 3)]), 'error_resume_combination'),
+    (ProcessJob('in.mp4', 'out.mp4', ranges=[(2, 3)], split_at=[30]), 'error_ranges_combination'),
+    (ProcessJob('in.mp4', 'out.mp4', ranges=[(2, 3), (5, 4)]), 'error_end_before_start'),
+    (ProcessJob('in.mp4', 'out.mp4', ranges=[(2, 3), (12, 14)]), 'error_start_too_late'),
+])
+def test_plan_video_processing_errors(job, key):
+    with pytest.raises(JobError) as excinfo:
+        plan_video_processing(job, INFO)
+    assert excinfo.value.key == key
+
+
+def test_plan_spatial_crop():
+    plan = plan_video_processing(ProcessJob('in.mp4', 'out.mp4', crop=(10, 20, 300, 200)), INFO)
+    assert plan.crop == (10, 20, 300, 200) and (plan.out_width, plan.out_height) == (300, 200)
+    assert not plan.resize_needed
+    plan = plan_video_processing(ProcessJob('in.mp4', 'out.mp4', crop=(10, 20, 300, 200), width=150, height=100), INFO)
+    assert plan.resize_needed and (plan.out_width, plan.out_height) == (150, 100)
+    plan = plan_video_processing(ProcessJob('in.mp4', 'out.mp4', crop_aspect=1.0), INFO)
+    assert plan.crop == (80, 0, 480, 480)  # 最大的居中区域
+    plan = plan_video_processing(ProcessJob('in.mp4', 'out.mp4', crop=(0, 0, 320, 1), crop_aspect=16 / 9), INFO)
+    assert plan.crop == (0, 0, 320, 180)
+    assert plan_video_processing(ProcessJob('in.mp4', 'out.mp4', crop=(0, 0, 640, 480), width=320), INFO).crop is None
+
+
+def test_aspect_helpers():
+    assert parse_aspect('16:9') == pytest.approx(16 / 9) and parse_aspect('1.5') == 1.5
+    with pytest.raises(ValueError):
+        parse_aspect('0:9')
+    assert lock_aspect(1280, 1, 16 / 9) == (1280, 720)
+    assert lock_aspect(1, 720, 16 / 9, keep='height') == (1280, 720)
+    assert largest_centered_crop(1920, 1080, 9 / 16) == (656, 0, 608, 1080)
+    assert largest_centered_crop(640, 480, 16 / 9) == (0, 60, 640, 360)
+
+
+@pytest.mark.parametrize('workers', [0, 2])
+def test_process_video_spatial_crop(video, tmp_path, monkeypatch, workers):
+    pools = []
+    monkeypatch.setattr('videoEngine.FramePool', lambda: pools.append(FramePool()) or pools[-1])
+    # 去掉最左边的条纹 (第0位), 剩下第1到7位
+    job = ProcessJob(video, str(tmp_path / 'out.avi'), crop=(8, 0, 56, 48), pipeline_workers=workers)
+    assert process_video(job, plan_video_processing(job, probe_video(video))) == 60
+    cap = cv2.VideoCapture(job.output_path)
+    for i in range(60):
+        ret, frame = cap.read()
+        assert ret and frame.shape == (48, 56, 3)
+        stripes = frame.mean(axis=(0, 2)).reshape(7, -1).mean(axis=1)
+        assert sum(1 << (bit + 1) for bit, level in enumerate(stripes) if level > 127) == i & ~1
+    cap.release()
+    assert pools[0].allocated <= workers * 3 + 3  # 裁剪视图归还的是底层缓冲区
+
+    job = ProcessJob(video, str(tmp_path / 'scaled.avi'), crop=(0, 12, 64, 24), width=32, height=12,
+                     pipeline_workers=workers)
+    assert process_video(job, plan_video_processing(job, probe_video(video))) == 60
+    assert read_frame_indices(job.output_path) == list(range(60))
+    assert probe_video(job.output_path).width == 32
+
+
+def test_plan_frame_extraction(tmp_path):
+    out_dir = str(tmp_path / 'frames')
+    plan = plan_frame_extraction(ExtractJob('in.mp4', out_dir, 10, 500), INFO)
+    assert os.path.isdir(out_dir)
+    assert (plan.start_frame, plan.end_frame, plan.end_capped) == (10, 299, True)
+    with pytest.raises(JobError) as excinfo:
+        plan_frame_extraction(ExtractJob('in.mp4', out_dir, 20, 10), INFO)
+    assert excinfo.value.key == 'error_invalid_frame_order'
+
+
+def test_progress_tracker(monkeypatch):
+    clock = [100.0]
+    monkeypatch.setattr('videoEngine.time.monotonic', lambda: clock[0])
+    progress = ProgressTracker(total=200)
+    assert progress.snapshot().eta is None  # No rate yet
+    clock[0] += 1.0
+    progress.advance(50)
+    snap = progress.snapshot()
+    assert snap.fps == pytest.approx(50.0)
+    assert snap.eta == pytest.approx(3.0)
+    assert snap.percent == pytest.approx(25.0)
+    progress.finish()
+    assert progress.finished and progress.snapshot().eta == 0.0
+
+
+def test_process_video(video, tmp_path):
+    job = ProcessJob(video, str(tmp_path / 'out.mp4'), start_sec=0.5, end_sec=1.5, width=32, height=24)
+    plan = plan_video_processing(job, probe_video(video))
+    progress = ProgressTracker()
+    assert process_video(job, plan, progress) == 30
+    snap = progress.snapshot()
+    assert (snap.done, snap.total, snap.percent) == (30, 30, 100.0)
+    out = probe_video(job.output_path)
+    assert (out.width, out.height, out.total_frames) == (32, 24, 30)
+
+
+def frame_index(frame):
+    """Decodes the frame number drawn by make_video, at any output resolution."""
+    stripes = frame.mean(axis=(0, 2)).reshape(8, -1).mean(axis=1)
+    return sum(1 << bit for bit, level in enumerate(stripes) if level > 127)
+
+
+def read_frame_indices(path):
+    """Source frame index of every frame in ``path``."""
+    cap = cv2.VideoCapture(path)
+    indices = []
+    while True:
+        ret, frame = cap.read()
+        if not ret: break
+        indices.append(frame_index(frame))
+    cap.release()
+    return indices
+
+
+@pytest.mark.parametrize('workers', [1, 3])
+def test_process_video_pipelined_keeps_order(video, tmp_path, workers):
+    job = ProcessJob(video, str(tmp_path / 'out.avi'), width=32, height=24, pipeline_workers=workers)
+    progress = ProgressTracker()
+    assert process_video(job, plan_video_processing(job, probe_video(video)), progress) == 60
+    assert progress.snapshot().done == 60
+    assert read_frame_indices(job.output_path) == list(range(60))
+
+
+def test_frame_pool():
+    pool = FramePool()
+    a = pool.acquire((4, 4, 3))
+    pool.release(a)
+    assert pool.acquire((4, 4, 3)) is a  # 同形状的缓冲区被复用
+    assert pool.acquire((2, 2, 3)) is not a and pool.allocated == 2
+
+
+@pytest.mark.parametrize('workers', [0, 3])
+def test_process_video_reuses_buffers(video, tmp_path, monkeypatch, workers):
+    pools = []
+    monkeypatch.setattr('videoEngine.FramePool', lambda: pools.append(FramePool()) or pools[-1])
+    outputs = []
+    for reuse in (True, False):
+        job = ProcessJob(video, str(tmp_path / f'out_{reuse}.avi'), width=32, height=24,
+                         pipeline_workers=workers, reuse_buffers=reuse)
+        assert process_video(job, plan_video_processing(job, probe_video(video))) == 60
+        outputs.append(read_frame_indices(job.output_path))
+    assert outputs[0] == outputs[1] == list(range(60))
+    # 缓冲区数量只取决于同时在处理中的帧数, 与视频长度无关
+    assert len(pools) == 1 and pools[0].allocated <= 2 * (workers * 3 + 3)
+
+
+def test_extract_frames_reuses_buffers(video, tmp_path, monkeypatch):
+    pools = []
+    monkeypatch.setattr('videoEngine.FramePool', lambda: pools.append(FramePool()) or pools[-1])
+    job = ExtractJob(video, str(tmp_path / 'frames'), 0, 59, 'png', writer_workers=2)
+    info = probe_video(video)
+    assert extract_frames(job, plan_frame_extraction(job, info), info.total_frames) == 60
+    names = sorted(os.listdir(job.output_dir))
+    assert [frame_index(cv2.imread(os.path.join(job.output_dir, n))) for n in names] == list(range(60))
+    assert pools[0].allocated <= 2 * 2 + 3
+
+
+def test_parse_rendition():
+    assert parse_rendition('1280x720', 'out/clip.mp4') == Rendition('out/clip_1280x720.mp4', 1280, 720)
+    assert parse_rendition('854x480@15', 'clip.mp4') == Rendition('clip_854x480_15fps.mp4', 854, 480, 15.0)
+    assert parse_rendition('@12.5=small.avi', 'clip.mp4') == Rendition('small.avi', output_fps=12.5)
+    for spec in ('', '1280', 'axb', '@x'):
+        with pytest.raises(ValueError):
+            parse_rendition(spec, 'clip.mp4')
+
+
+def test_plan_renditions(tmp_path):
+    job = ProcessJob('in.mp4', 'out.mp4', start_sec=1, end_sec=2, renditions=[Rendition('small.avi', 320, 240),
+                                                                             Rendition('slow.mp4', output_fps=10)],
+                     extract=ExtractJob('in.mp4', str(tmp_path / 'frames'), 0, 99, frame_step=10))
+    plan = plan_video_processing(job, INFO)
+    assert [(path, p.out_width, p.output_fps, p.start_frame, p.end_frame) for path, p in plan.renditions] == [
+        ('small.avi', 320, 30.0, 30, 60), ('slow.mp4', 640, 10, 30, 60)]
+    assert list(plan.extract.frames) == list(range(0, 100, 10))
+    # 只有附加输出时主输出也可以不做任何处理
+    assert plan_video_processing(ProcessJob('in.mp4', 'out.mp4', renditions=[Rendition('b.mp4', 320, 240)]), INFO)
+    with pytest.raises(JobError) as e:
+        plan_video_processing(ProcessJob('in.mp4', 'out.mp4', renditions=[Rendition('out.mp4', 320, 240)]), INFO)
+    assert e.value.key == 'error_output_clash'
+    with pytest.raises(JobError) as e:
+        plan_video_processing(ProcessJob('in.mp4', 'out.mp4', renditions=[Rendition('b.mp4', 0, 240)]), INFO)
+    assert e.value.key == 'error_invalid_res_positive'
+
+
+@pytest.mark.parametrize('workers', [0, 2])
+def test_process_video_renditions_single_decode(video, tmp_path, monkeypatch, workers):
+    pools = []
+    monkeypatch.setattr('videoEngine.FramePool', lambda: pools.append(FramePool()) or pools[-1])
+    main = str(tmp_path / 'out.avi')
+    job = ProcessJob(video, main, start_sec=0.5, end_sec=1.5, pipeline_workers=workers,
+                     renditions=[parse_rendition('32x24', main), parse_rendition('@15=' + str(tmp_path / 'slow.avi'), main)],
+                     extract=ExtractJob(video, str(tmp_path / 'frames'), 0, 59, 'png', writer_workers=workers, frame_step=20))
+    plan = plan_video_processing(job, probe_video(video))
+    progress = ProgressTracker()
+    timer = StageTimer()
+    assert process_video(job, plan, progress, timer=timer) == 30 + 30 + 15 + 3
+    assert progress.snapshot().done == progress.snapshot().total == 78
+    assert read_frame_indices(main) == read_frame_indices(str(tmp_path / 'out_32x24.avi')) == list(range(15, 45))
+    assert probe_video(str(tmp_path / 'out_32x24.avi')).width == 32
+    assert read_frame_indices(str(tmp_path / 'slow.avi')) == list(range(15, 45, 2))
+    assert sorted(os.listdir(tmp_path / 'frames')) == ['frame_00.png', 'frame_20.png', 'frame_40.png']
+    assert frame_index(cv2.imread(str(tmp_path / 'frames' / 'frame_40.png'))) == 40
+    # 每个需要的源帧只解码一次: 15..44 加上提取的第0帧
+    assert timer.summary()['stages']['decode']['count'] == 31
+    assert pools[0].allocated <= 3 * (workers * 2 + 3)
+
+
+def test_process_video_renditions_failure_cleans_up(video, tmp_path):
+    job = ProcessJob(video, str(tmp_path / 'out.avi'), width=32, height=24,
+                     renditions=[Rendition(str(tmp_path / 'missing' / 'small.avi'), 16, 12)])
+    with pytest.raises(IOError):
+        process_video(job, plan_video_processing(job, probe_video(video)))
+    assert os.listdir(tmp_path) == ['input.mp4']
+
+
+@pytest.mark.parametrize('container', ['files', 'npy'])
+def test_process_video_multi_failure_removes_extraction(video, tmp_path, monkeypatch, container):
+    real_submit = videoEngine._OutputEncoder.submit
+    def failing_submit(self, frame_index, frame, repeats):
+        if frame_index == 34: raise IOError("encoder failed")
+        real_submit(self, frame_index, frame, repeats)
+    monkeypatch.setattr(videoEngine._OutputEncoder, 'submit', failing_submit)
+    job = ProcessJob(video, str(tmp_path / 'out.avi'), output_fps=15,
+                     extract=ExtractJob(video, str(tmp_path / 'frames'), writer_workers=2, frame_step=10,
+                                        container=container, dedup=FrameDedup()))
+    with pytest.raises(IOError, match="encoder failed"):
+        process_video(job, plan_video_processing(job, probe_video(video)))
+    assert not os.path.exists(job.output_path)
+    assert os.listdir(tmp_path / 'frames') == []  # 已提取的帧和去重映射也被删除
+
+
+def test_process_video_multi_failure_is_not_masked(video, tmp_path, monkeypatch):
+    def failing_write(self, frame_index, frame): raise RuntimeError("writer failed")
+    monkeypatch.setattr(videoEngine.FrameSaver, '_write', failing_write)
+    real_submit = videoEngine._OutputEncoder.submit
+    def failing_submit(self, frame_index, frame, repeats):
+        if frame_index == 20: raise IOError("encoder failed")
+        real_submit(self, frame_index, frame, repeats)
+    monkeypatch.setattr(videoEngine._OutputEncoder, 'submit', failing_submit)
+    job = ProcessJob(video, str(tmp_path / 'out.avi'), output_fps=15,
+                     extract=ExtractJob(video, str(tmp_path / 'frames'), writer_workers=2, frame_step=100))
+    with pytest.raises(IOError, match="encoder failed"):  # 不被写线程存下的错误取代
+        process_video(job, plan_video_processing(job, probe_video(video)))
+
+
+def reference_filters(filters, frame):
+    """What ``filters`` mean, one numpy/cv2 step after another, for checking the optimized chain."""
+    for f in filters:
+        if isinstance(f, Crop): frame = frame[f.y:f.y + f.height, f.x:f.x + f.width]
+        elif isinstance(f, Rotate): frame = np.rot90(frame, -(f.degrees // 90))
+        elif isinstance(f, Flip): frame = frame[::-1 if f.vertical else 1, ::-1 if f.horizontal else 1]
+        elif isinstance(f, Levels): frame = np.clip(np.rint(frame * f.contrast + f.brightness), 0, 255).astype(np.uint8)
+        elif isinstance(f, Grayscale): frame = cv2.cvtColor(np.ascontiguousarray(frame), cv2.COLOR_BGR2GRAY)
+        elif isinstance(f, ColorConvert): frame = cv2.cvtColor(np.ascontiguousarray(frame), getattr(cv2, 'COLOR_' + f.code))
+        elif isinstance(f, Resize):
+            frame = cv2.resize(np.ascontiguousarray(frame), (f.width, f.height), interpolation=INTERPOLATIONS[f.interpolation])
+    return np.ascontiguousarray(frame)
+
+
+def test_filter_chain_matches_reference():
+    rng = np.random.default_rng(7)
+    frame = rng.integers(0, 256, (24, 40, 3), dtype=np.uint8)
+    choices = [lambda: Rotate(int(rng.choice([90, 180, 270]))), lambda: Flip(*rng.integers(0, 2, 2).astype(bool)),
+               lambda: Levels(float(rng.integers(-40, 40)), float(rng.uniform(0.5, 2))),
+               lambda: ColorConvert('BGR2RGB'), lambda: 'crop']
+    for _ in range(200):
+        filters, shape = [], frame.shape
+        for _ in range(rng.integers(1, 6)):
+            f = choices[rng.integers(len(choices))]()
+            if f == 'crop':
+                w, h = int(rng.integers(1, shape[1] + 1)), int(rng.integers(1, shape[0] + 1))
+                f = Crop(int(rng.integers(0, shape[1] - w + 1)), int(rng.integers(0, shape[0] - h + 1)), w, h)
+            if isinstance(f, ColorConvert) and len(shape) < 3: continue
+            filters.append(f)
+            shape = f.output_shape(shape)
+        if rng.integers(2): filters.append(Grayscale())
+        for pool, shared in ((None, False), (FramePool(), False), (_SharedFramePool(FramePool()), True)):
+            source = frame.copy()
+            if shared: pool.share(source, 2)  # 另一个输出也在读这一帧
+            out = compile_filters(filters, pool, shared_input=shared)(source)
+            assert np.array_equal(out, reference_filters(filters, frame)), filters
+            if shared: assert np.array_equal(source, frame)  # 共享的输入帧不会被原地修改
+    # 缩放: 先缩小再放大 (像素化) 不能合并成一次缩放
+    big = np.repeat(np.repeat(frame, 45, axis=0), 25, axis=1)  # 1080x1000
+    for filters in ([Resize(50, 54, 'nearest'), Resize(1000, 1080, 'nearest')],
+                    [Levels(10, 1.5), Resize(50, 54), Flip(True, False), Resize(1000, 1080, 'linear'), Rotate(90)]):
+        assert [s for s in optimize_filters(filters, big.shape) if isinstance(s, Resize)] == \
+               [f for f in filters if isinstance(f, Resize)]
+        assert np.array_equal(compile_filters(filters)(big.copy()), reference_filters(filters, big)), filters
+
+
+def test_optimize_filters():
+    shape = (480, 640, 3)
+    # 裁剪移到最前面 (先于缩放和查找表), 相邻的查找表合并
+    steps = optimize_filters([Levels(10), Resize(320, 240), Crop(0, 0, 160, 120), Levels(-10, 2)], shape)
+    assert [type(s).__name__ for s in steps] == ['Crop', '_Lut', 'Resize', '_Lut']
+    assert steps[0] == Crop(0, 0, 320, 240) and steps[2] == Resize(160, 120)
+    assert len(optimize_filters([Levels(10), Levels(5, 1.5), Flip()], shape)) == 2
+    steps = optimize_filters([Levels(10), Rotate(90), Levels(5)], shape)  # 查找表穿过旋转后合并
+    assert [type(s).__name__ for s in steps] == ['_Lut', '_Orientation']
+    # 旋转和翻转融合为一步, 抵消时整个去掉
+    assert optimize_filters([Rotate(90), Rotate(90), Flip(True, True)], shape) == []
+    assert [type(s).__name__ for s in optimize_filters([Rotate(90), Flip(), Rotate(270)], shape)] == ['_Orientation']
+    # 灰度转换提前, 之后的缩放和旋转只处理单通道
+    steps = optimize_filters([Resize(320, 240), Rotate(90), Grayscale()], shape)
+    assert [type(s).__name__ for s in steps] == ['Grayscale', 'Resize', '_Orientation']
+    assert optimize_filters([Resize(640, 480), Crop(0, 0, 640, 480), Levels()], shape) == []
+    # 连续缩小合并成一次, 缩小后再放大保留两次
+    assert optimize_filters([Resize(320, 240), Resize(160, 120)], shape) == [Resize(160, 120)]
+    assert optimize_filters([Resize(32, 24), Resize(640, 480)], shape) == [Resize(32, 24), Resize(640, 480)]
+
+
+def test_filters_work_in_place():
+    frame = np.zeros((48, 64, 3), np.uint8)
+    pool = FramePool()
+    out = compile_filters([Levels(10), Flip()], pool)(frame)
+    assert out is frame and pool.allocated == 0  # 查找表和翻转都直接写回自己的缓冲区
+    out = compile_filters([Levels(10), Flip()], pool, shared_input=True)(frame)
+    assert out is not frame and pool.allocated == 1 and frame.max() == 10
+
+
+def test_parse_filter():
+    assert parse_filter('crop=1,2,3,4') == Crop(1, 2, 3, 4)
+    assert parse_filter('resize=320x240:cubic') == Resize(320, 240, 'cubic')
+    assert parse_filter('rotate=270') == Rotate(270) and parse_filter('flip=hv') == Flip(True, True)
+    assert parse_filter('levels=-20,1.5') == Levels(-20, 1.5) and parse_filter('levels=15') == Levels(15)
+    assert parse_filter('gray') == Grayscale() and parse_filter('color=BGR2HSV') == ColorConvert('BGR2HSV')
+    for text in ('blur=3', 'flip=x', 'levels=1,2,3', 'rotate=a', 'gray=1'):
+        with pytest.raises(ValueError):
+            parse_filter(text)
+
+
+@pytest.mark.parametrize('filters', [[Rotate(45)], [ColorConvert('NOPE')], [Grayscale(), ColorConvert('BGR2HSV')],
+                                     [Crop(0, 0, 700, 10)]])
+def test_plan_rejects_bad_filters(filters, tmp_path):
+    with pytest.raises(JobError) as e:
+        plan_video_processing(ProcessJob('in.mp4', 'out.mp4', filters=filters), INFO)
+    assert e.value.key in ('error_invalid_filter', 'error_invalid_crop')
+    with pytest.raises(JobError):
+        plan_frame_extraction(ExtractJob('in.mp4', str(tmp_path), filters=filters), INFO)
+
+
+def test_plan_rejects_alpha_video(tmp_path):
+    with pytest.raises(JobError) as e:  # 视频编码器只接受1或3个通道, 图片可以带透明通道
+        plan_video_processing(ProcessJob('in.mp4', 'out.mp4', filters=[ColorConvert('BGR2BGRA')]), INFO)
+    assert e.value.key == 'error_invalid_filter'
+    assert plan_frame_extraction(ExtractJob('in.mp4', str(tmp_path), filters=[ColorConvert('BGR2BGRA')]), INFO)
+
+
+@pytest.mark.parametrize('workers', [0, 2])
+def test_process_video_filters(video, tmp_path, workers):
+    # 水平翻转后条纹顺序反转, 帧号的二进制位也随之反转
+    job = ProcessJob(video, str(tmp_path / 'flipped.avi'), filters=[Flip(), Levels(0, 1.0)], pipeline_workers=workers)
+    assert process_video(job, plan_video_processing(job, probe_video(video))) == 60
+    assert read_frame_indices(job.output_path) == [int(f"{i:08b}"[::-1], 2) for i in range(60)]
+
+    job = ProcessJob(video, str(tmp_path / 'gray.avi'), width=32, height=24, filters=[Grayscale()], pipeline_workers=workers)
+    plan = plan_video_processing(job, probe_video(video))
+    assert not plan.is_color
+    assert process_video(job, plan) == 60
+    assert read_frame_indices(job.output_path) == list(range(60))
+
+
+def test_extract_frames_filters(video, tmp_path):
+    job = ExtractJob(video, str(tmp_path / 'frames'), 0, 9, 'png', writer_workers=2, filters=[Grayscale(), Rotate(90)])
+    info = probe_video(video)
+    assert extract_frames(job, plan_frame_extraction(job, info), info.total_frames) == 10
+    image = cv2.imread(str(tmp_path / 'frames' / 'frame_09.png'), cv2.IMREAD_UNCHANGED)
+    assert image.shape == (64, 48)  # 单通道, 宽高互换
+    assert frame_index(cv2.cvtColor(np.rot90(image), cv2.COLOR_GRAY2BGR)) == 9
+
+
+def test_image_encoding_params():
+    assert ImageEncoding().params('png') == [] and ImageEncoding().params('jpg') == []
+    encoding = ImageEncoding(jpeg_quality=80, jpeg_optimize=True, png_compression=9, webp_quality=60)
+    assert encoding.params('jpg') == [cv2.IMWRITE_JPEG_QUALITY, 80, cv2.IMWRITE_JPEG_OPTIMIZE, 1]
+    assert encoding.params('png') == [cv2.IMWRITE_PNG_COMPRESSION, 9]
+    assert encoding.params('webp') == [cv2.IMWRITE_WEBP_QUALITY, 60]
+    assert encoding.params('bmp') == []
+    assert ImageEncoding(webp_quality=60, webp_lossless=True).params('webp') == [cv2.IMWRITE_WEBP_QUALITY, 101]
+    assert ENCODER_PRESETS['fastest'].params('png')[:2] == [cv2.IMWRITE_PNG_COMPRESSION, 0]
+
+
+def test_plan_frame_extraction_rejects_bad_encoding(tmp_path):
+    job = ExtractJob('in.mp4', str(tmp_path), encoding=ImageEncoding(jpeg_quality=101, png_compression=-1))
+    with pytest.raises(JobError) as excinfo:
+        plan_frame_extraction(job, INFO)
+    assert excinfo.value.key == 'error_invalid_encoding'
+    assert excinfo.value.params == ('jpeg_quality=101, png_compression=-1',)
+
+
+@pytest.mark.parametrize('image_format', ['png', 'jpg', 'webp'])
+def test_extract_frames_encoder_presets(video, tmp_path, image_format):
+    sizes = {}
+    for preset in ('fastest', 'smallest'):
+        job = ExtractJob(video, str(tmp_path / preset), 0, 4, image_format, encoding=ENCODER_PRESETS[preset])
+        info = probe_video(video)
+        assert extract_frames(job, plan_frame_extraction(job, info), info.total_frames) == 5
+        path = os.path.join(job.output_dir, f"frame_04.{image_format}")
+        assert frame_index(cv2.imread(path)) == 4
+        sizes[preset] = os.path.getsize(path)
+    assert sizes['fastest'] > sizes['smallest']
+
+
+@pytest.mark.parametrize('container', ['tar', 'zip'])
+def test_extract_frames_into_archive(video, tmp_path, container):
+    job = ExtractJob(video, str(tmp_path / 'frames'), 0, 9, 'png', writer_workers=2, frame_step=3, container=container)
+    info = probe_video(video)
+    assert extract_frames(job, plan_frame_extraction(job, info), info.total_frames) == 4
+    assert os.listdir(job.output_dir) == [f"frames.{container}"] and frame_output_path(job).endswith(container)
+    if container == 'tar':
+        with tarfile.open(frame_output_path(job)) as archive:
+            members = {m.name: archive.extractfile(m).read() for m in archive.getmembers()}
+    else:
+        with zipfile.ZipFile(frame_output_path(job)) as archive:
+            assert {i.compress_type for i in archive.infolist()} == {zipfile.ZIP_STORED}
+            members = {name: archive.read(name) for name in archive.namelist()}
+    assert sorted(members) == [f"frame_{i:02}.png" for i in (0, 3, 6, 9)]
+    image = cv2.imdecode(np.frombuffer(members['frame_06.png'], np.uint8), cv2.IMREAD_COLOR)
+    assert frame_index(image) == 6
+
+
+@pytest.mark.parametrize('writers', [0, 2])
+def test_extract_frames_into_npy(video, tmp_path, writers):
+    job = ExtractJob(video, str(tmp_path / 'frames'), 10, 19, writer_workers=writers, frame_step=2, container='npy',
+                     filters=[Resize(32, 24)])
+    info = probe_video(video)
+    plan = plan_frame_extraction(job, info)
+    assert plan.frame_shape == (24, 32, 3)
+    assert extract_frames(job, plan, info.total_frames) == 5
+    frames = np.load(frame_output_path(job), mmap_mode='r')
+    assert frames.shape == (5, 24, 32, 3) and frames.dtype == np.uint8
+    assert np.load(frame_index_path(job)).tolist() == [10, 12, 14, 16, 18]
+    assert [frame_index(cv2.resize(f, (64, 48), interpolation=cv2.INTER_NEAREST)) for f in frames] == [10, 12, 14, 16, 18]
+
+
+def test_plan_frame_extraction_rejects_bad_container(tmp_path):
+    with pytest.raises(JobError) as excinfo:
+        plan_frame_extraction(ExtractJob('in.mp4', str(tmp_path), container='rar'), INFO)
+    assert excinfo.value.key == 'error_invalid_container'
+
+
+def test_preview_decoder(video):
+    shown = []
+    ready = threading.Event()
+    decoder = PreviewDecoder(video, (32, 24), cache_frames=8, prefetch=3)
+    decoder.on_frame = lambda i: (shown.append(i), ready.set())
+    def preview_index(i):  # 放大回原尺寸再解码条纹
+        return frame_index(cv2.resize(decoder.get(i), (64, 48), interpolation=cv2.INTER_NEAREST))
+    try:
+        for cursor in (40, 2, 41):
+            ready.clear()
+            decoder.request(cursor)
+            assert ready.wait(5)
+            assert shown[-1] == cursor and decoder.get(cursor).shape == (24, 32, 3) and preview_index(cursor) == cursor
+        for _ in range(500):  # Prefetched after the cursor
+            if decoder.get(44) is not None: break
+            time.sleep(0.01)
+        assert [preview_index(i) for i in (42, 43, 44)] == [42, 43, 44]
+        assert decoder.decoded_count <= 9  # No frame decoded twice: 40..44 and 2..5 at most
+        assert decoder.request(41) is not None  # Cached: returned at once
+        assert sum(decoder.get(i) is not None for i in range(60)) <= 8  # LRU bound
+        ready.clear()
+        decoder.request(500)  # Past the end: nothing to show, the worker keeps going
+        assert not ready.wait(0.5)
+    finally:
+        decoder.close()
+
+
+def test_thumbnail_frames():
+    assert thumbnail_frames(60, 4) == [7, 22, 37, 52]
+    assert thumbnail_frames(0, 4) == []
+    index = FrameIndex(np.arange(60) * 33.3, [0, 12, 24, 36, 48], 30.0)
+    assert thumbnail_frames(60, 4, index) == [12, 24, 36, 48]
+    assert thumbnail_frames(60, 8, index) == [0, 12, 12, 24, 36, 36, 48, 48]  # 重复的关键帧保留，缩略图条保持均匀
+
+
+def test_thumbnail_strip(tmp_path, monkeypatch):
+    monkeypatch.setenv('XDG_CACHE_HOME', str(tmp_path / 'cache'))
+    video = make_video(str(tmp_path / 'input.mp4'))
+    shown = []
+    thumbnails = thumbnail_strip(video, 4, 24, on_thumbnail=lambda i, image: shown.append(i))
+    assert shown == [0, 1, 2, 3] and all(t.shape == (24, 32, 3) for t in thumbnails)
+    assert [frame_index(cv2.resize(t, (64, 48), interpolation=cv2.INTER_NEAREST)) for t in thumbnails] == [7, 22, 37, 52]
+    assert os.path.exists(thumbnail_cache_path(video, 4, 24))
+
+    def no_decoding(*args): raise AssertionError("decoded despite the cache")
+    with monkeypatch.context() as m:  # 第二次打开直接读取缓存，不解码
+        m.setattr(cv2, 'VideoCapture', no_decoding)
+        shown.clear()
+        cached = thumbnail_strip(video, 4, 24, on_thumbnail=lambda i, image: shown.append(i))
+        assert shown == [0, 1, 2, 3] and [t.shape for t in cached] == [(24, 32, 3)] * 4
+
+    stop = threading.Event()
+    stop.set()
+    assert thumbnail_strip(video, 5, 24, stop=stop) == [None] * 5
+    assert not os.path.exists(thumbnail_cache_path(video, 5, 24))  # 未完成的缩略图条不缓存
+    os.utime(video, ns=(0, 0))  # 源文件变化后缓存失效
+    assert not os.path.exists(thumbnail_cache_path(video, 4, 24))
+
+
+SCENES = [(20, 40), (25, 200), (15, 90), (20, 160)]  # (帧数, 亮度)
+
+
+def make_scenes_video(path, scenes=SCENES, size=(64, 48)):
+    """Writes one flat grey level per scene with a small moving square, so only the cuts change much."""
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'mp4v'), 30.0, size)
+    for length, level in scenes:
+        for i in range(length):
+            frame = np.full((size[1], size[0], 3), level, np.uint8)
+            frame[8:16, i:i + 8] = 255 - level
+            writer.write(frame)
+    writer.release()
+    return path
+
+
+def test_scene_scores():
+    rng = np.random.default_rng(0)
+    proxies = rng.integers(0, 256, (5, 9, 16), dtype=np.uint8)
+    expected = [np.abs(proxies[i + 1].astype(int) - proxies[i]).mean() / 255 for i in range(4)]
+    assert np.allclose(scene_scores(proxies), expected)
+    flat = np.zeros((3, 9, 16), np.uint8)
+    flat[1] = 255
+    flat[2, :, :8] = 255
+    assert np.allclose(scene_scores(flat, 'histogram'), [1.0, 0.5])  # 直方图只看亮度分布
+    assert np.allclose(scene_scores(np.stack([flat[2], flat[2][:, ::-1]]), 'histogram'), [0.0])
+    assert len(scene_scores(flat[:1])) == 0
+
+
+def test_detect_scenes(tmp_path, monkeypatch):
+    video = make_scenes_video(str(tmp_path / 'scenes.mp4'))
+    monkeypatch.setattr(videoEngine, 'SCENE_BATCH_FRAMES', 16)  # 跨批次的切点也要找到
+    progress = ProgressTracker()
+    assert detect_scenes(video, progress=progress) == [0, 20, 45, 60]
+    assert progress.snapshot().done == 80
+    assert detect_scenes(video, detection=SceneDetection('histogram')) == [0, 20, 45, 60]
+    assert detect_scenes(video, 10, 50) == [10, 20, 45]
+    assert detect_scenes(video, detection=SceneDetection(min_scene_frames=20)) == [0, 20, 45]
+    assert detect_scenes(video, detection=SceneDetection(threshold=0.9)) == [0]
+
+
+def test_extract_frames_scenes(tmp_path):
+    video = make_scenes_video(str(tmp_path / 'scenes.mp4'))
+    job = ExtractJob(video, str(tmp_path / 'frames'), 5, None, 'png', scenes=SceneDetection())
+    info = probe_video(video)
+    plan = plan_frame_extraction(job, info)
+    assert plan.frames is None
+    assert extract_frames(job, plan, info.total_frames) == 4
+    assert sorted(os.listdir(job.output_dir)) == ['frame_05.png', 'frame_20.png', 'frame_45.png', 'frame_60.png']
+
+
+def test_process_video_split_scenes(tmp_path):
+    video = make_scenes_video(str(tmp_path / 'scenes.mp4'))
+    job = ProcessJob(video, str(tmp_path / 'out.mp4'), split_at=[30], split_scenes=SceneDetection())
+    progress = ProgressTracker()
+    assert process_video(job, plan_video_processing(job, probe_video(video)), progress) == 80
+    assert progress.snapshot().done == 80
+    assert not os.path.exists(job.output_path)
+    counts = [probe_video(scene_output_path(job.output_path, n)).total_frames for n in range(1, 6)]
+    assert counts == [20, 10, 15, 15, 20]
+    assert not os.path.exists(scene_output_path(job.output_path, 6))
+    cap = cv2.VideoCapture(scene_output_path(job.output_path, 4))
+    assert abs(cap.read()[1][30:].mean() - 90) < 10  # 第三个场景的画面
+    cap.release()
+
+
+def make_repeating_video(path, shots=6, repeats=5, size=(64, 48)):
+    """Writes ``shots`` random block textures, each held for ``repeats`` frames (a slideshow)."""
+    rng = np.random.default_rng(1)
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'mp4v'), 30.0, size)
+    for _ in range(shots):
+        blocks = rng.integers(0, 256, (6, 8, 3), dtype=np.uint8)
+        for _ in range(repeats): writer.write(cv2.resize(blocks, size, interpolation=cv2.INTER_NEAREST))
+    writer.release()
+    return path
+
+
+def test_perceptual_hash():
+    rng = np.random.default_rng(2)
+    frame = cv2.resize(rng.integers(0, 256, (6, 8, 3), dtype=np.uint8), (640, 480), interpolation=cv2.INTER_NEAREST)
+    noisy = cv2.add(frame, rng.integers(0, 6, frame.shape, dtype=np.uint8))
+    other = cv2.resize(rng.integers(0, 256, (6, 8, 3), dtype=np.uint8), (640, 480), interpolation=cv2.INTER_NEAREST)
+    for method in ('dhash', 'ahash'):
+        assert 0 <= perceptual_hash(frame, method) < 1 << 64
+        assert hamming_distance(perceptual_hash(frame, method), perceptual_hash(noisy, method)) <= 2
+        assert hamming_distance(perceptual_hash(frame, method), perceptual_hash(other, method)) > 10
+    assert perceptual_hash(cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)) == perceptual_hash(frame)  # 灰度帧同样可用
+
+
+@pytest.mark.parametrize('writers', [0, 2])
+def test_extract_frames_dedup(tmp_path, writers):
+    video = make_repeating_video(str(tmp_path / 'slides.mp4'))
+    job = ExtractJob(video, str(tmp_path / 'frames'), 0, None, 'png', writer_workers=writers, dedup=FrameDedup())
+    info = probe_video(video)
+    progress = ProgressTracker()
+    assert extract_frames(job, plan_frame_extraction(job, info), info.total_frames, progress) == 6
+    assert progress.snapshot().done == 30
+    assert sorted(os.listdir(job.output_dir)) == [f'frame_{n:02}.png' for n in range(0, 30, 5)] + [DEDUP_MAP_FILE]
+    with open(os.path.join(job.output_dir, DEDUP_MAP_FILE)) as f:
+        rows = [line.strip().split(',') for line in f][1:]
+    assert [(int(frame), int(kept)) for frame, kept, _ in rows] == [(n, n - n % 5) for n in range(30) if n % 5]
+
+
+def test_plan_frame_extraction_rejects_bad_dedup(tmp_path):
+    for dedup, resume, key in [(FrameDedup('phash'), False, 'error_invalid_dedup'), (FrameDedup(max_distance=64), False, 'error_invalid_dedup'),
+                               (FrameDedup(), True, 'error_resume_dedup')]:
+        with pytest.raises(JobError) as excinfo:
+            plan_frame_extraction(ExtractJob('in.mp4', str(tmp_path), dedup=dedup, resume=resume), INFO)
+        assert excinfo.value.key == key
+
+
+def test_split_frame_range():
+    assert split_frame_range(10, 20, 3) == [(10, 13), (13, 16), (16, 20)]
+    assert split_frame_range(0, 2, 5) == [(0, 1), (1, 2)]
+    assert split_frame_range(5, 5, 4) == []
+
+
+def test_process_video_segmented(video, tmp_path, monkeypatch):
+    monkeypatch.setattr('videoEngine.can_join_losslessly', lambda: True)  # 没有 ffmpeg 时合并会重新编码, 帧顺序照样可以检查
+    job = ProcessJob(video, str(tmp_path / 'out.avi'), start_sec=0.2, end_sec=1.8, segment_workers=3)
+    plan = plan_video_processing(job, probe_video(video))
+    progress = ProgressTracker()
+    assert process_video(job, plan, progress) == plan.frame_count == 48
+    assert progress.snapshot().done == 48
+    # No frames dropped or duplicated at the segment boundaries
+    assert read_frame_indices(job.output_path) == list(range(6, 54))
+    assert os.listdir(tmp_path) == ['input.mp4', 'out.avi']  # Segment directory cleaned up
+
+
+def test_process_video_segments_need_ffmpeg(video, tmp_path, monkeypatch, capsys):
+    monkeypatch.setattr('videoEngine.can_join_losslessly', lambda: False)
+    def no_segments(*args): raise AssertionError("segmented without ffmpeg")
+    monkeypatch.setattr('videoEngine._process_video_segmented', no_segments)
+    job = ProcessJob(video, str(tmp_path / 'out.avi'), start_sec=0.2, end_sec=1.8, segment_workers=3)
+    assert process_video(job, plan_video_processing(job, probe_video(video))) == 48
+    assert "ignoring segment_workers" in capsys.readouterr().out
+    assert read_frame_indices(job.output_path) == list(range(6, 54))
+
+
+def test_process_video_resume_single_segment(video, tmp_path, monkeypatch):
+    def unexpected(*args, **kwargs): raise AssertionError("a single segment needs no join and no process pool")
+    monkeypatch.setattr('videoEngine.join_video_parts', unexpected)
+    monkeypatch.setattr('videoEngine.ProcessPoolExecutor', unexpected)
+    job = ProcessJob(video, str(tmp_path / 'out.avi'), start_sec=0.2, end_sec=1.8, resume=True)
+    progress = ProgressTracker()
+    assert process_video(job, plan_video_processing(job, probe_video(video)), progress) == 48
+    assert progress.snapshot().done == 48
+    assert read_frame_indices(job.output_path) == list(range(6, 54))
+    assert os.listdir(tmp_path) == ['input.mp4', 'out.avi']
+
+
+def test_process_video_resume_needs_ffmpeg(video, tmp_path, monkeypatch):
+    monkeypatch.setattr('videoEngine.shutil.which', lambda name: None)
+    monkeypatch.setattr('videoEngine.RESUME_SEGMENT_FRAMES', 16)
+    job = ProcessJob(video, str(tmp_path / 'out.avi'), start_sec=0.2, end_sec=1.8, resume=True)
+    with pytest.raises(JobError) as e:
+        plan_video_processing(job, probe_video(video))
+    assert e.value.key == 'error_resume_needs_ffmpeg'
+    with pytest.raises(JobError):  # 分段进程也要合并
+        plan_video_processing(replace(job, segment_workers=2), probe_video(video))
+    monkeypatch.setattr('videoEngine.RESUME_SEGMENT_FRAMES', 9000)
+    assert plan_video_processing(job, probe_video(video)).frame_count == 48  # 一段不需要合并
+
+
+def test_process_video_resume_keeps_segments(video, tmp_path, monkeypatch, capsys):
+    monkeypatch.setattr('videoEngine.can_join_losslessly', lambda: True)  # 没有 ffmpeg 时合并会重新编码, 帧顺序照样可以检查
+    monkeypatch.setattr('videoEngine.RESUME_SEGMENT_FRAMES', 16)
+    job = ProcessJob(video, str(tmp_path / 'out.avi'), start_sec=0.2, end_sec=1.8, resume=True)
+    plan = plan_video_processing(job, probe_video(video))
+    real_join = videoEngine.join_video_parts
+    def failing_join(*args): raise IOError("disk full")
+    monkeypatch.setattr('videoEngine.join_video_parts', failing_join)
+    with pytest.raises(IOError):
+        process_video(job, plan)
+    work_dir = tmp_path / '.out.avi.segments'
+    assert sorted(os.listdir(work_dir)) == ['part_0000.avi', 'part_0001.avi', 'part_0002.avi', 'segments.json']
+    assert not os.path.exists(job.output_path)
+
+    with open(work_dir / 'part_0001.avi', 'ab') as f: f.write(b'x')  # A damaged part is encoded again
+    monkeypatch.setattr('videoEngine.join_video_parts', real_join)
+    capsys.readouterr()
+    assert process_video(job, plan) == 48
+    assert "Resuming: 2 of 3 segments already encoded" in capsys.readouterr().out
+    assert read_frame_indices(job.output_path) == list(range(6, 54))
+    assert sorted(os.listdir(tmp_path)) == ['input.mp4', 'out.avi']
+
+
+def test_process_video_resume_past_end(video, tmp_path):
+    job = ProcessJob(video, str(tmp_path / 'out.avi'), start_sec=0.2, end_sec=1.8, resume=True)
+    plan = replace(plan_video_processing(job, probe_video(video)), start_frame=100, end_frame=148)  # 视频只有 60 帧
+    with pytest.raises(IOError, match="No frames could be read"):
+        process_video(job, plan)
+    assert not os.path.exists(job.output_path)
+
+
+class _Interrupted(Exception):
+    pass
+
+
+class _InterruptingProgress(ProgressTracker):
+    """Stops the run after ``limit`` frames, like a crash between two frames."""
+    def __init__(self, limit):
+        super().__init__()
+        self.limit = limit
+
+    def advance(self, count=1):
+        super().advance(count)
+        if self.snapshot().done >= self.limit: raise _Interrupted()
+
+
+def test_extract_frames_resume(video, tmp_path, monkeypatch):
+    job = ExtractJob(video, str(tmp_path / 'frames'), 0, 9, 'png', resume=True)
+    info = probe_video(video)
+    plan = plan_frame_extraction(job, info)
+    with pytest.raises(_Interrupted):
+        extract_frames(job, plan, info.total_frames, _InterruptingProgress(6))
+    assert CHECKPOINT_FILE in os.listdir(job.output_dir)
+    with open(os.path.join(job.output_dir, 'frame_02.png'), 'r+b') as f: f.truncate(10)  # Damaged: saved again
+
+    written = []
+    real_imwrite = cv2.imwrite
+    monkeypatch.setattr('videoEngine.cv2.imwrite', lambda path, *a: written.append(os.path.basename(path)) or real_imwrite(path, *a))
+    assert extract_frames(job, plan, info.total_frames) == 10
+    assert written == ['frame_02.png'] + [f"frame_{i:02}.png" for i in range(6, 10)]
+    assert CHECKPOINT_FILE not in os.listdir(job.output_dir)  # Finished: nothing left to resume
+    names = sorted(os.listdir(job.output_dir))
+    assert [frame_index(cv2.imread(os.path.join(job.output_dir, n))) for n in names] == list(range(10))
+
+    other = ExtractJob(video, job.output_dir, 0, 9, 'jpg', resume=True)  # A different job ignores the checkpoint
+    with pytest.raises(_Interrupted):
+        extract_frames(other, plan_frame_extraction(other, info), info.total_frames, _InterruptingProgress(2))
+    written.clear()
+    assert extract_frames(job, plan, info.total_frames) == 10 and len(written) == 10
+
+
+def test_extract_frames_resume_npy(video, tmp_path, capsys):
+    job = ExtractJob(video, str(tmp_path / 'frames'), 0, 59, container='npy', frame_step=6, resume=True)
+    info = probe_video(video)
+    plan = plan_frame_extraction(job, info)
+    with pytest.raises(_Interrupted):
+        extract_frames(job, plan, info.total_frames, _InterruptingProgress(4))
+    capsys.readouterr()
+    assert extract_frames(job, plan, info.total_frames) == 10
+    assert "Resuming: " in capsys.readouterr().out
+    assert np.load(frame_index_path(job)).tolist() == list(range(0, 60, 6))
+    assert [frame_index(f) for f in np.load(frame_output_path(job))] == list(range(0, 60, 6))
+
+
+def test_plan_frame_extraction_rejects_resuming_archives(tmp_path):
+    with pytest.raises(JobError) as excinfo:
+        plan_frame_extraction(ExtractJob('in.mp4', str(tmp_path), container='zip', resume=True), INFO)
+    assert excinfo.value.key == 'error_resume_container'
+
+
+def test_process_video_segmented_failure_cleans_up(video, tmp_path, monkeypatch):
+    monkeypatch.setattr('videoEngine.can_join_losslessly', lambda: True)
+    job = ProcessJob(str(tmp_path / 'missing.mp4'), str(tmp_path / 'out.avi'), output_fps=10, segment_workers=2)
+    with pytest.raises(IOError):
+        process_video(job, plan_video_processing(job, probe_video(video)))
+    assert os.listdir(tmp_path) == ['input.mp4']
+
+
+@pytest.mark.parametrize('writers', [0, 3])
+def test_extract_frames(video, tmp_path, writers):
+    job = ExtractJob(video, str(tmp_path / 'frames'), 5, 9, 'png', writer_workers=writers)
+    info = probe_video(video)
+    progress = ProgressTracker()
+    assert extract_frames(job, plan_frame_extraction(job, info), info.total_frames, progress) == 5
+    assert progress.snapshot().done == 5
+    names = sorted(os.listdir(job.output_dir))
+    assert names == [f"frame_{i:02}.png" for i in range(5, 10)]
+    assert [frame_index(cv2.imread(os.path.join(job.output_dir, n))) for n in names] == list(range(5, 10))
+
+
+def test_extract_frames_reports_failed_saves(video, tmp_path):
+    job = ExtractJob(video, str(tmp_path / 'frames'), 0, 3, 'png', writer_workers=2)
+    info = probe_video(video)
+    plan = plan_frame_extraction(job, info)
+    os.mkdir(os.path.join(job.output_dir, 'frame_02.png'))  # A directory where frame 2 should go
+    warnings = []
+    assert extract_frames(job, plan, info.total_frames, on_warning=lambda *w: warnings.append(w)) == 3
+    assert [(key, index) for key, index, _ in warnings] == [('error_saving_frame', 2)]
+
+
+def test_extract_frames_writer_thread_failure(video, tmp_path):
+    job = ExtractJob(video, str(tmp_path / 'frames'), 0, 59, 'png', writer_workers=2)
+    info = probe_video(video)
+    plan = plan_frame_extraction(job, info)
+    errors = []
+    def run():
+        try: extract_frames(job, plan, info.total_frames, _InterruptingProgress(3))
+        except _Interrupted as e: errors.append(e)
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    thread.join(30)
+    assert not thread.is_alive()  # 写线程出错后不会卡在满队列上
+    assert len(errors) == 1
+
+
+def test_sample_frames():
+    assert list(sample_frames(10, 30, 30.0, frame_step=5)) == [10, 15, 20, 25, 30]
+    assert sample_frames(0, 100, 30.0, interval_sec=1.0) == [0, 30, 60, 90]
+    assert sample_frames(0, 4, 30.0, interval_sec=0.01) == [0, 1, 2, 3, 4]  # Never duplicates a frame
+
+
+def test_plan_frame_extraction_rejects_bad_sampling(tmp_path):
+    with pytest.raises(JobError) as excinfo:
+        plan_frame_extraction(ExtractJob('in.mp4', str(tmp_path), frame_step=0), INFO)
+    assert excinfo.value.key == 'error_invalid_sampling'
+
+
+@pytest.mark.parametrize('sampling, expected', [
+    ({'frame_step': 7}, list(range(3, 58, 7))),
+    ({'interval_sec': 0.5}, [3, 18, 33, 48]),
+])
+def test_extract_frames_sampled(video, tmp_path, sampling, expected):
+    job = ExtractJob(video, str(tmp_path / 'frames'), 3, 57, 'png', **sampling)
+    info = probe_video(video)
+    assert extract_frames(job, plan_frame_extraction(job, info), info.total_frames) == len(expected)
+    names = sorted(os.listdir(job.output_dir))
+    assert [frame_index(cv2.imread(os.path.join(job.output_dir, n))) for n in names] == expected
+
+
+def test_extract_keyframes(tmp_path):
+    video = make_video(str(tmp_path / 'long.mp4'), frames=200)
+    keyframes = find_keyframes(video)
+    assert keyframes and keyframes[0] == 0
+    job = ExtractJob(video, str(tmp_path / 'frames'), 1, 199, 'png', keyframes_only=True)
+    info = probe_video(video)
+    assert extract_frames(job, plan_frame_extraction(job, info), info.total_frames) == len(keyframes) - 1
+    names = sorted(os.listdir(job.output_dir))
+    assert [frame_index(cv2.imread(os.path.join(job.output_dir, n))) for n in names] == keyframes[1:]
+
+
+def test_extract_frames_seeks_across_long_gaps(tmp_path):
+    video = make_video(str(tmp_path / 'long.mp4'), frames=300)
+    job = ExtractJob(video, str(tmp_path / 'frames'), 0, 299, 'png', frame_step=125)
+    info = probe_video(video)
+    assert extract_frames(job, plan_frame_extraction(job, info), info.total_frames) == 3
+    names = sorted(os.listdir(job.output_dir))
+    assert [frame_index(cv2.imread(os.path.join(job.output_dir, n))) for n in names] == [0, 125, 250]
+
+
+def test_plan_seeks():
+    assert plan_seeks([5, 40, 45, 200], 20) == [False, True, False, True]
+    index = FrameIndex(np.arange(300) * 33.3, [0, 30, 60, 90, 120, 150, 180], 30.0)
+    # 有索引时, 只有跳过的帧数超过代价才值得跳转: 到 59 只能落在 30, 只比逐帧抓取少 9 帧
+    assert plan_seeks([20, 59, 100, 110, 250], 20, index) == [False, False, True, False, True]
+
+
+@pytest.mark.parametrize('seek_cost', [None, 0.5, 1e9])  # 实测 / 总是跳转 / 总是抓取
+def test_extract_frame_list(tmp_path, monkeypatch, seek_cost):
+    video = make_video(str(tmp_path / 'long.mp4'), frames=256)
+    if seek_cost is not None: monkeypatch.setattr(videoEngine, 'measure_seek_cost', lambda *args: seek_cost)
+    else: assert measure_seek_cost(video) >= 1
+    job = ExtractJob(video, str(tmp_path / 'frames'), image_format='png', frame_list=[250, 3, 3, 120, 7, 900], time_list=[1.0])
+    info = probe_video(video)
+    plan = plan_frame_extraction(job, info)
+    assert list(plan.frames) == [3, 7, 30, 120, 250] and plan.end_capped  # 排序去重, 超出视频的帧被丢弃
+    assert extract_frames(job, plan, info.total_frames) == 5
+    names = sorted(os.listdir(job.output_dir))
+    assert [frame_index(cv2.imread(os.path.join(job.output_dir, n))) for n in names] == [3, 7, 30, 120, 250]
+    for bad, key in [({'frame_list': [-1]}, 'error_invalid_frame_positive'), ({'time_list': [60.0]}, 'error_invalid_frame_range')]:
+        with pytest.raises(JobError) as excinfo:
+            plan_frame_extraction(ExtractJob(video, str(tmp_path / 'frames'), **bad), info)
+        assert excinfo.value.key == key
+
+
+def test_plan_cut_list():
+    assert parse_time_ranges('00:00:01-2.5; 3-00:00:04.500\n') == [(1.0, 2.5), (3.0, 4.5)]
+    with pytest.raises(ValueError):
+        parse_time_ranges('1-2, 3')
+    job = ProcessJob('in.mp4', 'out.mp4', ranges=[(5, 6), (1, 2), (1.5, 3), (3, 4), (9, 20)])
+    plan = plan_video_processing(job, INFO)
+    # 重叠和相接的区间被合并, 超出视频的结尾被截断
+    assert plan.ranges == [(30, 120), (150, 180), (270, 300)] and plan.end_capped
+    assert (plan.start_frame, plan.end_frame, plan.frame_count, plan.output_frame_count) == (30, 300, 150, 150)
+    plan = plan_video_processing(replace(job, output_fps=15), INFO)
+    assert plan.output_frame_count == 75
+
+
+@pytest.mark.parametrize('seek_cost', [0.5, 1e9])  # 总是跳转 / 总是抓取
+def test_process_video_cut_list(tmp_path, monkeypatch, seek_cost):
+    monkeypatch.setattr(videoEngine, 'measure_seek_cost', lambda *args: seek_cost)
+    video = make_video(str(tmp_path / 'long.mp4'), frames=256)
+    expected = [list(range(3, 15)), [60, 61, 62], list(range(180, 195))]
+    job = ProcessJob(video, str(tmp_path / 'cut.mp4'), ranges=[(0.1, 0.3), (6.0, 6.5), (0.25, 0.5), (2.0, 2.1)])
+    progress = ProgressTracker()
+    assert process_video(job, plan_video_processing(job, probe_video(video)), progress) == 30
+    assert progress.snapshot().done == 30
+    assert read_frame_indices(job.output_path) == sum(expected, [])
+    job = replace(job, output_path=str(tmp_path / 'part.mp4'), split_ranges=True)
+    assert process_video(job, plan_video_processing(job, probe_video(video))) == 30
+    assert not os.path.exists(job.output_path) and not os.path.exists(range_output_path(job.output_path, 4))
+    assert [read_frame_indices(range_output_path(job.output_path, n)) for n in range(1, 4)] == expected
+
+
+def test_frame_index(tmp_path, monkeypatch):
+    monkeypatch.setenv('XDG_CACHE_HOME', str(tmp_path / 'cache'))
+    video = make_video(str(tmp_path / 'long.mp4'), frames=200)
+    assert load_frame_index(video) is None
+    index = load_frame_index(video, build=True)
+    assert index.frame_count == 200
+    assert list(index.keyframes) == find_keyframes(video)
+    assert index.timestamps_ms[30] == pytest.approx(1000.0)
+    assert os.path.exists(video + '.cvidx')
+    assert np.array_equal(load_frame_index(video).timestamps_ms, index.timestamps_ms)
+
+    with open(video, 'ab') as f: f.write(b'\0')  # 源文件变化后旧索引失效
+    assert load_frame_index(video) is None
+
+
+def test_frame_index_falls_back_to_cache_dir(tmp_path, monkeypatch):
+    monkeypatch.setenv('XDG_CACHE_HOME', str(tmp_path / 'cache'))
+    video = make_video(str(tmp_path / 'input.mp4'))
+    save = FrameIndex.save
+    def save_outside_cache(self, path):
+        if not path.startswith(str(tmp_path / 'cache')): raise PermissionError(path)
+        save(self, path)
+    monkeypatch.setattr(FrameIndex, 'save', save_outside_cache)
+    load_frame_index(video, build=True)
+    assert not os.path.exists(video + '.cvidx')
+    assert os.path.exists(frame_index_paths(video)[1])
+    assert load_frame_index(video).frame_count == 60
+    with open(video + '.cvidx', 'wb') as f: f.write(b'garbage')  # 损坏的索引被忽略
+    assert load_frame_index(video).frame_count == 60
+
+
+def test_frame_index_seek_and_plan(tmp_path):
+    video = make_video(str(tmp_path / 'long.mp4'), frames=200)
+    index = build_frame_index(video)
+    cap = cv2.VideoCapture(video)
+    for target in (150, 7, 199):
+        seek_to_frame(cap, target, index)
+        ok, frame = cap.read()
+        assert ok and frame_index(frame) == target
+    cap.release()
+
+    info = probe_video(video)
+    plan = plan_video_processing(ProcessJob(video, str(tmp_path / 'out.avi'), 1.0, 2.0), info, index)
+    assert (plan.start_frame, plan.end_frame) == (30, 60) and plan.frame_index is index
+    job = ExtractJob(video, str(tmp_path / 'frames'), 1, 199, 'png', keyframes_only=True)
+    plan = plan_frame_extraction(job, info, index)
+    assert plan.frames == list(index.keyframes[1:])
+    assert extract_frames(job, plan, info.total_frames) == len(plan.frames)
+
+
+class _InexactCapture:
+    """Stands in for a cv2.VideoCapture whose seeks land ``miss`` frames off, except on multiples of ``gop``."""
+    def __init__(self, miss, gop=30):
+        self.position, self.miss, self.gop = 0, miss, gop
+        self.seeks, self.grabs = [], 0
+
+    def get(self, prop):
+        return float(self.position)
+
+    def set(self, prop, value):
+        self.seeks.append(int(value))
+        self.position = int(value) if value % self.gop == 0 else max(0, int(value) + self.miss)
+
+    def grab(self):
+        self.position += 1
+        self.grabs += 1
+        return True
+
+
+def test_seek_to_frame_repairs_inexact_seeks():
+    cap = _InexactCapture(miss=-5)  # 落在目标之前: 从落点向前抓取
+    seek_to_frame(cap, 95)
+    assert (cap.position, cap.seeks, cap.grabs) == (95, [95], 5)
+    cap = _InexactCapture(miss=3)  # 越过目标: 没有索引时才回到开头
+    seek_to_frame(cap, 95)
+    assert (cap.position, cap.seeks, cap.grabs) == (95, [95, 0], 95)
+    index = FrameIndex(np.arange(300) * 33.3, [0, 30, 60, 90, 120], 30.0)
+    cap = _InexactCapture(miss=8, gop=60)  # 跳到关键帧 90 时越过目标, 退回上一个关键帧 60
+    seek_to_frame(cap, 95, index)
+    assert (cap.position, cap.seeks, cap.grabs) == (95, [90, 60], 35)
+    seek_to_frame(cap, 118, index)  # 已经在关键帧 90 之后: 直接向前抓取, 不跳转
+    assert (cap.position, cap.seeks, cap.grabs) == (118, [90, 60], 58)
+
+
+def test_resample_schedule():
+    plan = plan_video_processing(ProcessJob('in.mp4', 'out.mp4', output_fps=7.5), INFO)
+    assert [plan.repeats(i) for i in range(8)] == [1, 0, 0, 0, 1, 0, 0, 0]
+    assert plan.output_frame_count == 75  # 10 s at 7.5 fps, duration preserved
+    plan = plan_video_processing(ProcessJob('in.mp4', 'out.mp4', output_fps=60), INFO)
+    assert plan.repeats(0) == 2 and plan.output_frame_count == 600
+
+
+@pytest.mark.parametrize('fps, workers, expected', [
+    (15, {}, list(range(0, 60, 2))),
+    (15, {'pipeline_workers': 2}, list(range(0, 60, 2))),
+    (60, {}, [i // 2 for i in range(120)]),
+    (10, {'segment_workers': 3}, list(range(0, 60, 3))),
+])
+def test_process_video_resamples_fps(video, tmp_path, fps, workers, expected):
+    job = ProcessJob(video, str(tmp_path / 'out.avi'), output_fps=fps, **workers)
+    progress = ProgressTracker()
+    assert process_video(job, plan_video_processing(job, probe_video(video)), progress) == len(expected)
+    assert progress.snapshot().done == len(expected)
+    assert read_frame_indices(job.output_path) == expected
+    assert probe_video(job.output_path).duration == pytest.approx(2.0)
+
+
+def test_expand_inputs(tmp_path):
+    for name in ('b.mp4', 'a.mp4', 'c.avi'):
+        (tmp_path / name).write_bytes(b'')
+    listing = tmp_path / 'list.txt'
+    listing.write_text(f"# 注释\n{tmp_path / 'c.avi'}\n\n{tmp_path / 'a.mp4'}\n")
+    assert expand_inputs([str(tmp_path / '*.mp4'), '@' + str(listing)]) == \
+        [str(tmp_path / 'a.mp4'), str(tmp_path / 'b.mp4'), str(tmp_path / 'c.avi')]
+
+
+def test_thread_budget():
+    assert thread_budget(1, cpus=8) == (4, 8)
+    assert thread_budget(4, cpus=8) == (1, 2)
+    assert thread_budget(16, cpus=8) == (0, 1)
+
+
+def test_job_queue(tmp_path):
+    videos = [make_video(str(tmp_path / f'in{i}.mp4'), frames=20) for i in range(3)]
+    job_queue = JobQueue(max_concurrent=2)
+    for i, video in enumerate(videos):
+        job_queue.add(ProcessJob(video, str(tmp_path / f'out{i}.avi'), width=32, height=24, pipeline_workers=4))
+    job_queue.add(ExtractJob(videos[0], str(tmp_path / 'frames'), 0, 9, 'png', writer_workers=4))
+    job_queue.add(ProcessJob(videos[1], str(tmp_path / 'noop.avi')))  # 未启用任何处理选项
+    cv_threads = cv2.getNumThreads()
+    items = job_queue.run()
+    assert [item.status for item in items] == ['done', 'done', 'done', 'done', 'failed']
+    assert [item.result for item in items[:4]] == [20, 20, 20, 10]
+    assert items[4].error.key == 'error_no_op_video'
+    assert all(item.progress.finished for item in items)
+    assert read_frame_indices(str(tmp_path / 'out2.avi')) == list(range(20))
+    assert cv2.getNumThreads() == cv_threads
+
+
+def test_job_queue_cancel(tmp_path):
+    video = make_video(str(tmp_path / 'input.mp4'), frames=20)
+    changes = []
+    job_queue = JobQueue(on_change=lambda item: changes.append(item.status))
+    for i in range(3):
+        job_queue.add(ProcessJob(video, str(tmp_path / f'out{i}.avi'), width=32, height=24))
+    job_queue.cancel()
+    job_queue.run()
+    assert job_queue.counts() == {'queued': 0, 'running': 0, 'done': 0, 'failed': 0, 'cancelled': 3}
+    assert changes == ['cancelled'] * 3
+    assert os.listdir(tmp_path) == ['input.mp4']
+
+
+def test_stage_timer():
+    timer = StageTimer(max_events=3)
+    for duration_us in (1, 3, 3, 700):
+        timer.record('decode', 1000, 1000 + duration_us * 1000)
+    other = StageTimer()
+    other.record('encode', 0, 5000)
+    timer.merge(other.state())
+    summary = timer.summary()
+    decode = summary['stages']['decode']
+    assert decode['count'] == 4 and decode['total_ms'] == pytest.approx(0.707)
+    assert decode['max_ms'] == pytest.approx(0.7)
+    assert decode['p50_ms'] == 0.004 and decode['p99_ms'] == 1.024  # 桶上界: 2**k 微秒
+    assert [b['count'] for b in decode['histogram']] == [1, 2, 1]
+    assert summary['stages']['encode']['count'] == 1
+    assert summary['dropped_events'] == 2  # 事件数量受 max_events 限制
+    spans = [e for e in timer.chrome_trace()['traceEvents'] if e['ph'] == 'X']
+    assert len(spans) == 3 and spans[0]['dur'] == 1.0
+
+
+@pytest.mark.parametrize('workers', [{}, {'pipeline_workers': 2}, {'segment_workers': 2}])
+def test_process_video_timings(video, tmp_path, monkeypatch, workers):
+    monkeypatch.setattr('videoEngine.can_join_losslessly', lambda: True)
+    job = ProcessJob(video, str(tmp_path / 'out.avi'), width=32, height=24, output_fps=15, **workers)
+    timer = StageTimer()
+    assert process_video(job, plan_video_processing(job, probe_video(video)), timer=timer) == 30
+    stages = timer.summary()['stages']
+    assert stages['decode']['count'] == stages['resize']['count'] == stages['encode']['count'] == 30
+    assert stages['grab']['count'] == 30
+    pids = {e['pid'] for e in timer.chrome_trace()['traceEvents']}
+    assert len(pids) == (3 if workers.get('segment_workers') else 1)  # 分段模式: 主进程拼接 + 两个子进程
+
+
+def test_extract_frames_timings(tmp_path):
+    video = make_video(str(tmp_path / 'long.mp4'), frames=300)
+    job = ExtractJob(video, str(tmp_path / 'frames'), 0, 299, 'png', writer_workers=2, frame_step=125)
+    info = probe_video(video)
+    timer = StageTimer()
+    assert extract_frames(job, plan_frame_extraction(job, info), info.total_frames, timer=timer) == 3
+    stages = timer.summary()['stages']
+    assert stages['decode']['count'] == stages['imwrite']['count'] == stages['frame']['count'] == 3
+    assert stages['seek']['count'] == 2
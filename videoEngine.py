@@ -0,0 +1,3145 @@
+"""GUI-free video processing engine.
+
+Everything in here works on plain job specs and callbacks so it can be driven
+from the Tk front-end in cropVideo.py as well as from the headless CLI
+(``python cropVideo.py --headless ...``) on machines without a display.
+"""
+import bisect
+import glob
+import hashlib
+import heapq
+import io
+import json
+import math
+import multiprocessing
+import os
+import queue
+import re
+import shutil
+import statistics
+import struct
+import subprocess
+import tarfile
+import tempfile
+import threading
+import time
+import zipfile
+from collections import OrderedDict, deque
+from concurrent.futures import FIRST_EXCEPTION, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field, replace
+from fractions import Fraction
+from datetime import timedelta
+from typing import Optional, Sequence, Tuple
+
+import cv2
+import numpy as np
+
+DEFAULT_FPS = 30.0
+IMAGE_FORMATS = ['png', 'jpg', 'bmp', 'tiff', 'webp']
+FRAME_CONTAINERS = ['files', 'tar', 'zip', 'npy'] # How extracted frames are stored; see frame_output_path
+INTERPOLATIONS = {'nearest': cv2.INTER_NEAREST, 'linear': cv2.INTER_LINEAR, 'cubic': cv2.INTER_CUBIC,
+                  'area': cv2.INTER_AREA, 'lanczos4': cv2.INTER_LANCZOS4}
+PIPELINE_QUEUE_PER_WORKER = 2 # Frames in flight per transform worker
+GRAB_MAX_GAP = 120 # Gaps between wanted frames up to this are grabbed through, larger ones seeked
+SEEK_PROBE_GRABS = 24 # Frames grab()bed by measure_seek_cost() to time one grab
+SEEK_PROBE_SEEKS = 3 # Seeks it times
+KEYFRAME_SCAN_REORDER_SLACK = 16 # Packets past the range still scanned, as B-frames arrive out of order
+CHECKPOINT_FILE = '.cropvideo_checkpoint' # In a resumable extraction's output directory until it finishes
+RESUME_SEGMENT_FRAMES = 9000 # A resumable ProcessJob is encoded in segments of at most this many frames
+PREVIEW_CACHE_FRAMES = 96 # Downscaled frames a PreviewDecoder keeps
+PREVIEW_PREFETCH = 12 # Frames a PreviewDecoder decodes after the cursor while it is idle
+THUMBNAIL_CACHE_QUALITY = 85 # JPEG quality of the cached thumbnail strips
+SCENE_THRESHOLDS = {'diff': 0.12, 'histogram': 0.3} # Default cut score per SceneDetection metric
+SCENE_HISTOGRAM_BINS = 32
+SCENE_BATCH_FRAMES = 256 # Proxies scored together by one vectorized scene_scores() call
+PERCEPTUAL_HASHES = ['dhash', 'ahash'] # FrameDedup methods
+DEDUP_MAP_FILE = 'frames_dedup.csv' # In the output directory of an ExtractJob with dedup
+
+
+def default_worker_count():
+    """Worker threads to use when the caller does not choose.
+
+    Capped low because cv2.resize and the codecs are already multi-threaded.
+    """
+    return max(1, min(4, (os.cpu_count() or 1) - 1))
+
+
+# --- Helper Functions ---
+
+def format_time(seconds):
+    """Converts seconds to HH:MM:SS.ms format accurately using integer math."""
+    if seconds is None or math.isnan(seconds) or seconds < 0:
+        seconds = 0
+    try:
+        # Create timedelta object
+        delta = timedelta(seconds=seconds)
+
+        # Extract total days, remaining seconds, and microseconds
+        days = delta.days
+        secs = delta.seconds
+        microsecs = delta.microseconds
+
+        # Calculate total hours, minutes, seconds
+        total_hours = days * 24 + secs // 3600
+        total_minutes = (secs % 3600) // 60
+        total_seconds = secs % 60
+        total_milliseconds = microsecs // 1000
+
+        return f"{int(total_hours):02}:{int(total_minutes):02}:{int(total_seconds):02}.{int(total_milliseconds):03}"
+    except OverflowError:
+         # Handle potential overflow for extremely large second values if necessary
+         print(f"Warning: format_time encountered very large number: {seconds}")
+         return "00:00:00.000" # Or some other indicator
+
+
+def time_str_to_seconds(time_str):
+    """Converts HH:MM:SS or HH:MM:SS.ms string to seconds"""
+    if not time_str: return None
+    try:
+        parts = time_str.split(':')
+        if len(parts) != 3: return None
+        seconds_parts = parts[2].split('.')
+        sec = int(seconds_parts[0])
+        ms = int(seconds_parts[1]) if len(seconds_parts) > 1 else 0
+        if len(seconds_parts) > 1 and len(seconds_parts[1]) > 3:
+             ms = int(seconds_parts[1][:3])
+        # Ensure components are non-negative after parsing
+        if sec < 0 or ms < 0 or int(parts[0]) < 0 or int(parts[1]) < 0:
+             return None # Or raise ValueError
+        total_seconds = int(parts[0]) * 3600 + int(parts[1]) * 60 + sec + ms / 1000.0
+        return total_seconds
+    except Exception:
+        return None
+
+
+def parse_seconds(text):
+    """Seconds as a number or HH:MM:SS[.ms]. Raises ValueError."""
+    try: return float(text)
+    except ValueError: pass
+    seconds = time_str_to_seconds(text)
+    if seconds is None: raise ValueError(f"not a time: {text}")
+    return seconds
+
+
+def parse_time_ranges(text):
+    """'00:01:00-00:01:30, 95.5-100' -> [(60.0, 90.0), (95.5, 100.0)]: START-END items separated
+    by commas, semicolons or new lines, each time as parse_seconds() reads it. Raises ValueError."""
+    ranges = []
+    for item in re.split(r'[,;\n]', text):
+        if not item.strip(): continue
+        start, sep, end = item.partition('-')
+        if not sep: raise ValueError(f"not a START-END range: {item.strip()}")
+        ranges.append((parse_seconds(start.strip()), parse_seconds(end.strip())))
+    return ranges
+
+
+def split_frame_range(start_frame, end_frame, parts):
+    """Splits [start_frame, end_frame) into at most ``parts`` contiguous, non-empty ranges.
+
+    Consecutive ranges share their boundary (one's end is the next one's
+    start), so every frame lands in exactly one range.
+    """
+    total = max(0, end_frame - start_frame)
+    if total == 0: return []
+    parts = max(1, min(parts, total))
+    bounds = [start_frame + total * i // parts for i in range(parts + 1)]
+    return [(bounds[i], bounds[i + 1]) for i in range(parts)]
+
+
+def parse_aspect(text):
+    """'16:9', '16/9' or '1.778' -> width/height as a float. Raises ValueError."""
+    for sep in (':', '/'):
+        if sep in text:
+            w, h = (float(v) for v in text.split(sep))
+            if w <= 0 or h <= 0: raise ValueError(text)
+            return w / h
+    aspect = float(text)
+    if aspect <= 0: raise ValueError(text)
+    return aspect
+
+
+def _even(value):
+    return max(2, int(round(value / 2)) * 2) # 4:2:0 codecs need even dimensions
+
+
+def lock_aspect(width, height, aspect, keep='width'):
+    """(width, height) with the side other than ``keep`` recomputed so width/height is ``aspect``."""
+    if keep == 'width': return width, _even(width / aspect)
+    return _even(height * aspect), height
+
+
+def largest_centered_crop(frame_width, frame_height, aspect):
+    """The biggest (x, y, width, height) region of ``aspect`` centred in the frame."""
+    width, height = frame_width, frame_height
+    if frame_width / frame_height > aspect: width = min(frame_width, _even(frame_height * aspect))
+    else: height = min(frame_height, _even(frame_width / aspect))
+    return (frame_width - width) // 2, (frame_height - height) // 2, width, height
+
+
+def seek_to_frame(cap, frame_index, index=None):
+    """Positions ``cap`` so that the next read() returns frame ``frame_index``.
+
+    With a FrameIndex the seek targets the nearest keyframe at or before the
+    frame, which the container can land on exactly, and grab()s forward from
+    there; a capture already between that keyframe and the frame just grabs
+    forward. Without one it asks OpenCV for the frame. A seek that misses is
+    repaired as cheaply as it can be: by grabbing forward from where it
+    landed when that is before the frame, else from an earlier keyframe of
+    the index, and only as a last resort from the start.
+    """
+    position = int(cap.get(cv2.CAP_PROP_POS_FRAMES))
+    if frame_index <= 0:
+        if position > 0: cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+        return
+    keyframes = index is not None and index.frame_count > 0
+    if keyframes:
+        keyframe = index.keyframe_at_or_before(frame_index)
+        if keyframe <= position <= frame_index: # Already past the keyframe: a seek saves nothing
+            _grab(cap, frame_index - position)
+            return
+        if _seek_exactly(cap, keyframe):
+            _grab(cap, frame_index - keyframe)
+            return
+    elif _seek_exactly(cap, frame_index):
+        return
+    actual = int(cap.get(cv2.CAP_PROP_POS_FRAMES))
+    print(f"Warning: Seek accuracy issue? Requested {frame_index}, got {actual}.")
+    if 0 <= actual < frame_index:
+        _grab(cap, frame_index - actual)
+        return
+    while keyframes and keyframe > 0: # Try the keyframes before the one that missed
+        keyframe = index.keyframe_at_or_before(keyframe - 1)
+        if _seek_exactly(cap, keyframe):
+            _grab(cap, frame_index - keyframe)
+            return
+    print(f"Reading forward from the start to frame {frame_index}.")
+    cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+    _grab(cap, frame_index)
+
+
+def _seek_exactly(cap, frame_index):
+    """Seeks ``cap`` to ``frame_index``; whether it says it landed there."""
+    if frame_index <= 0:
+        cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+        return True
+    cap.set(cv2.CAP_PROP_POS_FRAMES, frame_index)
+    return int(cap.get(cv2.CAP_PROP_POS_FRAMES)) == frame_index
+
+
+def _grab(cap, count):
+    for _ in range(count):
+        if not cap.grab(): break
+
+
+def fourcc_for_path(path):
+    """Picks the VideoWriter fourcc matching the output container."""
+    lower = path.lower()
+    if lower.endswith('.avi'): return cv2.VideoWriter_fourcc(*'XVID')
+    if lower.endswith('.mkv'): return cv2.VideoWriter_fourcc(*'X264')
+    return cv2.VideoWriter_fourcc(*'mp4v') # .mp4, .mov and anything else
+
+
+# --- Progress Reporting ---
+
+@dataclass
+class ProgressSnapshot:
+    """Point-in-time view of a ProgressTracker."""
+    done: int
+    total: int
+    elapsed: float
+    fps: float # Frames/sec over the recent window
+    eta: Optional[float] # Seconds remaining, None while the rate is unknown
+    finished: bool
+
+    @property
+    def percent(self):
+        return min(100.0, self.done * 100.0 / self.total) if self.total > 0 else 0.0
+
+
+class ProgressTracker:
+    """Shared progress counter: workers write to it, front-ends poll it.
+
+    advance() is just an add under a lock, so calling it once per frame is
+    cheap, and readers decide how often they look (the GUI polls at 10 Hz)
+    instead of receiving one callback per frame.
+    """
+    RATE_WINDOW_SEC = 2.0
+
+    def __init__(self, total=0):
+        self._lock = threading.Lock()
+        self.reset(total)
+
+    def reset(self, total=0):
+        with self._lock:
+            self._done = 0
+            self._total = total
+            self._finished = False
+            self._start = time.monotonic()
+            self._samples = deque([(self._start, 0)])
+
+    def set_total(self, total):
+        with self._lock: self._total = total
+
+    def update(self, done):
+        """Sets the absolute count, for progress gathered elsewhere (e.g. other processes)."""
+        with self._lock: self._done = done
+
+    def advance(self, count=1):
+        with self._lock: self._done += count
+
+    def finish(self):
+        with self._lock: self._finished = True
+
+    @property
+    def finished(self):
+        return self._finished
+
+    def snapshot(self):
+        """Current counts plus the frame rate and ETA measured since recent polls."""
+        now = time.monotonic()
+        with self._lock:
+            done, total, finished = self._done, self._total, self._finished
+            samples = self._samples
+            samples.append((now, done))
+            while len(samples) > 2 and now - samples[1][0] >= self.RATE_WINDOW_SEC:
+                samples.popleft()
+            oldest_time, oldest_done = samples[0]
+
+        span = now - oldest_time
+        fps = (done - oldest_done) / span if span > 0 else 0.0
+        eta = None
+        if finished: eta = 0.0
+        elif fps > 0 and total > 0: eta = max(0, total - done) / fps
+        return ProgressSnapshot(done, total, now - self._start, fps, eta, finished)
+
+
+# --- Instrumentation ---
+
+_now = time.perf_counter_ns
+
+
+class StageTimer:
+    """Optional per-stage timing of a job's hot paths.
+
+    Workers that are given a timer bracket each stage of each frame (decode,
+    grab, seek, resize, encode, imwrite, ...) with ``t0 = _now()`` and
+    ``timer.record(stage, t0)``; without one they only pay an ``if timer``
+    test per stage. Per stage it keeps the count, total, maximum and a
+    log2 histogram of durations (bucket k holds durations below 2**k us),
+    plus up to ``max_events`` individual spans for a Chrome trace, which
+    chrome://tracing and ui.perfetto.dev open directly.
+    """
+    HISTOGRAM_BUCKETS = 32
+    MAX_EVENTS = 1000000
+
+    def __init__(self, max_events=MAX_EVENTS):
+        self.max_events = max_events
+        self.origin_ns = _now()
+        self.dropped_events = 0
+        self._pid = os.getpid()
+        self._lock = threading.Lock()
+        self._stages = {} # name -> [count, total_ns, max_ns, histogram]
+        self._events = [] # (name, pid, tid, start_ns, duration_ns)
+        self._threads = {} # (pid, tid) -> thread name
+
+    def record(self, stage, start_ns, end_ns=None):
+        """Adds one span of ``stage`` from ``start_ns`` (a _now() value) to ``end_ns`` or now."""
+        duration = (end_ns if end_ns is not None else _now()) - start_ns
+        bucket = min(self.HISTOGRAM_BUCKETS - 1, (duration // 1000).bit_length())
+        tid = threading.get_ident()
+        with self._lock:
+            entry = self._stages.get(stage)
+            if entry is None: entry = self._stages[stage] = [0, 0, 0, [0] * self.HISTOGRAM_BUCKETS]
+            entry[0] += 1
+            entry[1] += duration
+            if duration > entry[2]: entry[2] = duration
+            entry[3][bucket] += 1
+            if len(self._events) < self.max_events: self._events.append((stage, self._pid, tid, start_ns, duration))
+            else: self.dropped_events += 1
+            if (self._pid, tid) not in self._threads: self._threads[(self._pid, tid)] = threading.current_thread().name
+
+    def wrap(self, stage, func):
+        """``func`` with each call recorded as ``stage``."""
+        def timed(*args):
+            start = _now()
+            try: return func(*args)
+            finally: self.record(stage, start)
+        return timed
+
+    def state(self):
+        """Picklable raw data, for merging timings gathered in another process."""
+        with self._lock:
+            return {'stages': {k: [v[0], v[1], v[2], list(v[3])] for k, v in self._stages.items()},
+                    'events': list(self._events), 'threads': dict(self._threads), 'dropped': self.dropped_events}
+
+    def merge(self, state):
+        with self._lock:
+            for stage, (count, total, longest, histogram) in state['stages'].items():
+                entry = self._stages.setdefault(stage, [0, 0, 0, [0] * self.HISTOGRAM_BUCKETS])
+                entry[0] += count
+                entry[1] += total
+                entry[2] = max(entry[2], longest)
+                entry[3] = [a + b for a, b in zip(entry[3], histogram)]
+            room = max(0, self.max_events - len(self._events))
+            self._events.extend(state['events'][:room])
+            self.dropped_events += state['dropped'] + max(0, len(state['events']) - room)
+            self._threads.update(state['threads'])
+
+    def summary(self):
+        """JSON-ready per-stage totals, means, maxima, approximate percentiles and histograms."""
+        with self._lock:
+            stages = {k: (v[0], v[1], v[2], list(v[3])) for k, v in self._stages.items()}
+            wall_ns = max([s + d for _, _, _, s, d in self._events], default=_now()) - self.origin_ns
+        result = {}
+        for stage, (count, total, longest, histogram) in sorted(stages.items(), key=lambda kv: -kv[1][1]):
+            result[stage] = {
+                'count': count, 'total_ms': round(total / 1e6, 3),
+                'mean_ms': round(total / count / 1e6, 4) if count else 0.0, 'max_ms': round(longest / 1e6, 3),
+                'p50_ms': self._percentile(histogram, count, 0.50), 'p95_ms': self._percentile(histogram, count, 0.95),
+                'p99_ms': self._percentile(histogram, count, 0.99),
+                'histogram': [{'lt_ms': 2 ** k / 1000, 'count': n} for k, n in enumerate(histogram) if n],
+            }
+        return {'wall_ms': round(wall_ns / 1e6, 3), 'dropped_events': self.dropped_events, 'stages': result}
+
+    @staticmethod
+    def _percentile(histogram, count, fraction):
+        """Upper bound (ms) of the histogram bucket holding the ``fraction`` quantile."""
+        seen = 0
+        for k, n in enumerate(histogram):
+            seen += n
+            if count and seen >= fraction * count: return 2 ** k / 1000
+        return 0.0
+
+    def chrome_trace(self):
+        """The spans in the Trace Event Format ('X' complete events, microseconds)."""
+        with self._lock:
+            events, threads = list(self._events), dict(self._threads)
+        trace = [{'name': 'thread_name', 'ph': 'M', 'pid': pid, 'tid': tid, 'args': {'name': name}}
+                 for (pid, tid), name in threads.items()]
+        trace.extend({'name': stage, 'cat': 'cropvideo', 'ph': 'X', 'pid': pid, 'tid': tid,
+                      'ts': (start - self.origin_ns) / 1000, 'dur': duration / 1000}
+                     for stage, pid, tid, start, duration in events)
+        return {'traceEvents': trace, 'displayTimeUnit': 'ms'}
+
+    def save_summary(self, path):
+        with open(path, 'w', encoding='utf-8') as f: json.dump(self.summary(), f, indent=2)
+
+    def save_trace(self, path):
+        with open(path, 'w', encoding='utf-8') as f: json.dump(self.chrome_trace(), f)
+
+
+# --- Job Specs ---
+
+class JobError(ValueError):
+    """Invalid job parameters.
+
+    ``key`` is a message key from cropVideo.LANGUAGES so front-ends can show a
+    translated message; ``params`` are the values formatted into it.
+    """
+    def __init__(self, key, *params):
+        super().__init__(key, *params)
+        self.key = key
+        self.params = params
+
+
+@dataclass
+class VideoInfo:
+    """Basic stream properties as reported by OpenCV."""
+    path: str
+    fps: float
+    total_frames: int
+    width: int
+    height: int
+    codec: str = '' # FourCC, e.g. 'avc1'
+
+    @property
+    def duration(self):
+        return self.total_frames / self.fps if self.total_frames > 0 and self.fps > 0 else 0
+
+
+@dataclass
+class ProcessJob:
+    """Trim / resize / FPS change of one input into one output video.
+
+    ``None`` leaves the corresponding property of the source untouched.
+    ``renditions`` adds more output videos and ``extract`` saves frames as
+    images; all of them are fed from one decode of the input.
+    """
+    input_path: str
+    output_path: str
+    start_sec: Optional[float] = None
+    end_sec: Optional[float] = None
+    width: Optional[int] = None
+    height: Optional[int] = None
+    output_fps: Optional[float] = None
+    crop: Optional[Tuple[int, int, int, int]] = None # Region (x, y, width, height) of the source frame
+    crop_aspect: Optional[float] = None # Width/height the crop is locked to; alone, the largest centred crop
+    pipeline_workers: int = 0 # >0 runs decode, transform and encode as a threaded pipeline
+    segment_workers: int = 0 # >1 encodes frame-range segments in parallel processes, then joins them (needs ffmpeg)
+    interpolation: str = 'area' # Key of INTERPOLATIONS used for resizing
+    reuse_buffers: bool = True # Decode and resize into recycled FramePool buffers
+    filters: Sequence = () # Crop, Resize, Rotate, Flip, Levels, Grayscale, ColorConvert, after the crop and before the resize
+    renditions: Sequence['Rendition'] = () # More outputs encoded from the same decoded frames
+    extract: Optional['ExtractJob'] = None # Frames saved as images in the same pass (its input_path is ignored)
+    resume: bool = False # Encode in segments kept until the join, so a rerun only encodes the missing ones
+    split_at: Sequence[int] = () # Source frames starting a new output file, see scene_output_path
+    split_scenes: Optional['SceneDetection'] = None # Also split where detect_scenes() finds a cut
+    ranges: Sequence[Tuple[float, float]] = () # (start_sec, end_sec) cut list kept instead of start_sec/end_sec
+    split_ranges: bool = False # One file per (merged) range, see range_output_path, instead of one joined output
+
+    @property
+    def split(self):
+        return bool(self.split_at) or self.split_scenes is not None
+
+    @property
+    def time_crop(self):
+        return self.start_sec is not None or self.end_sec is not None
+
+    @property
+    def resize(self):
+        return self.width is not None or self.height is not None
+
+    @property
+    def spatial_crop(self):
+        return self.crop is not None or self.crop_aspect is not None
+
+
+@dataclass
+class Rendition:
+    """One more output video of a ProcessJob.
+
+    Shares the job's time range, crop and interpolation; ``None`` keeps the
+    size or frame rate of the (cropped) source, as in ProcessJob. The
+    container follows from the extension of ``output_path``.
+    """
+    output_path: str
+    width: Optional[int] = None
+    height: Optional[int] = None
+    output_fps: Optional[float] = None
+
+
+def parse_rendition(spec, output_path):
+    """'1280x720', '854x480@15' or '@15', optionally followed by '=path', -> Rendition.
+
+    Without a path the rendition goes next to ``output_path`` as
+    ``<name>_1280x720<ext>``. Raises ValueError.
+    """
+    spec, _, path = spec.partition('=')
+    size, _, fps = spec.strip().partition('@')
+    if not size and not fps: raise ValueError(spec)
+    width, height = (int(v) for v in size.lower().split('x')) if size else (None, None)
+    output_fps = float(fps) if fps else None
+    if not path.strip():
+        name, ext = os.path.splitext(output_path)
+        suffix = '_'.join(part for part in (size.lower(), f"{fps}fps" if fps else '') if part)
+        path = f"{name}_{suffix}{ext}"
+    return Rendition(path.strip(), width, height, output_fps)
+
+
+@dataclass(frozen=True)
+class ImageEncoding:
+    """Encoder settings for extracted images; None keeps OpenCV's default.
+
+    Each field only affects its own format, so one ImageEncoding serves
+    every image format.
+    """
+    jpeg_quality: Optional[int] = None # 0-100; OpenCV defaults to 95
+    jpeg_optimize: bool = False # Optimized Huffman tables: a few % smaller, slightly slower
+    png_compression: Optional[int] = None # zlib level 0-9; 0 stores, 9 is smallest and very slow on large frames
+    webp_quality: Optional[int] = None # 1-100, lossy
+    webp_lossless: bool = False # Overrides webp_quality
+
+    def problems(self):
+        """Descriptions of out-of-range settings (empty when valid)."""
+        problems = []
+        if self.jpeg_quality is not None and not 0 <= self.jpeg_quality <= 100: problems.append(f"jpeg_quality={self.jpeg_quality}")
+        if self.png_compression is not None and not 0 <= self.png_compression <= 9: problems.append(f"png_compression={self.png_compression}")
+        if self.webp_quality is not None and not 1 <= self.webp_quality <= 100: problems.append(f"webp_quality={self.webp_quality}")
+        return problems
+
+    def params(self, image_format):
+        """The cv2.imwrite parameter list for ``image_format``."""
+        params = []
+        if image_format == 'jpg':
+            if self.jpeg_quality is not None: params += [cv2.IMWRITE_JPEG_QUALITY, self.jpeg_quality]
+            if self.jpeg_optimize: params += [cv2.IMWRITE_JPEG_OPTIMIZE, 1]
+        elif image_format == 'png' and self.png_compression is not None:
+            params += [cv2.IMWRITE_PNG_COMPRESSION, self.png_compression]
+            # Stored data gains nothing from the row filters, which then cost more than the write itself
+            if self.png_compression == 0 and hasattr(cv2, 'IMWRITE_PNG_FILTER'):
+                params += [cv2.IMWRITE_PNG_FILTER, cv2.IMWRITE_PNG_FILTER_NONE]
+        elif image_format == 'webp':
+            if self.webp_lossless: params += [cv2.IMWRITE_WEBP_QUALITY, 101] # Above 100 selects lossless
+            elif self.webp_quality is not None: params += [cv2.IMWRITE_WEBP_QUALITY, self.webp_quality]
+        return params
+
+
+# 1080p frame: PNG level 0 ~9 ms vs ~45 ms default and ~940 ms at level 9; WebP q75 ~115 ms vs ~700 ms lossless
+ENCODER_PRESETS = {
+    'default': ImageEncoding(),
+    'fastest': ImageEncoding(jpeg_quality=90, png_compression=0, webp_quality=75),
+    'smallest': ImageEncoding(jpeg_optimize=True, png_compression=9, webp_lossless=True), # Same pixels, fewer bytes
+}
+
+
+@dataclass(frozen=True)
+class SceneDetection:
+    """How detect_scenes() finds scene cuts.
+
+    Consecutive frames are compared as small grayscale proxies, with a score
+    from 0 (same) to 1: 'diff' is their mean absolute difference, 'histogram'
+    the share of pixels that would have to change brightness bin to turn one
+    histogram into the other (robust to motion, blind to rearrangements).
+    """
+    metric: str = 'diff' # Key of SCENE_THRESHOLDS
+    threshold: Optional[float] = None # Score above which a frame starts a new scene; None is the metric's default
+    min_scene_frames: int = 8 # Cuts closer than this to the previous one are ignored, e.g. flashes
+    proxy_width: int = 64 # Proxy height follows the aspect ratio
+
+    @property
+    def cut_threshold(self):
+        return self.threshold if self.threshold is not None else SCENE_THRESHOLDS.get(self.metric, 0)
+
+    def problems(self):
+        """Descriptions of invalid settings (empty when valid)."""
+        problems = []
+        if self.metric not in SCENE_THRESHOLDS: problems.append(f"metric={self.metric}")
+        if self.threshold is not None and not 0 < self.threshold < 1: problems.append(f"threshold={self.threshold}")
+        if self.min_scene_frames < 1: problems.append(f"min_scene_frames={self.min_scene_frames}")
+        if self.proxy_width < 8: problems.append(f"proxy_width={self.proxy_width}")
+        return problems
+
+
+@dataclass(frozen=True)
+class FrameDedup:
+    """Near-duplicate suppression for extraction.
+
+    Each frame is reduced to a 64-bit perceptual hash (see perceptual_hash);
+    one within ``max_distance`` differing bits of the last saved frame's hash
+    is not saved but listed in DEDUP_MAP_FILE with the frame it duplicates.
+    """
+    method: str = 'dhash' # One of PERCEPTUAL_HASHES
+    max_distance: int = 4 # Hamming distance out of 64 bits; 0 only skips frames hashing identically
+
+    def problems(self):
+        """Descriptions of invalid settings (empty when valid)."""
+        problems = []
+        if self.method not in PERCEPTUAL_HASHES: problems.append(f"method={self.method}")
+        if not 0 <= self.max_distance < 64: problems.append(f"max_distance={self.max_distance}")
+        return problems
+
+
+@dataclass
+class ExtractJob:
+    """Saves frames ``start_frame..end_frame`` (inclusive) as image files."""
+    input_path: str
+    output_dir: str
+    start_frame: int = 0
+    end_frame: Optional[int] = None # None means the last frame
+    image_format: str = 'png'
+    writer_workers: int = 0 # >0 encodes and writes images on this many threads
+    frame_step: int = 1 # Save every Nth frame of the range
+    interval_sec: Optional[float] = None # Save one frame every this many seconds instead
+    keyframes_only: bool = False # Save only the keyframes (I-frames) within the range
+    scenes: Optional[SceneDetection] = None # Save only the first frame of every scene within the range
+    reuse_buffers: bool = True # Decode into recycled FramePool buffers
+    filters: Sequence = () # Applied to every saved frame, as in ProcessJob
+    encoding: ImageEncoding = field(default_factory=ImageEncoding) # e.g. ENCODER_PRESETS['fastest']
+    container: str = 'files' # One of FRAME_CONTAINERS; 'npy' stores raw frames, ignoring the format and encoding
+    resume: bool = False # Checkpoint the saved frames; rerunning the same job skips the ones already saved
+    dedup: Optional[FrameDedup] = None # Skip frames that look the same as the last saved one
+    frame_list: Sequence[int] = () # Save exactly these frames (any order, repeats once) instead of the range
+    time_list: Sequence[float] = () # Seconds; saves the frame on screen at each, together with frame_list
+
+
+def frame_output_path(job):
+    """Where an ExtractJob's frames end up: its output directory for loose image
+    files, else the single ``frames.tar``/``frames.zip``/``frames.npy`` inside it."""
+    if job.container == 'files': return job.output_dir
+    return os.path.join(job.output_dir, f"frames.{job.container}")
+
+
+def frame_index_path(job):
+    """The .npy of source frame numbers that accompanies a 'npy' container, one per row."""
+    return os.path.join(job.output_dir, 'frames_index.npy')
+
+
+@dataclass
+class ProcessPlan:
+    """A ProcessJob resolved against the actual video.
+
+    Frame rate changes resample on a timestamp schedule anchored at
+    ``origin_frame`` (the start of the whole job, also when the plan is cut
+    into segments): each source frame is written as many times as output
+    frame timestamps fall within its display interval, so a lower rate drops
+    frames, a higher one duplicates them, and the duration stays the same.
+    """
+    start_frame: int
+    end_frame: int # Exclusive
+    out_width: int
+    out_height: int
+    output_fps: float
+    resize_needed: bool
+    end_capped: bool = False
+    source_fps: Optional[float] = None # None keeps every frame exactly once
+    origin_frame: int = 0
+    frame_index: Optional['FrameIndex'] = field(default=None, repr=False, compare=False)
+    interpolation: str = 'area'
+    crop: Optional[Tuple[int, int, int, int]] = None # (x, y, width, height), already validated
+    filters: tuple = () # The job's filters, validated; run between the crop and the resize
+    is_color: bool = True # False when the filters leave one channel (grayscale output)
+    renditions: list = field(default_factory=list) # (output_path, ProcessPlan) of the extra outputs
+    extract: Optional['ExtractPlan'] = None
+    ranges: Optional[list] = None # Merged (start, end) frame ranges of a cut list, within start_frame..end_frame
+
+    def __post_init__(self):
+        self._ratio = Fraction(1)
+        if self.source_fps and self.output_fps != self.source_fps:
+            self._ratio = Fraction(self.output_fps).limit_denominator(100000) / Fraction(self.source_fps).limit_denominator(100000)
+
+    @property
+    def frame_count(self):
+        """Source frames in the range, or in all ranges of a cut list."""
+        if self.ranges is not None: return sum(end - start for start, end in self.ranges)
+        return max(0, self.end_frame - self.start_frame)
+
+    @property
+    def output_frame_count(self):
+        ranges = self.ranges if self.ranges is not None else [(self.start_frame, self.end_frame)]
+        return sum(self.output_frames_before(end) - self.output_frames_before(start) for start, end in ranges)
+
+    def output_frames_before(self, frame_index):
+        """Output frames produced by the source frames from origin_frame up to ``frame_index``."""
+        return math.ceil((frame_index - self.origin_frame) * self._ratio)
+
+    def repeats(self, frame_index):
+        """How often source frame ``frame_index`` is written: 0 drops it, 2+ duplicates it."""
+        return self.output_frames_before(frame_index + 1) - self.output_frames_before(frame_index)
+
+
+@dataclass
+class ExtractPlan:
+    """An ExtractJob resolved against the actual video."""
+    start_frame: int
+    end_frame: int # Inclusive
+    end_capped: bool = False
+    frames: Optional[Sequence[int]] = None # Ascending frame numbers to save; None when the worker finds them (keyframes, scenes)
+    frame_index: Optional['FrameIndex'] = field(default=None, repr=False, compare=False)
+    total_video_frames: int = 0 # Of the whole video; sets the zero padding of the file names
+    filters: tuple = () # Validated
+    frame_shape: Optional[tuple] = None # Of the saved frames, after the filters
+
+    @property
+    def frame_count(self):
+        if self.frames is not None: return len(self.frames)
+        return max(0, self.end_frame - self.start_frame + 1)
+
+
+# --- Filters ---
+#
+# A filter maps a frame of one shape to a frame of another: output_shape()
+# validates and predicts, apply() does it. ``copies`` is False for filters
+# that return a view of their input (Crop) and ``in_place`` is True for those
+# that can write their result over their input. optimize_filters() rewrites
+# a chain into fewer, cheaper steps before anything runs, and
+# compile_filters() turns it into the per-frame function the workers call.
+
+def _channels(shape):
+    return shape[2] if len(shape) > 2 else 1
+
+
+@dataclass(frozen=True)
+class Crop:
+    """Keeps the region (x, y, width, height); a view of the input, so it copies nothing."""
+    x: int
+    y: int
+    width: int
+    height: int
+    stage = 'crop'
+    copies = False
+    in_place = False
+
+    def output_shape(self, shape):
+        if self.x < 0 or self.y < 0 or self.width <= 0 or self.height <= 0 \
+                or self.x + self.width > shape[1] or self.y + self.height > shape[0]:
+            raise JobError('error_invalid_crop', f"{shape[1]}x{shape[0]}")
+        return (self.height, self.width) + shape[2:]
+
+    def apply(self, frame, dst=None):
+        return frame[self.y:self.y + self.height, self.x:self.x + self.width]
+
+    def is_noop(self, shape):
+        return (self.x, self.y, self.width, self.height) == (0, 0, shape[1], shape[0])
+
+    def merge(self, other, shape):
+        if isinstance(other, Crop):
+            return Crop(self.x + other.x, self.y + other.y, other.width, other.height)
+        return None
+
+    def hoist(self, prev, shape):
+        """(self, prev) rewritten so the crop runs first, or None. ``shape`` is prev's input."""
+        if isinstance(prev, (_Lut, Grayscale, ColorConvert)): return self, prev # Per-pixel: the same pixels either way
+        if isinstance(prev, Resize): # Cut the matching source region, then resize only that
+            sx, sy = shape[1] / prev.width, shape[0] / prev.height
+            x0, y0 = int(self.x * sx), int(self.y * sy)
+            x1 = min(shape[1], math.ceil((self.x + self.width) * sx))
+            y1 = min(shape[0], math.ceil((self.y + self.height) * sy))
+            return Crop(x0, y0, x1 - x0, y1 - y0), Resize(self.width, self.height, prev.interpolation)
+        if isinstance(prev, _Orientation):
+            out_h, out_w = prev.output_shape(shape)[:2]
+            corners = [prev.source_point(x, y, out_w, out_h) for x, y in
+                       ((self.x, self.y), (self.x + self.width - 1, self.y + self.height - 1))]
+            (ax, ay), (bx, by) = corners
+            return Crop(min(ax, bx), min(ay, by), abs(ax - bx) + 1, abs(ay - by) + 1), prev
+        return None
+
+
+@dataclass(frozen=True)
+class Resize:
+    width: int
+    height: int
+    interpolation: str = 'area' # Key of INTERPOLATIONS
+    stage = 'resize'
+    copies = True
+    in_place = False
+
+    def output_shape(self, shape):
+        if self.width <= 0 or self.height <= 0: raise JobError('error_invalid_res_positive')
+        if self.interpolation not in INTERPOLATIONS: raise JobError('error_invalid_interpolation', self.interpolation)
+        return (self.height, self.width) + shape[2:]
+
+    def apply(self, frame, dst=None):
+        return cv2.resize(frame, (self.width, self.height), dst=dst, interpolation=INTERPOLATIONS[self.interpolation])
+
+    def is_noop(self, shape):
+        return (self.width, self.height) == (shape[1], shape[0])
+
+    def merge(self, other, shape):
+        if isinstance(other, Resize) and other.width <= self.width <= shape[1] and other.height <= self.height <= shape[0]:
+            return other # Two downscales: one resampling straight to the final size; an upscale after a downscale stays (pixelation)
+        return None
+
+    def hoist(self, prev, shape):
+        return None
+
+
+# name -> (swaps width and height, can run in place, apply(frame, dst), output point -> source point)
+_ORIENTATIONS = {
+    'identity': (False, True, lambda f, dst: f, lambda x, y, w, h: (x, y)),
+    'flip_h': (False, True, lambda f, dst: cv2.flip(f, 1, dst=dst), lambda x, y, w, h: (w - 1 - x, y)),
+    'flip_v': (False, True, lambda f, dst: cv2.flip(f, 0, dst=dst), lambda x, y, w, h: (x, h - 1 - y)),
+    'rotate_180': (False, True, lambda f, dst: cv2.flip(f, -1, dst=dst), lambda x, y, w, h: (w - 1 - x, h - 1 - y)),
+    'rotate_90': (True, False, lambda f, dst: cv2.rotate(f, cv2.ROTATE_90_CLOCKWISE, dst=dst),
+                  lambda x, y, w, h: (y, w - 1 - x)),
+    'rotate_270': (True, False, lambda f, dst: cv2.rotate(f, cv2.ROTATE_90_COUNTERCLOCKWISE, dst=dst),
+                   lambda x, y, w, h: (h - 1 - y, x)),
+    'transpose': (True, False, lambda f, dst: cv2.transpose(f, dst=dst), lambda x, y, w, h: (y, x)),
+    'transverse': (True, False, lambda f, dst: cv2.flip(cv2.transpose(f, dst=dst), -1, dst=dst),
+                   lambda x, y, w, h: (h - 1 - y, w - 1 - x)),
+}
+_ORIENTATION_PROBE = np.arange(6, dtype=np.uint8).reshape(2, 3)
+
+
+@dataclass(frozen=True)
+class _Orientation:
+    """One of the eight rotations/mirrorings; any run of Rotate and Flip fuses into one of these."""
+    name: str
+    stage = 'orient'
+    copies = True
+
+    @property
+    def in_place(self):
+        return _ORIENTATIONS[self.name][1]
+
+    def output_shape(self, shape):
+        return (shape[1], shape[0]) + shape[2:] if _ORIENTATIONS[self.name][0] else shape
+
+    def apply(self, frame, dst=None):
+        if dst is None and self.name == 'transverse': dst = np.empty(self.output_shape(frame.shape), frame.dtype)
+        return _ORIENTATIONS[self.name][2](frame, dst)
+
+    def source_point(self, x, y, out_width, out_height):
+        return _ORIENTATIONS[self.name][3](x, y, out_width, out_height)
+
+    def is_noop(self, shape):
+        return self.name == 'identity'
+
+    def merge(self, other, shape):
+        if not isinstance(other, _Orientation): return None
+        result = other.apply(self.apply(_ORIENTATION_PROBE))
+        return next(_Orientation(name) for name in _ORIENTATIONS
+                    if np.array_equal(_Orientation(name).apply(_ORIENTATION_PROBE), result))
+
+    def hoist(self, prev, shape):
+        return None
+
+
+@dataclass(frozen=True)
+class Rotate:
+    """Clockwise rotation by a multiple of 90 degrees."""
+    degrees: int
+
+    def orientation(self):
+        if self.degrees % 90: raise JobError('error_invalid_filter', f"rotate={self.degrees}")
+        return _Orientation(['identity', 'rotate_90', 'rotate_180', 'rotate_270'][self.degrees // 90 % 4])
+
+    def output_shape(self, shape):
+        return self.orientation().output_shape(shape)
+
+
+@dataclass(frozen=True)
+class Flip:
+    horizontal: bool = True # Mirror left-right
+    vertical: bool = False # Mirror top-bottom
+
+    def orientation(self):
+        return _Orientation({(False, False): 'identity', (True, False): 'flip_h', (False, True): 'flip_v',
+                             (True, True): 'rotate_180'}[(bool(self.horizontal), bool(self.vertical))])
+
+    def output_shape(self, shape):
+        return shape
+
+
+@dataclass(frozen=True, eq=False)
+class _Lut:
+    """A 256-entry lookup table for every channel; consecutive tables fuse into one."""
+    table: np.ndarray = field(repr=False)
+    stage = 'lut'
+    copies = True
+    in_place = True
+
+    def output_shape(self, shape):
+        return shape
+
+    def apply(self, frame, dst=None):
+        return cv2.LUT(frame, self.table, dst=dst)
+
+    def is_noop(self, shape):
+        return np.array_equal(self.table, np.arange(256))
+
+    def merge(self, other, shape):
+        if isinstance(other, _Lut): return _Lut(other.table[self.table])
+        return None
+
+    def hoist(self, prev, shape):
+        if isinstance(prev, _Orientation): return self, prev # Moves pixels without changing them; may meet another table
+        return None
+
+
+@dataclass(frozen=True)
+class Levels:
+    """``pixel * contrast + brightness``, clipped to 0..255, as one cv2.LUT() lookup."""
+    brightness: float = 0.0
+    contrast: float = 1.0
+
+    def lut(self):
+        table = np.arange(256, dtype=np.float64) * self.contrast + self.brightness
+        return _Lut(np.clip(np.rint(table), 0, 255).astype(np.uint8))
+
+    def output_shape(self, shape):
+        return shape
+
+
+@dataclass(frozen=True)
+class Grayscale:
+    """BGR to one channel. Runs before resizes and rotations, which then move a third of the data."""
+    stage = 'color'
+    copies = True
+    in_place = False
+
+    def output_shape(self, shape):
+        return shape[:2]
+
+    def apply(self, frame, dst=None):
+        return cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY, dst=dst)
+
+    def is_noop(self, shape):
+        return _channels(shape) == 1
+
+    def merge(self, other, shape):
+        return None
+
+    def hoist(self, prev, shape):
+        if isinstance(prev, (Resize, _Orientation)): return self, prev
+        return None
+
+
+@dataclass(frozen=True)
+class ColorConvert:
+    """cv2.cvtColor() with the COLOR_<code> conversion, e.g. 'BGR2HSV' or 'BGR2RGB'."""
+    code: str
+    stage = 'color'
+    copies = True
+    in_place = False
+
+    def output_shape(self, shape):
+        conversion = getattr(cv2, f"COLOR_{self.code}", None)
+        if conversion is None: raise JobError('error_invalid_filter', f"color={self.code}")
+        try: probe = cv2.cvtColor(np.zeros((2, 2) + shape[2:], np.uint8), conversion)
+        except cv2.error: raise JobError('error_invalid_filter', f"color={self.code}")
+        return shape[:2] + probe.shape[2:]
+
+    def apply(self, frame, dst=None):
+        return cv2.cvtColor(frame, getattr(cv2, f"COLOR_{self.code}"), dst=dst)
+
+    def is_noop(self, shape):
+        return False
+
+    def merge(self, other, shape):
+        return None
+
+    def hoist(self, prev, shape):
+        return None
+
+
+def parse_filter(text):
+    """'crop=X,Y,W,H', 'resize=WxH[:interpolation]', 'rotate=DEG', 'flip=h|v|hv',
+    'levels=BRIGHTNESS[,CONTRAST]', 'gray' or 'color=CODE' -> filter. Raises ValueError."""
+    name, _, value = text.strip().partition('=')
+    name = name.lower()
+    if name == 'crop':
+        x, y, w, h = (int(v) for v in value.split(','))
+        return Crop(x, y, w, h)
+    if name == 'resize':
+        size, _, interpolation = value.partition(':')
+        w, h = (int(v) for v in size.lower().split('x'))
+        return Resize(w, h, interpolation or 'area')
+    if name == 'rotate': return Rotate(int(value))
+    if name == 'flip' and value.lower() in ('h', 'v', 'hv', 'vh'): return Flip('h' in value.lower(), 'v' in value.lower())
+    if name == 'levels':
+        parts = [float(v) for v in value.split(',')]
+        if len(parts) > 2: raise ValueError(text)
+        return Levels(*parts)
+    if name in ('gray', 'grey', 'grayscale') and not value: return Grayscale()
+    if name == 'color' and value: return ColorConvert(value)
+    raise ValueError(text)
+
+
+def filters_output_shape(filters, shape):
+    """Shape of a frame of ``shape`` after ``filters``. Raises JobError for a filter that cannot apply."""
+    for f in filters: shape = f.output_shape(shape)
+    return shape
+
+
+def _normalized(f):
+    if isinstance(f, (Rotate, Flip)): return f.orientation()
+    if isinstance(f, Levels): return f.lut()
+    if isinstance(f, ColorConvert) and f.code.upper() == 'BGR2GRAY': return Grayscale()
+    return f
+
+
+def optimize_filters(filters, shape):
+    """The steps that turn frames of ``shape`` into what ``filters`` would, with less work.
+
+    Rotations and flips fuse into one orientation, brightness/contrast into
+    one lookup table, crops into one and consecutive downscales into one; no-ops are
+    dropped. Crops move to the front (through resizes and rotations by
+    mapping the region back to the source), so every later step sees only
+    the pixels that are kept, and grayscale moves ahead of resizes and
+    rotations. Raises JobError for a filter that cannot apply.
+    """
+    filters_output_shape(filters, shape)
+    steps = [_normalized(f) for f in filters]
+    changed = True
+    while changed:
+        changed = False
+        shapes = [shape]
+        for step in steps: shapes.append(step.output_shape(shapes[-1]))
+        for i, step in enumerate(steps):
+            if step.is_noop(shapes[i]):
+                del steps[i]; changed = True; break
+            if i == 0: continue
+            rewritten = steps[i - 1].merge(step, shapes[i - 1])
+            rewritten = [rewritten] if rewritten is not None else step.hoist(steps[i - 1], shapes[i - 1])
+            if rewritten:
+                steps[i - 1:i + 1] = list(rewritten); changed = True; break
+    return steps
+
+
+def compile_filters(filters, pool=None, timer=None, shared_input=False):
+    """Returns ``f(frame) -> frame`` running ``filters``, optimized for the shape of the frames.
+
+    Each step that produces pixels writes them into a FramePool buffer (or
+    a fresh array without ``pool``) and releases its input; lookup tables
+    and flips instead overwrite a buffer the chain owns. The input frame is
+    only overwritten when not ``shared_input`` (other outputs reading it).
+    """
+    plans = {} # Input shape -> [(step, output shape)]
+    def run(frame):
+        steps = plans.get(frame.shape)
+        if steps is None:
+            steps, shape = [], frame.shape
+            for step in optimize_filters(filters, frame.shape):
+                shape = step.output_shape(shape)
+                steps.append((step, shape))
+            plans[frame.shape] = steps
+        writable = not shared_input
+        for step, out_shape in steps:
+            if not step.copies: frame = step.apply(frame); continue
+            t0 = _now() if timer else 0
+            if step.in_place and writable and frame.flags.c_contiguous:
+                step.apply(frame, frame)
+            else:
+                out = step.apply(frame, pool.acquire(out_shape) if pool else None)
+                if pool: pool.release(frame)
+                frame, writable = out, True
+            if timer: timer.record(step.stage, t0)
+        return frame
+    return run
+
+
+# --- Probing & Validation ---
+
+def _fourcc_to_str(fourcc):
+    code = int(fourcc)
+    chars = ''.join(chr((code >> (8 * i)) & 0xFF) for i in range(4))
+    return chars if chars.isprintable() else ''
+
+
+def probe_video(path, cache=None):
+    """Returns the VideoInfo of ``path``. Raises IOError if unreadable.
+
+    With a ProbeCache the file is only opened when it is not cached yet or
+    has changed since it was probed.
+    """
+    if cache is not None: return cache.probe(path)
+    cap = cv2.VideoCapture(path)
+    try:
+        if not cap.isOpened(): raise IOError(f"Cannot open: {path}")
+        fps = cap.get(cv2.CAP_PROP_FPS)
+        total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+        height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        codec = _fourcc_to_str(cap.get(cv2.CAP_PROP_FOURCC))
+    finally:
+        cap.release()
+
+    if not fps or fps <= 0:
+        print(f"Warning: Invalid FPS ({fps}) read for {path}. Using {DEFAULT_FPS}.")
+        fps = DEFAULT_FPS
+    if not total_frames or total_frames < 0:
+        print(f"Warning: Invalid frame count ({total_frames}) read for {path}. Using 0.")
+        total_frames = 0
+    return VideoInfo(path, fps, total_frames, width, height, codec)
+
+
+def default_cache_dir():
+    """Per-user directory for CropVideo's caches (probe store, indexes, thumbnails)."""
+    if os.name == 'nt':
+        base = os.environ.get('LOCALAPPDATA') or os.path.expanduser('~')
+    else:
+        base = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(base, 'cropvideo')
+
+
+def file_signature(path):
+    """(absolute path, size, mtime) identifying one version of a file for caching."""
+    st = os.stat(path)
+    return os.path.abspath(path), st.st_size, st.st_mtime_ns
+
+
+class ProbeCache:
+    """VideoInfo cache keyed by path, size and modification time.
+
+    Lookups only stat() the file, which is what makes repeated loads and
+    validations of large files on network shares cheap; a changed file is
+    probed again. With ``store_path`` the entries are also kept in a small
+    JSON file, so they survive restarts. The store is best-effort: an
+    unreadable or unwritable store just means probing again.
+    """
+    MAX_ENTRIES = 1000
+
+    def __init__(self, store_path=None):
+        self.store_path = store_path
+        self._lock = threading.Lock()
+        self._entries = {} # abspath -> (size, mtime_ns, info dict)
+        if store_path: self._load()
+
+    def probe(self, path):
+        path_key, size, mtime = file_signature(path)
+        with self._lock:
+            entry = self._entries.get(path_key)
+        if entry and entry[0] == size and entry[1] == mtime:
+            return VideoInfo(path=path, **entry[2])
+
+        info = probe_video(path)
+        fields = {'fps': info.fps, 'total_frames': info.total_frames, 'width': info.width,
+                  'height': info.height, 'codec': info.codec}
+        with self._lock:
+            self._entries.pop(path_key, None) # Re-insert so the dict stays in least-recently-probed order
+            self._entries[path_key] = (size, mtime, fields)
+            while len(self._entries) > self.MAX_ENTRIES:
+                self._entries.pop(next(iter(self._entries)))
+        if self.store_path: self._save()
+        return info
+
+    def _load(self):
+        try:
+            with open(self.store_path, 'r', encoding='utf-8') as f:
+                stored = json.load(f)
+            for path_key, entry in stored.items():
+                fields = {k: entry[k] for k in ('fps', 'total_frames', 'width', 'height', 'codec')}
+                self._entries[path_key] = (entry['size'], entry['mtime_ns'], fields)
+        except (OSError, ValueError, KeyError, TypeError, AttributeError) as e:
+            if not isinstance(e, FileNotFoundError): print(f"Warning: Ignoring probe cache {self.store_path}: {e}")
+
+    def _save(self):
+        with self._lock:
+            stored = {path_key: dict(fields, size=size, mtime_ns=mtime, duration=VideoInfo('', **fields).duration)
+                      for path_key, (size, mtime, fields) in self._entries.items()}
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(self.store_path)), exist_ok=True)
+            tmp_path = f"{self.store_path}.{os.getpid()}.{threading.get_ident()}.tmp" # Unique per writer thread
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(stored, f)
+            os.replace(tmp_path, self.store_path) # Atomic, so readers never see a half-written store
+        except OSError as e:
+            print(f"Warning: Could not save probe cache {self.store_path}: {e}")
+
+
+# --- Frame Index ---
+
+FRAME_INDEX_SUFFIX = '.cvidx'
+_FRAME_INDEX_MAGIC = b'CVIDX\0'
+_FRAME_INDEX_VERSION = 1
+# magic, version, source size, source mtime_ns, fps, frame count, keyframe count
+_FRAME_INDEX_HEADER = struct.Struct('<6sHqqdQQ')
+
+
+class FrameIndex:
+    """Presentation timestamps of every frame and the keyframe positions of one file.
+
+    Built by a single demux-only pass (build_frame_index) and stored as a
+    compact binary sidecar: a fixed header followed by float64 timestamps
+    and int64 keyframe numbers. It gives the exact frame count (the
+    container's CAP_PROP_FRAME_COUNT is only an estimate), maps times to
+    frames for variable frame rate files, and lets seek_to_frame() land on a
+    keyframe and grab() forward to an exact frame.
+    """
+    def __init__(self, timestamps_ms, keyframes, fps, size=0, mtime_ns=0):
+        self.timestamps_ms = np.asarray(timestamps_ms, dtype=np.float64) # Display order, first frame at 0
+        self.keyframes = np.asarray(keyframes, dtype=np.int64)
+        self.fps = fps
+        self.size = size
+        self.mtime_ns = mtime_ns
+
+    @property
+    def frame_count(self):
+        return len(self.timestamps_ms)
+
+    def keyframe_at_or_before(self, frame_index):
+        pos = int(np.searchsorted(self.keyframes, frame_index, side='right')) - 1
+        return int(self.keyframes[pos]) if pos >= 0 else 0
+
+    def keyframes_between(self, start_frame, end_frame):
+        """Keyframe numbers in ``start_frame..end_frame`` (inclusive)."""
+        lo = np.searchsorted(self.keyframes, start_frame, side='left')
+        hi = np.searchsorted(self.keyframes, end_frame, side='right')
+        return [int(k) for k in self.keyframes[lo:hi]]
+
+    def frame_at_time(self, seconds):
+        """The frame on screen at ``seconds``: the last one whose timestamp is not later."""
+        pos = int(np.searchsorted(self.timestamps_ms, seconds * 1000.0 + 1e-6, side='right')) - 1
+        return min(max(pos, 0), self.frame_count)
+
+    def first_frame_from(self, seconds):
+        """The first frame whose timestamp is at or after ``seconds``."""
+        return int(np.searchsorted(self.timestamps_ms, seconds * 1000.0 - 1e-6, side='left'))
+
+    def matches(self, path):
+        _, size, mtime_ns = file_signature(path)
+        return (size, mtime_ns) == (self.size, self.mtime_ns)
+
+    def save(self, path):
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp" # Unique per writer thread
+        with open(tmp_path, 'wb') as f:
+            f.write(_FRAME_INDEX_HEADER.pack(_FRAME_INDEX_MAGIC, _FRAME_INDEX_VERSION, self.size, self.mtime_ns,
+                                             self.fps, self.frame_count, len(self.keyframes)))
+            f.write(self.timestamps_ms.astype('<f8').tobytes())
+            f.write(self.keyframes.astype('<i8').tobytes())
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        """Reads a sidecar written by save(). Raises ValueError if it is not one."""
+        with open(path, 'rb') as f:
+            data = f.read()
+        if len(data) < _FRAME_INDEX_HEADER.size: raise ValueError(f"Truncated frame index: {path}")
+        magic, version, size, mtime_ns, fps, frames, keys = _FRAME_INDEX_HEADER.unpack_from(data)
+        if magic != _FRAME_INDEX_MAGIC or version != _FRAME_INDEX_VERSION:
+            raise ValueError(f"Not a frame index: {path}")
+        if len(data) != _FRAME_INDEX_HEADER.size + 8 * (frames + keys):
+            raise ValueError(f"Truncated frame index: {path}")
+        timestamps = np.frombuffer(data, '<f8', frames, _FRAME_INDEX_HEADER.size)
+        keyframes = np.frombuffer(data, '<i8', keys, _FRAME_INDEX_HEADER.size + 8 * frames)
+        return cls(timestamps, keyframes, fps, size, mtime_ns)
+
+
+def build_frame_index(path, progress=None):
+    """Scans ``path`` once without decoding and returns its FrameIndex.
+
+    Packets are read in raw mode (CAP_PROP_FORMAT -1) and sorted by
+    timestamp, which turns decode order into display order for streams with
+    B-frames. Needs the FFmpeg backend.
+    """
+    _, size, mtime_ns = file_signature(path)
+    cap = cv2.VideoCapture(path, cv2.CAP_FFMPEG, [cv2.CAP_PROP_FORMAT, -1])
+    timestamps, key_flags = [], []
+    try:
+        if not cap.isOpened(): raise IOError(f"Cannot open input for indexing: {path}")
+        fps = cap.get(cv2.CAP_PROP_FPS) or DEFAULT_FPS
+        if progress: progress.set_total(int(cap.get(cv2.CAP_PROP_FRAME_COUNT)))
+        while cap.grab():
+            timestamps.append(cap.get(cv2.CAP_PROP_POS_MSEC))
+            key_flags.append(bool(cap.get(cv2.CAP_PROP_LRF_HAS_KEY_FRAME)))
+            if progress: progress.advance()
+    finally:
+        cap.release()
+
+    timestamps = np.asarray(timestamps, dtype=np.float64)
+    if len(timestamps) and timestamps.min() < 0: # No usable packet timestamps: assume constant rate
+        timestamps = np.arange(len(timestamps)) * (1000.0 / fps)
+    order = np.argsort(timestamps, kind='stable')
+    timestamps = timestamps[order] - (timestamps[order[0]] if len(order) else 0)
+    keyframes = np.flatnonzero(np.asarray(key_flags, dtype=bool)[order])
+    return FrameIndex(timestamps, keyframes, fps, size, mtime_ns)
+
+
+def frame_index_paths(path):
+    """Where the sidecar of ``path`` may live: next to the video, else in the user cache."""
+    digest = hashlib.sha1(os.path.abspath(path).encode('utf-8')).hexdigest()
+    return [path + FRAME_INDEX_SUFFIX, os.path.join(default_cache_dir(), 'index', digest + FRAME_INDEX_SUFFIX)]
+
+
+def load_frame_index(path, build=False, progress=None):
+    """Returns the up-to-date FrameIndex of ``path`` from its sidecar.
+
+    A missing or stale sidecar gives None, unless ``build`` is set: then the
+    file is indexed and the sidecar written next to the video, or to the user
+    cache when that directory is read-only.
+    """
+    for index_path in frame_index_paths(path):
+        try:
+            index = FrameIndex.load(index_path)
+        except (OSError, ValueError):
+            continue
+        if index.matches(path): return index
+    if not build: return None
+
+    index = build_frame_index(path, progress)
+    for index_path in frame_index_paths(path):
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(index_path)), exist_ok=True)
+            index.save(index_path)
+            break
+        except OSError as e:
+            print(f"Warning: Could not write frame index {index_path}: {e}")
+    return index
+
+
+# --- Planning ---
+
+def plan_video_processing(job, info, index=None):
+    """Validates ``job`` against ``info`` and resolves it into a ProcessPlan.
+
+    With a FrameIndex the exact frame count and per-frame timestamps are used
+    instead of the container's estimates. Raises JobError with the LANGUAGES
+    key describing the first problem found. Renditions and the extraction of
+    the job are planned too, into ``plan.renditions`` and ``plan.extract``.
+    """
+    if index is not None: info = replace(info, total_frames=index.frame_count)
+    if not (job.time_crop or job.resize or job.output_fps is not None or job.spatial_crop or job.filters
+            or job.renditions or job.extract is not None or job.split or job.ranges):
+        raise JobError('error_no_op_video')
+    if (job.resume or (job.extract is not None and job.extract.resume)) and (
+            job.renditions or job.extract is not None or job.split or job.ranges):
+        raise JobError('error_resume_combination') # Only the single-output segmented path is checkpointed
+    if job.ranges and (job.time_crop or job.split or job.renditions or job.extract is not None):
+        raise JobError('error_ranges_combination')
+    if job.split and (job.renditions or job.extract is not None): raise JobError('error_split_outputs')
+    if job.split_scenes is not None and job.split_scenes.problems():
+        raise JobError('error_invalid_scene_detection', ', '.join(job.split_scenes.problems()))
+    plan = _plan_output(job, info, index)
+    if job.resume and min(_segment_parts(job, plan), plan.frame_count) > 1 and not can_join_losslessly():
+        raise JobError('error_resume_needs_ffmpeg') # Joining the segments without ffmpeg would re-encode them
+    paths = [job.output_path]
+    for rendition in job.renditions:
+        if os.path.abspath(rendition.output_path) in map(os.path.abspath, paths):
+            raise JobError('error_output_clash', rendition.output_path)
+        paths.append(rendition.output_path)
+        rendition_job = replace(job, output_path=rendition.output_path, width=rendition.width, height=rendition.height,
+                                output_fps=rendition.output_fps, renditions=(), extract=None)
+        plan.renditions.append((rendition.output_path, _plan_output(rendition_job, info, index)))
+    if job.extract is not None:
+        plan.extract = plan_frame_extraction(job.extract, info, index)
+    return plan
+
+
+def _plan_output(job, info, index):
+    """plan_video_processing() for the one output ``job.output_path``."""
+    if not job.output_path:
+        raise JobError('error_output_file')
+
+    start_frame, end_frame, end_capped = 0, info.total_frames, False
+    ranges = None
+    if job.ranges:
+        ranges = []
+        for start_sec, end_sec in sorted(job.ranges):
+            start, end, capped = _time_range_frames(start_sec, end_sec, info, index)
+            end_capped = end_capped or capped
+            if ranges and start <= ranges[-1][1]: ranges[-1] = (ranges[-1][0], max(end, ranges[-1][1])) # Overlaps or touches
+            else: ranges.append((start, end))
+        start_frame, end_frame = ranges[0][0], ranges[-1][1]
+    elif job.time_crop:
+        start_frame, end_frame, end_capped = _time_range_frames(job.start_sec, job.end_sec, info, index)
+
+    crop = None
+    src_width, src_height = info.width, info.height
+    if job.spatial_crop:
+        if job.crop_aspect is not None and job.crop_aspect <= 0: raise JobError('error_invalid_crop', f"{info.width}x{info.height}")
+        if job.crop is None: crop = largest_centered_crop(info.width, info.height, job.crop_aspect)
+        else:
+            x, y, w, h = job.crop
+            if job.crop_aspect is not None: w, h = lock_aspect(w, h, job.crop_aspect)
+            crop = (x, y, w, h)
+        x, y, w, h = crop
+        if x < 0 or y < 0 or w <= 0 or h <= 0 or x + w > info.width or y + h > info.height:
+            raise JobError('error_invalid_crop', f"{info.width}x{info.height}")
+        if crop == (0, 0, info.width, info.height): crop = None # The whole frame: nothing to cut
+        src_width, src_height = w, h
+    filtered = filters_output_shape(job.filters, (src_height, src_width, 3))
+    if _channels(filtered) not in (1, 3): raise JobError('error_invalid_filter', f"{_channels(filtered)} channels")
+    src_height, src_width = filtered[:2]
+
+    out_width, out_height = src_width, src_height
+    if job.resize:
+        out_width = job.width if job.width is not None else src_width
+        out_height = job.height if job.height is not None else src_height
+        if out_width <= 0 or out_height <= 0: raise JobError('error_invalid_res_positive')
+        if job.interpolation not in INTERPOLATIONS: raise JobError('error_invalid_interpolation', job.interpolation)
+
+    output_fps = info.fps
+    if job.output_fps is not None:
+        if job.output_fps <= 0: raise JobError('error_invalid_fps_positive')
+        output_fps = job.output_fps
+
+    resize_needed = (out_width, out_height) != (src_width, src_height)
+    return ProcessPlan(start_frame, end_frame, out_width, out_height, output_fps, resize_needed, end_capped,
+                       source_fps=info.fps, origin_frame=start_frame, frame_index=index,
+                       interpolation=job.interpolation, crop=crop, filters=tuple(job.filters),
+                       is_color=_channels(filtered) == 3, ranges=ranges)
+
+
+def _time_range_frames(start_sec, end_sec, info, index=None):
+    """``(start_frame, end_frame, end_capped)`` of the time range; None is the start or the end of the video."""
+    duration = info.duration
+    end_capped = False
+    if start_sec is None: start_sec = 0
+    if end_sec is None: end_sec = duration
+    elif end_sec > duration: end_capped = True
+    if start_sec < 0 or end_sec < 0: raise JobError('error_negative_time')
+    if end_sec <= start_sec: raise JobError('error_end_before_start')
+    end_sec = min(end_sec, duration)
+    if start_sec >= duration and duration > 0: raise JobError('error_start_too_late')
+    if index is not None:
+        return index.frame_at_time(start_sec), min(info.total_frames, index.first_frame_from(end_sec)), end_capped
+    # Frame range based on ORIGINAL FPS
+    return max(0, int(start_sec * info.fps)), min(info.total_frames, math.ceil(end_sec * info.fps)), end_capped
+
+
+def plan_frame_extraction(job, info, index=None):
+    """Validates ``job`` against ``info`` and resolves it into an ExtractPlan.
+
+    Also creates the output directory, since a job that cannot write its
+    frames is as invalid as one with a bad frame range. A FrameIndex
+    supplies the exact frame count and the keyframe list.
+    """
+    if index is not None: info = replace(info, total_frames=index.frame_count)
+    if not job.output_dir:
+        raise JobError('error_output_dir')
+    try:
+        if not os.path.isdir(job.output_dir):
+            print(f"Output directory '{job.output_dir}' does not exist. Attempting to create.")
+            os.makedirs(job.output_dir, exist_ok=True)
+    except OSError as e:
+        raise JobError('error_output_dir', str(e))
+
+    total = info.total_frames
+    start_frame = job.start_frame
+    end_frame = job.end_frame if job.end_frame is not None else max(0, total - 1)
+    if start_frame < 0 or end_frame < 0: raise JobError('error_invalid_frame_positive')
+    if end_frame < start_frame: raise JobError('error_invalid_frame_order')
+
+    end_capped = False
+    if total > 0:
+        if start_frame >= total: raise JobError('error_invalid_frame_range')
+        if end_frame >= total:
+            end_frame = total - 1
+            end_capped = True
+    elif start_frame > 0 or end_frame > 0: # If video has 0 frames, only 0-0 range is valid
+        raise JobError('error_invalid_frame_range')
+
+    if job.frame_step < 1 or (job.interval_sec is not None and job.interval_sec <= 0):
+        raise JobError('error_invalid_sampling')
+    if job.encoding.problems(): raise JobError('error_invalid_encoding', ', '.join(job.encoding.problems()))
+    if job.container not in FRAME_CONTAINERS: raise JobError('error_invalid_container', job.container)
+    if job.resume and job.container in ('tar', 'zip'): raise JobError('error_resume_container', job.container)
+    if job.dedup is not None:
+        if job.dedup.problems(): raise JobError('error_invalid_dedup', ', '.join(job.dedup.problems()))
+        if job.resume: raise JobError('error_resume_dedup') # The last saved hash is not checkpointed
+    if job.scenes is not None and job.scenes.problems():
+        raise JobError('error_invalid_scene_detection', ', '.join(job.scenes.problems()))
+    frames = None # Keyframes without an index and scenes are found by the worker; scanning here would block the UI
+    if job.frame_list or job.time_list:
+        if min([*job.frame_list, *job.time_list]) < 0: raise JobError('error_invalid_frame_positive')
+        listed = {int(f) for f in job.frame_list}
+        listed.update(index.frame_at_time(t) if index is not None else int(t * info.fps) for t in job.time_list)
+        frames = sorted(f for f in listed if total <= 0 or f < total)
+        if not frames: raise JobError('error_invalid_frame_range')
+        start_frame, end_frame, end_capped = frames[0], frames[-1], len(frames) < len(listed)
+    elif job.scenes is not None: pass
+    elif job.keyframes_only:
+        if index is not None: frames = index.keyframes_between(start_frame, end_frame)
+    else:
+        frames = sample_frames(start_frame, end_frame, info.fps, job.frame_step, job.interval_sec)
+    frame_shape = filters_output_shape(job.filters, (info.height, info.width, 3))
+    return ExtractPlan(start_frame, end_frame, end_capped, frames, index, total_video_frames=total,
+                       filters=tuple(job.filters), frame_shape=frame_shape)
+
+
+def sample_frames(start_frame, end_frame, fps, frame_step=1, interval_sec=None):
+    """Frame numbers in ``start_frame..end_frame`` taking every ``frame_step``-th frame,
+    or the frame nearest to every ``interval_sec`` seconds when that is given."""
+    if interval_sec is None:
+        return range(start_frame, end_frame + 1, frame_step)
+    frames_per_sample = interval_sec * fps
+    count = int((end_frame - start_frame) / frames_per_sample) + 1
+    frames = sorted({start_frame + int(round(k * frames_per_sample)) for k in range(count)})
+    return [f for f in frames if f <= end_frame]
+
+
+def find_keyframes(path, start_frame=0, end_frame=None, fps=None):
+    """Frame numbers of the keyframes in ``start_frame..end_frame``.
+
+    Reads the stream in raw mode (CAP_PROP_FORMAT -1), which only demuxes
+    packets and never decodes them, so scanning is far cheaper than a decode
+    pass. Packet timestamps map packets to display order, which differs from
+    packet order in streams with B-frames. Needs the FFmpeg backend.
+    """
+    cap = cv2.VideoCapture(path, cv2.CAP_FFMPEG, [cv2.CAP_PROP_FORMAT, -1])
+    keyframes = []
+    try:
+        if not cap.isOpened(): raise IOError(f"Cannot open input for keyframe scan: {path}")
+        fps = fps or cap.get(cv2.CAP_PROP_FPS) or DEFAULT_FPS
+        first_pts = None
+        packet_index = 0
+        while cap.grab():
+            pts = cap.get(cv2.CAP_PROP_POS_MSEC)
+            if first_pts is None: first_pts = pts
+            frame_index = int(round((pts - first_pts) * fps / 1000.0)) if pts >= 0 else packet_index
+            packet_index += 1
+            if end_frame is not None and frame_index > end_frame + KEYFRAME_SCAN_REORDER_SLACK: break
+            in_range = frame_index >= start_frame and (end_frame is None or frame_index <= end_frame)
+            if in_range and cap.get(cv2.CAP_PROP_LRF_HAS_KEY_FRAME): keyframes.append(frame_index)
+    finally:
+        cap.release()
+    return sorted(set(keyframes))
+
+
+# --- Scene Detection ---
+
+def scene_proxy(frame, width):
+    """Small grayscale copy of ``frame`` (``width`` wide) for scene detection.
+
+    A strided view thins large frames out before the INTER_AREA resize, which
+    keeps some averaging against noise at a fraction of the full resize cost
+    (1080p: ~0.3 ms instead of ~1.6 ms).
+    """
+    height = max(1, round(width * frame.shape[0] / frame.shape[1]))
+    stride = max(1, frame.shape[1] // (width * 4))
+    proxy = cv2.resize(frame[::stride, ::stride], (width, height), interpolation=cv2.INTER_AREA)
+    return cv2.cvtColor(proxy, cv2.COLOR_BGR2GRAY) if proxy.ndim == 3 else proxy
+
+
+def scene_scores(proxies, metric='diff'):
+    """Change scores (0..1) between consecutive proxies of an (N, h, w) uint8 array; N-1 values."""
+    proxies = np.asarray(proxies)
+    if len(proxies) < 2: return np.zeros(0)
+    if metric == 'histogram':
+        count = len(proxies)
+        bins = proxies.reshape(count, -1) >> (8 - int(math.log2(SCENE_HISTOGRAM_BINS)))
+        offsets = np.arange(count)[:, None] * SCENE_HISTOGRAM_BINS # One bincount for the whole batch
+        histograms = np.bincount((bins + offsets).ravel(), minlength=count * SCENE_HISTOGRAM_BINS)
+        histograms = histograms.reshape(count, SCENE_HISTOGRAM_BINS)
+        return np.abs(np.diff(histograms, axis=0)).sum(axis=1) / (2.0 * bins.shape[1])
+    diffs = np.abs(np.diff(proxies.astype(np.int16), axis=0))
+    return diffs.reshape(len(diffs), -1).mean(axis=1) / 255.0
+
+
+def detect_scenes(path, start_frame=0, end_frame=None, detection=None, index=None, progress=None, timer=None, stop=None):
+    """First frames of the scenes in ``start_frame..end_frame`` (inclusive), starting with ``start_frame``.
+
+    Every frame is decoded once, reduced to a proxy and scored against the
+    one before in batches of SCENE_BATCH_FRAMES; a score above the
+    threshold starts a new scene. ``progress`` advances once per analysed
+    frame and ``stop`` is an optional threading.Event ending the analysis
+    early with the cuts found so far.
+    """
+    detection = detection or SceneDetection()
+    cap = cv2.VideoCapture(path)
+    cuts = [start_frame]
+    try:
+        if not cap.isOpened(): raise IOError(f"Cannot open input for scene detection: {path}")
+        if progress and end_frame is not None: progress.set_total(end_frame - start_frame + 1)
+        if start_frame > 0: seek_to_frame(cap, start_frame, index)
+        threshold = detection.cut_threshold
+        frame_index = start_frame
+        previous = None # Last proxy of the previous batch, compared with the first of the next
+        ended = False
+        while not ended and not (stop is not None and stop.is_set()):
+            batch = [previous] if previous is not None else []
+            first = frame_index - len(batch) # Frame number of batch[0]
+            while len(batch) < SCENE_BATCH_FRAMES and (end_frame is None or frame_index <= end_frame):
+                t0 = _now() if timer else 0
+                ret, frame = cap.read()
+                if not ret: break
+                if timer: timer.record('scene_decode', t0)
+                batch.append(scene_proxy(frame, detection.proxy_width))
+                frame_index += 1
+            ended = len(batch) < SCENE_BATCH_FRAMES
+            if progress: progress.advance(len(batch) - (previous is not None))
+            t0 = _now() if timer else 0
+            for i in np.flatnonzero(scene_scores(np.stack(batch), detection.metric) > threshold) if len(batch) > 1 else ():
+                if first + i + 1 - cuts[-1] >= detection.min_scene_frames: cuts.append(int(first + i + 1))
+            if timer: timer.record('scene_score', t0)
+            previous = batch[-1] if batch else None
+    finally:
+        cap.release()
+    return cuts
+
+
+# --- Workers ---
+
+def _notify(callback, *args):
+    if callback: callback(*args)
+
+
+class FramePool:
+    """Recycles frame buffers between decode, resize and encode.
+
+    acquire() hands out a free array of the requested shape or allocates a new
+    one; release() takes it back once nothing reads it any more. Decoding
+    into a recycled buffer (``cap.read(buf)``) and resizing into one
+    (``cv2.resize(..., dst=buf)``) then cycles through a few arrays instead
+    of allocating and freeing a full frame per stage per frame, which for
+    4K input is about 25 MB each time. Thread-safe, so pipelined stages can
+    pass buffers between threads; the pool only grows to the number of
+    frames in flight.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._free = {} # (shape, dtype) -> [arrays]
+        self.allocated = 0
+
+    def acquire(self, shape, dtype=np.uint8):
+        with self._lock:
+            free = self._free.get((tuple(shape), np.dtype(dtype)))
+            if free: return free.pop()
+            self.allocated += 1
+        return np.empty(shape, dtype)
+
+    def release(self, buf):
+        """Takes ``buf`` back; a view (e.g. a crop) returns the buffer it looks into."""
+        if buf is None: return
+        while isinstance(buf.base, np.ndarray): buf = buf.base
+        with self._lock: self._free.setdefault((buf.shape, buf.dtype), []).append(buf)
+
+    def read(self, cap, shape):
+        """``cap.read()`` into a free buffer of ``shape``; None lets OpenCV allocate (first frame)."""
+        buf = self.acquire(shape) if shape is not None else None
+        ret, frame = cap.read(buf) if buf is not None else cap.read()
+        if buf is not None and (not ret or frame is not buf): self.release(buf) # OpenCV allocated anyway
+        return ret, frame
+
+
+def _read_frame(cap, pool, shape):
+    return pool.read(cap, shape) if pool else cap.read()
+
+
+def _frame_transform(plan, timer=None, pool=None, shared_input=False):
+    """Returns the per-frame function turning a decoded frame into an output frame.
+
+    The plan's crop, filters and resize run as one optimized filter chain
+    (see compile_filters): the crop is a view of the decoded frame, so
+    without other steps it goes to the encoder as is. With a FramePool the
+    caller releases the returned frame after encoding.
+    """
+    filters = ([Crop(*plan.crop)] if plan.crop else []) + list(plan.filters)
+    if plan.resize_needed: filters.append(Resize(plan.out_width, plan.out_height, plan.interpolation))
+    return compile_filters(filters, pool, timer, shared_input)
+
+
+def _write_output_frame(out, frame, frame_index, progress, repeats=1):
+    """Writes one transformed frame ``repeats`` times; returns how many frames were written."""
+    if frame is None or frame.size == 0:
+         print(f"Warning: Frame {frame_index} empty after processing, skipping.")
+         return 0
+    for _ in range(repeats): out.write(frame)
+    if progress: progress.advance(repeats)
+    return repeats
+
+
+def _write_frames_sequential(cap, out, plan, transform, progress, timer=None, pool=None):
+    """Decode, transform and encode one frame after another on this thread.
+
+    Frames the resampling schedule drops are only grab()bed, never decoded
+    into a full image or transformed.
+    """
+    processed_frames_count = 0
+    shape = None
+    for current_frame_index in range(plan.start_frame, plan.end_frame):
+        repeats = plan.repeats(current_frame_index)
+        t0 = _now() if timer else 0
+        if repeats == 0:
+            if not cap.grab(): break
+            if timer: timer.record('grab', t0)
+            continue
+        ret, frame = _read_frame(cap, pool, shape)
+        if not ret: break
+        shape = frame.shape
+        if timer: timer.record('decode', t0)
+        frame = transform(frame)
+        t1 = _now() if timer else 0
+        processed_frames_count += _write_output_frame(out, frame, current_frame_index, progress, repeats)
+        if timer: t2 = _now(); timer.record('encode', t1, t2); timer.record('frame', t0, t2)
+        if pool: pool.release(frame)
+    return processed_frames_count
+
+
+_END_OF_STREAM = object()
+
+
+def _write_frames_pipelined(cap, out, plan, transform, workers, progress, timer=None, pool=None):
+    """Decode on a reader thread, transform on a pool, encode on this thread.
+
+    The reader submits every frame to the pool and queues the resulting
+    futures in decode order; this thread resolves them in that same order, so
+    output order is preserved while all three stages run concurrently. The
+    queue is bounded, so a slow encoder throttles the decoder instead of
+    buffering the whole video in memory. OpenCV releases the GIL in read(),
+    resize() and write(), which is what lets the stages overlap. Pooled
+    buffers travel with the frame and are released by the encoder.
+    """
+    pending = queue.Queue(maxsize=workers * PIPELINE_QUEUE_PER_WORKER)
+    stop = threading.Event()
+    decode_error = []
+
+    def decode():
+        shape = None
+        try:
+            for current_frame_index in range(plan.start_frame, plan.end_frame):
+                if stop.is_set(): break
+                repeats = plan.repeats(current_frame_index)
+                t0 = _now() if timer else 0
+                if repeats == 0:
+                    if not cap.grab(): break
+                    if timer: timer.record('grab', t0)
+                    continue
+                ret, frame = _read_frame(cap, pool, shape)
+                if not ret: break
+                shape = frame.shape
+                if timer: timer.record('decode', t0)
+                pending.put((current_frame_index, repeats, executor.submit(transform, frame), t0))
+        except Exception as e:
+            decode_error.append(e)
+        finally:
+            pending.put(_END_OF_STREAM)
+
+    processed_frames_count = 0
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='transform') as executor:
+        decoder = threading.Thread(target=decode, name='decoder', daemon=True)
+        decoder.start()
+        try:
+            while True:
+                item = pending.get()
+                if item is _END_OF_STREAM: break
+                current_frame_index, repeats, future, t0 = item
+                t1 = _now() if timer else 0
+                frame = future.result()
+                if timer: t2 = _now(); timer.record('wait', t1, t2) # Encoder starved by decode/transform
+                processed_frames_count += _write_output_frame(out, frame, current_frame_index, progress, repeats)
+                if timer: t3 = _now(); timer.record('encode', t2, t3); timer.record('frame', t0, t3)
+                if pool: pool.release(frame)
+        finally:
+            # On an encode error, unblock the decoder and let it finish
+            stop.set()
+            while decoder.is_alive() or not pending.empty():
+                try: pending.get(timeout=0.1)
+                except queue.Empty: pass
+            decoder.join()
+    if decode_error: raise decode_error[0]
+    return processed_frames_count
+
+
+# Segment workers run in separate processes; these globals are per process.
+_segment_frames_done = None
+
+
+class _SharedFrameCounter:
+    """Progress adapter advancing a multiprocessing.Value shared with the parent."""
+    def __init__(self, value):
+        self.value = value
+
+    def advance(self, count=1):
+        with self.value.get_lock(): self.value.value += count
+
+
+def _init_segment_worker(frames_done, cv_threads):
+    global _segment_frames_done
+    _segment_frames_done = frames_done
+    cv2.setNumThreads(cv_threads) # Keep N processes from each spawning a full OpenCV thread pool
+
+
+def _encode_segment(input_path, part_path, plan, timed=False, reuse_buffers=False, progress=None):
+    """Process-pool task: encodes frames [plan.start_frame, plan.end_frame) into ``part_path``.
+
+    Returns the frames written and, if ``timed``, the StageTimer.state() of this segment.
+    ``progress`` replaces the counter shared with the parent when run in the parent itself.
+    """
+    cap = cv2.VideoCapture(input_path)
+    out = None
+    timer = StageTimer() if timed else None
+    try:
+        if not cap.isOpened(): raise IOError(f"Cannot open input: {input_path}")
+        out = cv2.VideoWriter(part_path, fourcc_for_path(part_path), plan.output_fps, (plan.out_width, plan.out_height),
+                              isColor=plan.is_color)
+        if not out.isOpened(): raise IOError(f"Cannot open video writer for: {part_path}")
+        t0 = _now() if timer else 0
+        seek_to_frame(cap, plan.start_frame, plan.frame_index)
+        if timer: timer.record('seek', t0)
+        if progress is None and _segment_frames_done is not None: progress = _SharedFrameCounter(_segment_frames_done)
+        pool = FramePool() if reuse_buffers else None
+        written = _write_frames_sequential(cap, out, plan, _frame_transform(plan, timer, pool), progress, timer, pool)
+        return written, timer.state() if timer else None
+    finally:
+        cap.release()
+        if out: out.release()
+
+
+def can_join_losslessly():
+    """Whether join_video_parts() can stream-copy, i.e. ffmpeg is on PATH."""
+    return shutil.which('ffmpeg') is not None
+
+
+def join_video_parts(part_paths, output_path, fps, size, is_color=True):
+    """Concatenates equally-encoded video files into ``output_path``.
+
+    Uses ffmpeg's concat demuxer (stream copy, no re-encode) when ffmpeg is on
+    PATH; otherwise the parts are decoded and re-encoded with OpenCV, which
+    cannot remux on its own: a second lossy encode, on one thread.
+    """
+    ffmpeg = shutil.which('ffmpeg')
+    if ffmpeg:
+        list_path = os.path.join(os.path.dirname(part_paths[0]), 'parts.txt')
+        with open(list_path, 'w', encoding='utf-8') as f:
+            for part in part_paths:
+                escaped = os.path.abspath(part).replace("'", "'\\''")
+                f.write(f"file '{escaped}'\n")
+        subprocess.run([ffmpeg, '-y', '-loglevel', 'error', '-f', 'concat', '-safe', '0', '-i', list_path,
+                        '-c', 'copy', output_path], check=True)
+        return
+
+    print(f"Warning: ffmpeg not found; re-encoding {len(part_paths)} parts into {output_path} with OpenCV (slower, lossy).")
+    out = cv2.VideoWriter(output_path, fourcc_for_path(output_path), fps, size, isColor=is_color)
+    try:
+        if not out.isOpened(): raise IOError(f"Cannot open video writer for: {output_path}")
+        for part in part_paths:
+            cap = cv2.VideoCapture(part)
+            try:
+                while True:
+                    ret, frame = cap.read()
+                    if not ret: break
+                    out.write(frame if is_color else cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)) # Decoders return BGR
+            finally:
+                cap.release()
+    finally:
+        out.release()
+
+
+def _segment_work_dir(output_path):
+    """Where a resumable ProcessJob keeps its encoded segments between runs."""
+    directory, name = os.path.split(os.path.abspath(output_path))
+    return os.path.join(directory, f".{name}.segments")
+
+
+class _SegmentManifest:
+    """Which segments of a resumable ProcessJob are encoded, saved in its segment directory.
+
+    The job is identified by its input file (size and mtime), its plan and
+    the segment bounds; a manifest from a different job is ignored, and so
+    is a segment whose part file no longer has the recorded size.
+    """
+    def __init__(self, work_dir, job, plan, segments):
+        self.path = os.path.join(work_dir, 'segments.json')
+        stat = os.stat(job.input_path)
+        self.key = {'input': os.path.abspath(job.input_path), 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns,
+                    'plan': repr(plan), 'segments': [list(segment) for segment in segments]}
+        self.done = {} # Segment number -> [frames written, part file size]
+
+    def load(self, part_paths):
+        """{segment number: frames written} for the segments an earlier run finished that are still intact."""
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f: stored = json.load(f)
+            if stored['key'] != self.key: return {}
+            for i, (count, size) in stored['done'].items():
+                if os.path.getsize(part_paths[int(i)]) == size: self.done[int(i)] = [count, size]
+        except (OSError, ValueError, KeyError, TypeError, IndexError):
+            pass # Missing or unusable: encode those segments again
+        return {i: count for i, (count, _) in self.done.items()}
+
+    def record(self, i, count, part_path):
+        self.done[i] = [count, os.path.getsize(part_path)]
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'key': self.key, 'done': self.done}, f)
+        os.replace(tmp_path, self.path) # Atomic, so a crash never leaves a half-written manifest
+
+
+def _segment_parts(job, plan):
+    """How many parts _process_video_segmented() cuts the planned range into."""
+    if job.resume: return max(job.segment_workers, math.ceil(plan.frame_count / RESUME_SEGMENT_FRAMES))
+    return job.segment_workers
+
+
+def _process_video_segmented(job, plan, progress, timer=None):
+    """Splits the planned range over ``job.segment_workers`` processes and joins the parts.
+
+    Each process opens its own capture and writer. Parts go to a temporary
+    directory next to the output, which is removed afterwards, and also when
+    any segment fails. With ``job.resume`` the range is cut into segments of
+    at most RESUME_SEGMENT_FRAMES, the parts go to a fixed directory that
+    survives a failure, and the segments an earlier run finished are reused;
+    without segment_workers they are encoded one after another in this
+    process. A single part is moved into place instead of joined.
+    """
+    parts = _segment_parts(job, plan)
+    workers = max(1, min(job.segment_workers, parts))
+    segments = split_frame_range(plan.start_frame, plan.end_frame, parts)
+    _, ext = os.path.splitext(job.output_path)
+    if job.resume:
+        work_dir = _segment_work_dir(job.output_path)
+        os.makedirs(work_dir, exist_ok=True)
+    else:
+        work_dir = tempfile.mkdtemp(prefix='.cropvideo_segments_', dir=os.path.dirname(os.path.abspath(job.output_path)))
+    part_paths = [os.path.join(work_dir, f"part_{i:04}{ext}") for i in range(len(segments))]
+    manifest = _SegmentManifest(work_dir, job, plan, segments) if job.resume else None
+    done = manifest.load(part_paths) if manifest else {}
+    if done: print(f"Resuming: {len(done)} of {len(segments)} segments already encoded")
+    if progress: progress.set_total(plan.output_frame_count)
+
+    def complete(i, count):
+        s, e = segments[i]
+        # Only the last segment may run short: the container frame count is an estimate
+        return count == plan.output_frames_before(e) - plan.output_frames_before(s) or i == len(segments) - 1
+
+    frames_reused = sum(done.values())
+    joined = False
+    results = {} # Segment number -> (frames written, StageTimer state)
+    try:
+        if workers == 1: # No process pool to spread over: encode right here
+            if progress: progress.update(frames_reused)
+            for i, (s, e) in enumerate(segments):
+                if i in done: continue
+                results[i] = _encode_segment(job.input_path, part_paths[i], replace(plan, start_frame=s, end_frame=e),
+                                             timer is not None, job.reuse_buffers, progress)
+                if manifest and complete(i, results[i][0]): manifest.record(i, results[i][0], part_paths[i])
+        else:
+            ctx = multiprocessing.get_context('spawn') # Safe next to Tk and worker threads, unlike fork
+            frames_done = ctx.Value('q', 0)
+            cv_threads = max(1, (os.cpu_count() or 1) // workers)
+            with ProcessPoolExecutor(max_workers=workers, mp_context=ctx,
+                                     initializer=_init_segment_worker, initargs=(frames_done, cv_threads)) as pool:
+                futures = {pool.submit(_encode_segment, job.input_path, part_paths[i], replace(plan, start_frame=s, end_frame=e),
+                                       timer is not None, job.reuse_buffers): i
+                           for i, (s, e) in enumerate(segments) if i not in done}
+                pending = set(futures)
+                while pending:
+                    finished, pending = wait(pending, timeout=0.1, return_when=FIRST_EXCEPTION)
+                    if progress: progress.update(frames_reused + frames_done.value)
+                    for future in finished:
+                        if future.exception():
+                            for other in pending: other.cancel()
+                            raise future.exception()
+                        i = futures[future]
+                        results[i] = future.result()
+                        if manifest and complete(i, results[i][0]): manifest.record(i, results[i][0], part_paths[i])
+
+        written = [done.get(i, 0) for i in range(len(segments))]
+        for i, (count, state) in results.items():
+            written[i] = count
+            if timer: timer.merge(state)
+        for i, ((s, e), count) in enumerate(zip(segments, written)):
+            if not complete(i, count): raise IOError(f"Segment {s}-{e} ended after {count} frames; refusing to drop frames")
+        t0 = _now() if timer else 0
+        parts = [p for p, count in zip(part_paths, written) if count > 0]
+        if not parts: raise IOError(f"No frames could be read from frame {plan.start_frame} on; the video ends before the range")
+        if len(parts) == 1: os.replace(parts[0], job.output_path) # Nothing to join: keep the encode as it is
+        else: join_video_parts(parts, job.output_path, plan.output_fps, (plan.out_width, plan.out_height), plan.is_color)
+        if timer: timer.record('join', t0)
+        joined = True
+        return sum(written)
+    except Exception:
+        try:
+            if os.path.exists(job.output_path): os.remove(job.output_path); print(f"Removed partial file: {job.output_path}")
+        except OSError as os_err: print(f"Could not remove output file {job.output_path}: {os_err}")
+        if job.resume: print(f"Kept the finished segments in {work_dir}; run the same job again to resume")
+        raise
+    finally:
+        if joined or not job.resume: shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def scene_output_path(output_path, number):
+    """Output file of scene ``number`` (from 1) of a split ProcessJob: ``clip.mp4`` -> ``clip_scene001.mp4``."""
+    base, ext = os.path.splitext(output_path)
+    return f"{base}_scene{number:03}{ext}"
+
+
+def range_output_path(output_path, number):
+    """Output file of range ``number`` (from 1) of a ProcessJob with split_ranges: ``clip.mp4`` -> ``clip_range001.mp4``."""
+    base, ext = os.path.splitext(output_path)
+    return f"{base}_range{number:03}{ext}"
+
+
+def _process_video_split(job, plan, progress, timer=None):
+    """One output file per scene of the planned range, from one forward decode.
+
+    The cuts are ``job.split_at`` plus, with ``job.split_scenes``, the scene
+    starts found by an analysis pass first.
+    """
+    cuts = set(job.split_at)
+    if job.split_scenes is not None:
+        t0 = _now() if timer else 0
+        cuts.update(detect_scenes(job.input_path, plan.start_frame, plan.end_frame - 1, job.split_scenes,
+                                  plan.frame_index, progress, timer))
+        if timer: timer.record('scene_scan', t0)
+    bounds = sorted({c for c in cuts if plan.start_frame < c < plan.end_frame} | {plan.start_frame, plan.end_frame})
+    slices = list(zip(bounds, bounds[1:]))
+    written = _process_video_slices(job, plan, slices, [scene_output_path(job.output_path, n) for n in range(1, len(slices) + 1)],
+                                    progress, timer)
+    print(f"Split into {len(slices)} scene files: {scene_output_path(job.output_path, 1)} ...")
+    return written
+
+
+def _process_video_slices(job, plan, slices, paths=None, progress=None, timer=None):
+    """Writes the ascending (start, end) frame ``slices`` of ``plan`` from one forward decode.
+
+    ``paths`` has one output file per slice; None writes them one after the
+    other into ``job.output_path``. Each slice is a copy of the plan cut to
+    its range, so the resampling schedule carries on across them. The
+    capture carries on too: back-to-back slices need no seek, and the gap
+    before a slice is grabbed through unless plan_seeks() finds a seek
+    cheaper. On failure every file written so far is removed.
+    """
+    if progress: progress.reset(plan.output_frame_count)
+    gaps = [start - prev_end for (_, prev_end), (start, _) in zip(slices, slices[1:]) if start > prev_end]
+    seeks = [False] * len(slices)
+    if gaps and max(gaps) > 1:
+        seek_cost = measure_seek_cost(job.input_path, plan.frame_index)
+        seeks = plan_seeks([start for start, _ in slices], seek_cost, plan.frame_index, slices[0][0],
+                           ends=[end for _, end in slices])
+
+    cap = None
+    out = None
+    paths_written = []
+    written = 0
+    try:
+        cap = cv2.VideoCapture(job.input_path)
+        if not cap.isOpened(): raise IOError(f"Cannot open input: {job.input_path}")
+        t0 = _now() if timer else 0
+        seek_to_frame(cap, slices[0][0], plan.frame_index)
+        if timer: timer.record('seek', t0)
+        position = slices[0][0]
+        pool = FramePool() if job.reuse_buffers else None
+        transform = _frame_transform(plan, timer, pool)
+        for number, ((start, end), seek) in enumerate(zip(slices, seeks)):
+            if position != start:
+                position = _advance_to(cap, position, start, plan.frame_index, timer, seek)
+                if position is None: break # The video ended early
+            if out is None:
+                paths_written.append(job.output_path if paths is None else paths[number])
+                out = cv2.VideoWriter(paths_written[-1], fourcc_for_path(paths_written[-1]), plan.output_fps,
+                                      (plan.out_width, plan.out_height), isColor=plan.is_color)
+                if not out.isOpened(): raise IOError(f"Cannot open video writer for: {paths_written[-1]}")
+            written += _write_frames_sequential(cap, out, replace(plan, start_frame=start, end_frame=end, ranges=None),
+                                                transform, progress, timer, pool)
+            position = end
+            if paths is not None: out.release(); out = None
+        return written
+    except Exception:
+        if out is not None: out.release(); out = None
+        for path in paths_written:
+            try:
+                if os.path.exists(path): os.remove(path); print(f"Removed partial file: {path}")
+            except OSError as os_err: print(f"Could not remove output file {path}: {os_err}")
+        raise
+    finally:
+        if out is not None: out.release()
+        if cap and cap.isOpened(): cap.release()
+
+
+def process_video(job, plan, progress=None, on_warning=None, timer=None):
+    """Runs a planned ProcessJob. Returns the number of frames written.
+
+    ``progress`` is an optional ProgressTracker advanced once per written
+    frame; ``on_warning(key, *params)`` is called for non-fatal problems;
+    ``timer`` is an optional StageTimer. On failure the partial output file
+    is removed and the exception re-raised, except for the segments a
+    ``job.resume`` run keeps. segment_workers only applies when ffmpeg can
+    join the parts without re-encoding them (can_join_losslessly); otherwise
+    the job runs in this process. A plan with renditions or an extraction runs as
+    one multi-output pass (segment_workers are ignored then) and
+    returns the frames written to all outputs together. A ``job.split`` writes
+    one file per scene instead of ``job.output_path`` (see scene_output_path),
+    and a cut list (``plan.ranges``) joins its ranges into ``job.output_path``
+    or, with ``job.split_ranges``, writes one file per range (see
+    range_output_path); both ignore pipeline_workers and segment_workers.
+    None of these can be resumed: plan_video_processing() rejects resume for them.
+    """
+    if plan.renditions or plan.extract is not None:
+        return _process_video_multi(job, plan, progress, on_warning, timer)
+    if job.split: return _process_video_split(job, plan, progress, timer)
+    if plan.ranges is not None:
+        paths = [range_output_path(job.output_path, n) for n in range(1, len(plan.ranges) + 1)] if job.split_ranges else None
+        return _process_video_slices(job, plan, plan.ranges, paths, progress, timer)
+    if job.segment_workers > 1 and plan.frame_count > job.segment_workers and not job.resume and not can_join_losslessly():
+        print("Warning: ffmpeg not found; ignoring segment_workers, as joining the segments would re-encode them.")
+    elif (job.segment_workers > 1 and plan.frame_count > job.segment_workers) or (job.resume and plan.frame_count > 0):
+        return _process_video_segmented(job, plan, progress, timer)
+
+    cap = None
+    out = None
+    try:
+        cap = cv2.VideoCapture(job.input_path)
+        if not cap.isOpened(): raise IOError(f"Cannot open input: {job.input_path}")
+
+        out_size = (plan.out_width, plan.out_height)
+        out = cv2.VideoWriter(job.output_path, fourcc_for_path(job.output_path), plan.output_fps, out_size,
+                              isColor=plan.is_color)
+        if not out.isOpened(): raise IOError(f"Cannot open video writer for: {job.output_path}")
+
+        if progress: progress.set_total(plan.output_frame_count)
+        t0 = _now() if timer else 0
+        seek_to_frame(cap, plan.start_frame, plan.frame_index)
+        if timer: timer.record('seek', t0)
+
+        pool = FramePool() if job.reuse_buffers else None
+        transform = _frame_transform(plan, timer, pool)
+        if job.pipeline_workers > 0:
+            return _write_frames_pipelined(cap, out, plan, transform, job.pipeline_workers, progress, timer, pool)
+        return _write_frames_sequential(cap, out, plan, transform, progress, timer, pool)
+
+    except Exception:
+        try:
+            if out and out.isOpened(): out.release()
+            if os.path.exists(job.output_path): os.remove(job.output_path); print(f"Removed partial file: {job.output_path}")
+        except OSError as os_err: print(f"Could not remove output file {job.output_path}: {os_err}")
+        raise
+    finally:
+        if cap and cap.isOpened(): cap.release()
+        if out and out.isOpened(): out.release()
+
+
+class FrameSaver:
+    """Saves extracted frames into a frame store, optionally on a pool of writer threads.
+
+    With ``workers`` > 0, save() hands the frame to the writers over a bounded
+    queue and returns immediately, so PNG/JPEG encoding (which releases the
+    GIL) runs concurrently with decoding; the queue bound keeps a fast reader
+    from piling up decoded frames. With 0 workers frames are written inline.
+    Failed frames are reported through ``on_warning('error_saving_frame', ...)``
+    and skipped, whichever thread wrote them. ``transform`` (a compiled
+    filter chain) runs on the writer threads too. Frames are handed back to
+    ``pool`` once written. ``store`` (see _open_frame_store) writes them and
+    is closed by close(); an optional ``checkpoint`` records every stored frame.
+    An optional ``dedup`` (a _Deduplicator) drops near-duplicates in save(),
+    on the caller's thread, so they are compared in frame order. Anything
+    else a writer thread raises (a failing progress callback, say) stops the
+    job: it is re-raised by the next save() or by close(), and the writers
+    keep draining the queue meanwhile so the caller never blocks on it.
+    """
+    def __init__(self, store, workers=0, progress=None, on_warning=None, timer=None, pool=None, transform=None,
+                 checkpoint=None, dedup=None):
+        self.store = store
+        self.checkpoint = checkpoint
+        self.dedup = dedup
+        self.transform = transform
+        self.progress = progress
+        self.on_warning = on_warning
+        self.timer = timer
+        self.pool = pool
+        self.saved_count = 0
+        self.failed_count = 0
+        self._error = None # First exception a writer thread raised outside of a store write, until re-raised
+        self._failed = False # Set with it for good: the writers only drain the queue from then on
+        self._lock = threading.Lock()
+        self._queue = queue.Queue(maxsize=workers * PIPELINE_QUEUE_PER_WORKER) if workers > 0 else None
+        self._threads = [threading.Thread(target=self._run, name=f"frame-writer-{i}", daemon=True)
+                         for i in range(workers)]
+        for thread in self._threads: thread.start()
+
+    def save(self, frame_index, frame):
+        self._raise_writer_error()
+        if self.dedup is not None and not self.dedup.keep(frame_index, frame, self.timer):
+            if self.pool: self.pool.release(frame)
+            if self.progress: self.progress.advance()
+            return
+        if self._queue is None: self._write(frame_index, frame)
+        else: self._queue.put((frame_index, frame)) # Blocks while the writers are behind
+
+    def close(self):
+        """Waits for queued frames to be written, stops the writers and closes the store.
+        Returns the saved count."""
+        for _ in self._threads: self._queue.put(None)
+        for thread in self._threads: thread.join()
+        self._threads = []
+        self.store.close()
+        if self.dedup is not None: self.dedup.close()
+        self._raise_writer_error()
+        return self.saved_count
+
+    def discard(self):
+        """Stops the writers and removes what was stored, for a job that failed. Never raises,
+        so the exception that failed the job is the one reported."""
+        with self._lock: self._failed = True # The writers only drain from now on
+        for _ in self._threads: self._queue.put(None)
+        for thread in self._threads: thread.join()
+        self._threads = []
+        try: self.store.close()
+        except Exception as e: print(f"Could not close the frame store: {e}")
+        removed = 0
+        for path in self.store.created_paths() + ([self.dedup.path] if self.dedup is not None else []):
+            try:
+                if os.path.exists(path): os.remove(path); removed += 1
+            except OSError as os_err: print(f"Could not remove extracted file {path}: {os_err}")
+        if removed: print(f"Removed {removed} partially extracted files")
+
+    def _raise_writer_error(self):
+        with self._lock: error, self._error = self._error, None
+        if error is not None: raise error
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None: return
+            if self._failed: # Only drain, so save() and close() never block on a full queue
+                if self.pool: self.pool.release(item[1])
+                continue
+            try:
+                self._write(*item)
+            except BaseException as e:
+                with self._lock:
+                    if not self._failed: self._error, self._failed = e, True
+
+    def _write(self, frame_index, frame):
+        try:
+            if self.transform: frame = self.transform(frame)
+            size = self.store.write(frame_index, frame, self.timer)
+            if self.checkpoint: self.checkpoint.record(frame_index, size)
+        except Exception as save_err:
+            print(f"Error saving frame {frame_index}: {save_err}")
+            _notify(self.on_warning, 'error_saving_frame', frame_index, str(save_err))
+            with self._lock: self.failed_count += 1
+            return # Continue with the next frame even if one fails
+        finally:
+            if self.pool: self.pool.release(frame)
+        with self._lock: self.saved_count += 1
+        if self.progress: self.progress.advance()
+
+
+def perceptual_hash(frame, method='dhash'):
+    """64-bit perceptual hash of ``frame`` as an int; near-identical frames differ in few bits.
+
+    'dhash' sets a bit where a pixel of a 9x8 grayscale thumbnail is brighter
+    than its right neighbour, 'ahash' where a pixel of an 8x8 one is brighter
+    than the mean. Both ignore noise, recompression and small shifts.
+    """
+    small = scene_proxy(frame, 9 if method == 'dhash' else 8)
+    small = cv2.resize(small, (small.shape[1], 8), interpolation=cv2.INTER_AREA).astype(np.int16)
+    bits = small[:, :-1] > small[:, 1:] if method == 'dhash' else small > small.mean()
+    return int.from_bytes(np.packbits(bits).tobytes(), 'big')
+
+
+def hamming_distance(a, b):
+    return bin(a ^ b).count('1')
+
+
+class _Deduplicator:
+    """Decides which frames of a FrameDedup extraction are saved and writes the mapping of the rest."""
+    def __init__(self, job):
+        self.dedup = job.dedup
+        self.path = os.path.join(job.output_dir, DEDUP_MAP_FILE)
+        self.kept_frame = None
+        self.kept_hash = None
+        self.skipped = [] # (frame, kept frame, distance)
+
+    def keep(self, frame_index, frame, timer=None):
+        t0 = _now() if timer else 0
+        frame_hash = perceptual_hash(frame, self.dedup.method)
+        if timer: timer.record('hash', t0)
+        if self.kept_hash is not None:
+            distance = hamming_distance(frame_hash, self.kept_hash)
+            if distance <= self.dedup.max_distance:
+                self.skipped.append((frame_index, self.kept_frame, distance))
+                return False
+        self.kept_frame, self.kept_hash = frame_index, frame_hash # Compared with the last kept frame, so slow drift still saves
+        return True
+
+    def close(self):
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write("frame,kept_frame,distance\n")
+            f.writelines(f"{frame},{kept},{distance}\n" for frame, kept, distance in self.skipped)
+        os.replace(tmp_path, self.path)
+        print(f"Skipped {len(self.skipped)} near-duplicate frames; see {self.path}")
+
+
+class _FileStore:
+    """Frame store writing one image file per frame into the output directory."""
+    def __init__(self, job, num_width):
+        self.job = job
+        self.num_width = num_width # Zero padding of the frame numbers in the names
+        self.params = job.encoding.params(job.image_format)
+        self._written = [] # Files this store created, for created_paths()
+
+    def name(self, frame_index):
+        return f"frame_{str(frame_index).zfill(self.num_width)}.{self.job.image_format}"
+
+    def write(self, frame_index, frame, timer=None):
+        """Stores one frame; returns its size in bytes."""
+        filepath = os.path.join(self.job.output_dir, self.name(frame_index))
+        t0 = _now() if timer else 0
+        save_success = cv2.imwrite(filepath, frame, self.params)
+        if timer: timer.record('imwrite', t0)
+        if not save_success: raise IOError(f"imwrite failed for {filepath}")
+        self._written.append(filepath)
+        return os.path.getsize(filepath)
+
+    def verify(self, frame_index, size):
+        """Whether the frame a checkpoint recorded as ``size`` bytes is still stored intact."""
+        try: return os.path.getsize(os.path.join(self.job.output_dir, self.name(frame_index))) == size
+        except OSError: return False
+
+    def created_paths(self):
+        """The files this store wrote, for removing a failed job's output."""
+        return list(self._written)
+
+    def close(self):
+        pass
+
+
+class _ArchiveStore(_FileStore):
+    """Frame store writing the same image files as members of one uncompressed tar or zip.
+
+    Images are encoded concurrently on the writer threads; only appending to
+    the archive is serialized, so with several writers the members are in
+    completion order rather than frame order.
+    """
+    def __init__(self, job, num_width):
+        super().__init__(job, num_width)
+        self.path = frame_output_path(job)
+        self._lock = threading.Lock()
+        if job.container == 'zip': self._archive = zipfile.ZipFile(self.path, 'w', zipfile.ZIP_STORED) # Images are compressed already
+        else: self._archive = tarfile.open(self.path, 'w')
+
+    def write(self, frame_index, frame, timer=None):
+        name = self.name(frame_index)
+        t0 = _now() if timer else 0
+        ok, data = cv2.imencode('.' + self.job.image_format, frame, self.params)
+        if timer: timer.record('imencode', t0)
+        if not ok: raise IOError(f"imencode failed for {name}")
+        t0 = _now() if timer else 0
+        with self._lock:
+            if isinstance(self._archive, zipfile.ZipFile):
+                self._archive.writestr(name, data.tobytes())
+            else:
+                member = tarfile.TarInfo(name)
+                member.size, member.mtime = data.size, time.time()
+                self._archive.addfile(member, io.BytesIO(data))
+        if timer: timer.record('archive_write', t0)
+        return data.size
+
+    def created_paths(self):
+        return [self.path]
+
+    def close(self):
+        self._archive.close()
+
+
+class _ArrayStore:
+    """Frame store writing raw frames into one memory-mapped .npy array.
+
+    The array is (frames, height, width[, channels]) uint8, one row per frame
+    the plan selects, and frame_index_path holds the source frame number of
+    every row; rows that were never written (a failed save, or a video that
+    ended early) keep -1 there. Writers fill distinct rows, so no lock is needed.
+    With ``reopen``, arrays an earlier run of the same selection left behind
+    are written into instead of being recreated.
+    """
+    def __init__(self, job, frames, frame_shape, reopen=False):
+        self.path = frame_output_path(job)
+        self.index_path = frame_index_path(job)
+        self.frames = frames
+        shape = (len(frames),) + tuple(frame_shape)
+        if reopen and self._reopen(self.index_path, shape): return
+        self._array = np.lib.format.open_memmap(self.path, 'w+', np.uint8, shape)
+        self._index = np.lib.format.open_memmap(self.index_path, 'w+', np.int64, shape[:1])
+        self._index[:] = -1
+
+    def _reopen(self, index_path, shape):
+        try:
+            array = np.lib.format.open_memmap(self.path, 'r+')
+            index = np.lib.format.open_memmap(index_path, 'r+')
+        except (OSError, ValueError):
+            return False
+        rows_match = array.shape == shape and array.dtype == np.uint8 and index.shape == shape[:1] and \
+            bool(np.all((index == -1) | (index == np.asarray(self.frames, np.int64))))
+        if rows_match: self._array, self._index = array, index
+        return rows_match
+
+    def write(self, frame_index, frame, timer=None):
+        if frame.shape != self._array.shape[1:]:
+            raise IOError(f"Frame {frame_index} is {frame.shape}, the array holds {self._array.shape[1:]}")
+        t0 = _now() if timer else 0
+        row = _position(self.frames, frame_index)
+        self._array[row] = frame
+        self._index[row] = frame_index
+        if timer: timer.record('array_write', t0)
+        return frame.nbytes
+
+    def verify(self, frame_index, size):
+        return _contains(self.frames, frame_index) and self._index[_position(self.frames, frame_index)] == frame_index
+
+    def created_paths(self):
+        return [self.path, self.index_path]
+
+    def close(self):
+        if self._array is None: return # Closed already
+        for array in (self._array, self._index): array.flush()
+        self._array = self._index = None
+
+
+def _open_frame_store(job, plan, frames, total_video_frames, reopen=False):
+    """The frame store for ``job.container``; ``frames`` are the frame numbers that will be saved.
+    ``reopen`` keeps what a previous run stored where the container allows."""
+    if job.container == 'npy': return _ArrayStore(job, frames, plan.frame_shape, reopen)
+    num_width = len(str(total_video_frames)) if total_video_frames > 0 else 4 # Padding width
+    if job.container in ('tar', 'zip'): return _ArchiveStore(job, num_width)
+    return _FileStore(job, num_width)
+
+
+class _ExtractCheckpoint:
+    """Append-only log of the frames a resumable ExtractJob has stored.
+
+    The first line identifies the job (input file size and mtime, format,
+    encoding, filters and container), so a log left by a different job is
+    ignored; each later line is "<frame> <bytes>", appended and flushed once
+    the frame is stored, so a crash loses at most a torn last line. The file
+    is removed when the run finishes without failed frames.
+    """
+    def __init__(self, job):
+        self.path = os.path.join(job.output_dir, CHECKPOINT_FILE)
+        stat = os.stat(job.input_path)
+        self.header = json.dumps({'input': os.path.abspath(job.input_path), 'size': stat.st_size,
+                                  'mtime_ns': stat.st_mtime_ns, 'format': job.image_format,
+                                  'encoding': repr(job.encoding), 'filters': [repr(f) for f in job.filters],
+                                  'container': job.container}, sort_keys=True)
+        self._lock = threading.Lock()
+        self._file = None
+
+    def load(self):
+        """{frame: bytes} recorded by an earlier run of the same job."""
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f: lines = f.read().split('\n')
+        except OSError:
+            return {}
+        if lines[0] != self.header: return {}
+        saved = {}
+        for line in lines[1:-1]: # The last one is empty, or torn
+            frame_index, size = line.split()
+            saved[int(frame_index)] = int(size)
+        return saved
+
+    def start(self, saved):
+        """Rewrites the log with only ``saved`` (the frames verified intact) and opens it for appending."""
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(self.header + '\n')
+            f.writelines(f"{frame_index} {size}\n" for frame_index, size in sorted(saved.items()))
+        os.replace(tmp_path, self.path)
+        self._file = open(self.path, 'a', encoding='utf-8')
+
+    def record(self, frame_index, size):
+        with self._lock:
+            self._file.write(f"{frame_index} {size}\n")
+            self._file.flush()
+
+    def close(self, finished):
+        if self._file: self._file.close()
+        if finished and os.path.exists(self.path): os.remove(self.path)
+
+
+def _advance_to(cap, position, target, index=None, timer=None, seek=None):
+    """Moves ``cap`` from frame ``position`` so the next read() returns ``target``.
+
+    Short gaps are crossed with grab(), which skips the colour conversion and
+    copy of a full read(); long ones with a seek. ``seek`` overrides that
+    choice (see plan_seeks). Returns the new position, or None if the video
+    ended first.
+    """
+    if seek is None: seek = target - position > GRAB_MAX_GAP
+    if seek:
+        t0 = _now() if timer else 0
+        seek_to_frame(cap, target, index)
+        if timer: timer.record('seek', t0)
+        return target
+    while position < target:
+        t0 = _now() if timer else 0
+        if not cap.grab(): return None
+        if timer: timer.record('grab', t0)
+        position += 1
+    return position
+
+
+def _scan_extract_frames(job, plan, progress=None, timer=None):
+    """The frames an ExtractPlan leaves to the worker: the scene starts, or the keyframes when there is no index."""
+    t0 = _now() if timer else 0
+    if job.scenes is None:
+        frames = find_keyframes(job.input_path, plan.start_frame, plan.end_frame)
+        if timer: timer.record('keyframe_scan', t0)
+        return frames
+    frames = detect_scenes(job.input_path, plan.start_frame, plan.end_frame, job.scenes, plan.frame_index, progress, timer)
+    if progress: progress.reset() # The analysis pass is done; the saving pass starts from 0
+    if timer: timer.record('scene_scan', t0)
+    return frames
+
+
+def measure_seek_cost(path, index=None, total_frames=0):
+    """How many grab()s one seek of ``path`` costs, measured: the break-even gap for plan_seeks().
+
+    Times SEEK_PROBE_GRABS grabs from the start and SEEK_PROBE_SEEKS seeks
+    spread over the file. Without an index a seek includes decoding from the
+    keyframe before the target, so the median is an average over GOPs; with
+    one the seeks land on keyframes and time the seek alone. Returns
+    GRAB_MAX_GAP when the file is too short to tell.
+    """
+    cap = cv2.VideoCapture(path)
+    try:
+        if not cap.isOpened(): raise IOError(f"Cannot open input: {path}")
+        total = total_frames or (index.frame_count if index is not None else int(cap.get(cv2.CAP_PROP_FRAME_COUNT)))
+        start = time.perf_counter()
+        grabbed = 0
+        while grabbed < SEEK_PROBE_GRABS and cap.grab(): grabbed += 1
+        if grabbed < SEEK_PROBE_GRABS: return float(GRAB_MAX_GAP)
+        grab_cost = (time.perf_counter() - start) / grabbed
+        seeks = []
+        for k in range(1, SEEK_PROBE_SEEKS + 1):
+            target = total * k // (SEEK_PROBE_SEEKS + 1)
+            if index is not None and len(index.keyframes): target = index.keyframe_at_or_before(target)
+            if target <= grabbed: continue # Would not be a seek
+            start = time.perf_counter()
+            seek_to_frame(cap, target, index)
+            if cap.grab(): seeks.append(time.perf_counter() - start - grab_cost)
+        if not seeks: return float(GRAB_MAX_GAP)
+        return max(1.0, statistics.median(seeks) / max(grab_cost, 1e-9))
+    finally:
+        cap.release()
+
+
+def plan_seeks(frames, seek_cost, index=None, position=0, ends=None):
+    """For each of the ascending ``frames``, whether to reach it with a seek (True) or by grabbing forward (False).
+
+    ``seek_cost`` is a seek's cost in grabs (measure_seek_cost). Without an
+    index a seek pays off once the gap is longer than that. With one the
+    seek lands on the keyframe at or before the frame and grabs on from
+    there, so it pays off only if it skips more than that many frames.
+    ``ends`` are the positions after reading from each frame on, when whole
+    ranges are read rather than single frames.
+    """
+    seeks = []
+    for n, frame in enumerate(frames):
+        if index is not None and len(index.keyframes):
+            seeks.append(index.keyframe_at_or_before(frame) - position > seek_cost)
+        else:
+            seeks.append(frame - position > seek_cost)
+        position = ends[n] if ends is not None else frame + 1 # After the read
+    return seeks
+
+
+def extract_frames(job, plan, total_video_frames=0, progress=None, on_warning=None, timer=None):
+    """Runs a planned ExtractJob. Returns the number of frames saved.
+
+    Only the frames selected by the plan are decoded in full; the ones in
+    between are skipped with grab() or a seek. Frames that fail to save are
+    reported through ``on_warning`` with the 'error_saving_frame' key and
+    skipped; a read failure ends the run early. ``timer`` is an optional
+    StageTimer. With ``job.resume`` the frames a checkpoint shows an earlier
+    run stored (and that are still intact) are not decoded again; they count
+    as saved. With ``job.dedup`` near-duplicate frames are decoded and hashed
+    but not saved (nor counted). For a ``frame_list``/``time_list`` the cost
+    of a seek is measured first and every gap planned with plan_seeks().
+    """
+    cap = None
+    saver = None
+    checkpoint = None
+    saved = {}
+    completed = False
+    pool = FramePool() if job.reuse_buffers else None
+    try:
+        frames = plan.frames
+        if frames is None: frames = _scan_extract_frames(job, plan, progress, timer)
+        if progress: progress.set_total(len(frames))
+
+        cap = cv2.VideoCapture(job.input_path)
+        if not cap.isOpened(): raise IOError(f"Cannot open input: {job.input_path}")
+        checkpoint = _ExtractCheckpoint(job) if job.resume else None
+        recorded = checkpoint.load() if checkpoint else {}
+        store = _open_frame_store(job, plan, frames, total_video_frames, reopen=bool(recorded))
+        saved = {f: size for f, size in recorded.items() if _contains(frames, f) and store.verify(f, size)}
+        if checkpoint: checkpoint.start(saved)
+        if saved:
+            print(f"Resuming: {len(saved)} of {len(frames)} frames already saved")
+            if progress: progress.advance(len(saved))
+            frames = [f for f in frames if f not in saved]
+        transform = compile_filters(plan.filters, pool, timer) if plan.filters else None
+        dedup = _Deduplicator(job) if job.dedup is not None else None
+        saver = FrameSaver(store, job.writer_workers, progress, on_warning, timer, pool, transform, checkpoint, dedup)
+
+        seeks = None
+        if (job.frame_list or job.time_list) and frames:
+            t0 = _now() if timer else 0
+            seek_cost = measure_seek_cost(job.input_path, plan.frame_index, total_video_frames)
+            seeks = plan_seeks(frames, seek_cost, plan.frame_index)
+            if timer: timer.record('seek_probe', t0)
+            print(f"A seek costs about {seek_cost:.0f} grabbed frames: {sum(seeks)} seeks for {len(frames)} frames")
+
+        position = 0
+        shape = None
+        for i, current_frame_index in enumerate(frames):
+            t0 = _now() if timer else 0
+            position = _advance_to(cap, position, current_frame_index, plan.frame_index, timer, seeks[i] if seeks else None)
+            t1 = _now() if timer else 0
+            ret, frame = _read_frame(cap, pool, shape) if position is not None else (False, None)
+            if timer and ret: timer.record('decode', t1)
+            if not ret:
+                print(f"Warning: Failed read at frame {current_frame_index}, stopping.")
+                _notify(on_warning, 'error_extracting', f"Read failed at frame {current_frame_index}")
+                break # Exit loop if video ends early
+            position += 1
+            shape = frame.shape
+
+            saver.save(current_frame_index, frame)
+            if timer: timer.record('frame', t0)
+        completed = True
+    finally:
+        try: extracted_count = saver.close() if saver else 0
+        except BaseException: completed = False; raise # A writer thread failed
+        finally:
+            if checkpoint: checkpoint.close(finished=completed and saver.failed_count == 0)
+            if cap and cap.isOpened(): cap.release()
+    return extracted_count + len(saved)
+
+
+class _SharedFramePool:
+    """FramePool front for a pass where several outputs read the same decoded frame.
+
+    share() registers how many consumers will release() a frame; the last
+    release hands it back to ``pool``. Everything else (resized frames,
+    acquire()) goes straight to ``pool``, so consumers use it like a FramePool.
+    """
+    def __init__(self, pool):
+        self.pool = pool
+        self._lock = threading.Lock()
+        self._users = {} # id(frame) -> remaining release() calls
+
+    def share(self, frame, users):
+        with self._lock: self._users[id(frame)] = users
+
+    def acquire(self, shape, dtype=np.uint8):
+        return self.pool.acquire(shape, dtype)
+
+    def release(self, buf):
+        if buf is None: return
+        while isinstance(buf.base, np.ndarray): buf = buf.base
+        with self._lock:
+            users = self._users.get(id(buf))
+            if users is not None:
+                if users > 1: self._users[id(buf)] = users - 1; return
+                del self._users[id(buf)]
+        self.pool.release(buf)
+
+
+class _OutputEncoder:
+    """One output video of a multi-output pass.
+
+    Transforms (crop, resize) and encodes the decoded frames handed to
+    submit(), inline or, with ``threaded``, on its own thread behind a
+    bounded queue, so the outputs encode concurrently while the decoder
+    moves on. An error on the thread is raised from the next submit() or
+    from close().
+    """
+    def __init__(self, output_path, plan, progress=None, timer=None, pool=None, threaded=False):
+        self.output_path = output_path
+        self.plan = plan
+        self.progress = progress
+        self.timer = timer
+        self.pool = pool
+        self.written = 0
+        self._transform = _frame_transform(plan, timer, pool, shared_input=True)
+        self._error = None
+        self._out = cv2.VideoWriter(output_path, fourcc_for_path(output_path), plan.output_fps, (plan.out_width, plan.out_height),
+                                    isColor=plan.is_color)
+        if not self._out.isOpened(): raise IOError(f"Cannot open video writer for: {output_path}")
+        self._queue = queue.Queue(maxsize=PIPELINE_QUEUE_PER_WORKER) if threaded else None
+        self._thread = None
+        if threaded:
+            self._thread = threading.Thread(target=self._run, name=f"encoder-{os.path.basename(output_path)}", daemon=True)
+            self._thread.start()
+
+    def wants(self, frame_index):
+        """How often ``frame_index`` is written to this output (0 = not at all)."""
+        if not self.plan.start_frame <= frame_index < self.plan.end_frame: return 0
+        return self.plan.repeats(frame_index)
+
+    def submit(self, frame_index, frame, repeats):
+        if self._error: raise self._error
+        if self._queue is None: self._encode(frame_index, frame, repeats)
+        else: self._queue.put((frame_index, frame, repeats))
+
+    def close(self):
+        """Encodes what is still queued and closes the file. Returns the frames written."""
+        if self._thread: self._queue.put(None); self._thread.join(); self._thread = None
+        if self._out: self._out.release(); self._out = None
+        if self._error: raise self._error
+        return self.written
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None: return
+            if self._error: # Keep draining so the decoder is never blocked
+                if self.pool: self.pool.release(item[1])
+                continue
+            try: self._encode(*item)
+            except Exception as e: self._error = e
+
+    def _encode(self, frame_index, frame, repeats):
+        frame = self._transform(frame)
+        t0 = _now() if self.timer else 0
+        self.written += _write_output_frame(self._out, frame, frame_index, self.progress, repeats)
+        if self.timer: self.timer.record('encode', t0)
+        if self.pool: self.pool.release(frame)
+
+
+def _process_video_multi(job, plan, progress=None, on_warning=None, timer=None):
+    """Writes the job's output, its renditions and its extracted frames from one decode.
+
+    Every frame any output needs is decoded once and handed to all of them;
+    frames none of them needs are grabbed through or seeked over. With
+    ``job.pipeline_workers`` > 0 each output video encodes on its own thread,
+    and the extraction uses its own writer threads. On failure all partial
+    output videos and the frames extracted so far are removed, and the
+    exception that stopped the pass is re-raised.
+    """
+    outputs = [(job.output_path, plan)] + list(plan.renditions)
+    extract_job, extract_plan = job.extract, plan.extract
+    pool = FramePool() if job.reuse_buffers else None
+    shared = _SharedFramePool(pool) if pool else None
+    cap = None
+    encoders = []
+    saver = None
+    try:
+        extract_frames_wanted = ()
+        if extract_plan is not None:
+            extract_frames_wanted = extract_plan.frames
+            if extract_frames_wanted is None:
+                extract_frames_wanted = _scan_extract_frames(extract_job, extract_plan, progress, timer)
+            transform = compile_filters(extract_plan.filters, shared, timer, shared_input=True) if extract_plan.filters else None
+            store = _open_frame_store(extract_job, extract_plan, extract_frames_wanted, extract_plan.total_video_frames)
+            dedup = _Deduplicator(extract_job) if extract_job.dedup is not None else None
+            saver = FrameSaver(store, extract_job.writer_workers, progress, on_warning, timer, shared, transform, dedup=dedup)
+        if progress: progress.set_total(sum(p.output_frame_count for _, p in outputs) + len(extract_frames_wanted))
+
+        cap = cv2.VideoCapture(job.input_path)
+        if not cap.isOpened(): raise IOError(f"Cannot open input: {job.input_path}")
+        for path, output_plan in outputs:
+            encoders.append(_OutputEncoder(path, output_plan, progress, timer, shared, job.pipeline_workers > 0))
+
+        position = 0
+        shape = None
+        previous = None
+        for frame_index in heapq.merge(range(plan.start_frame, plan.end_frame), extract_frames_wanted):
+            if frame_index == previous: continue
+            previous = frame_index
+            users = [(encoder, repeats) for encoder in encoders for repeats in (encoder.wants(frame_index),) if repeats]
+            save = _contains(extract_frames_wanted, frame_index)
+            if not users and not save: continue # Dropped by every frame rate: grabbed on the way to the next one
+
+            position = _advance_to(cap, position, frame_index, plan.frame_index, timer)
+            t0 = _now() if timer else 0
+            ret, frame = _read_frame(cap, pool, shape) if position is not None else (False, None)
+            if not ret:
+                print(f"Warning: Failed read at frame {frame_index}, stopping.")
+                if save: _notify(on_warning, 'error_extracting', f"Read failed at frame {frame_index}")
+                break
+            if timer: timer.record('decode', t0)
+            position += 1
+            shape = frame.shape
+            if shared: shared.share(frame, len(users) + save)
+            for encoder, repeats in users: encoder.submit(frame_index, frame, repeats)
+            if save: saver.save(frame_index, frame)
+
+        written = sum(encoder.close() for encoder in encoders)
+        extracted = saver.close() if saver else 0 # Re-raises a writer thread's error
+        for encoder in encoders: print(f"Wrote {encoder.written} frames to {encoder.output_path}")
+        return written + extracted
+    except Exception:
+        for encoder in encoders:
+            try: encoder.close()
+            except Exception: pass
+            try:
+                if os.path.exists(encoder.output_path): os.remove(encoder.output_path); print(f"Removed partial file: {encoder.output_path}")
+            except OSError as os_err: print(f"Could not remove output file {encoder.output_path}: {os_err}")
+        if saver: saver.discard()
+        raise
+    finally:
+        if cap and cap.isOpened(): cap.release()
+
+
+def _contains(ascending, value):
+    """``value in ascending`` by bisection, for lists as well as ranges."""
+    if isinstance(ascending, range): return value in ascending
+    i = bisect.bisect_left(ascending, value)
+    return i < len(ascending) and ascending[i] == value
+
+
+def _position(ascending, value):
+    """Index of ``value`` in ``ascending`` (which contains it), for lists as well as ranges."""
+    if isinstance(ascending, range): return ascending.index(value)
+    return bisect.bisect_left(ascending, value)
+
+
+# --- Preview ---
+
+class PreviewDecoder:
+    """Decodes downscaled frames of one video on a background thread, for scrubbing.
+
+    request() moves the cursor and returns at once. The worker decodes the
+    cursor frame first (only the latest request counts), reports it through
+    ``on_frame(frame_index)`` from its own thread, then prefetches the frames
+    after it until a new request arrives. Frames fitting in ``max_size`` are
+    kept in a bounded LRU cache that get() reads without blocking. Forward
+    moves are read or grabbed through like an extraction; backward and long
+    ones seek, exactly when ``index`` (a FrameIndex) is set.
+    """
+    def __init__(self, path, max_size=(320, 180), on_frame=None, index=None,
+                 cache_frames=PREVIEW_CACHE_FRAMES, prefetch=PREVIEW_PREFETCH):
+        self.path = path
+        self.max_size = max_size
+        self.on_frame = on_frame
+        self.index = index # May be set later, once the index is built
+        self.cache_frames = cache_frames
+        self.prefetch = prefetch
+        self.decoded_count = 0
+        self._cache = OrderedDict() # frame_index -> BGR frame, least recently used first
+        self._lock = threading.Lock()
+        self._wake = threading.Condition(self._lock)
+        self._wanted = None
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name='preview-decoder', daemon=True)
+        self._thread.start()
+
+    def get(self, frame_index):
+        """The cached preview of ``frame_index``, or None."""
+        with self._lock:
+            frame = self._cache.get(frame_index)
+            if frame is not None: self._cache.move_to_end(frame_index)
+            return frame
+
+    def request(self, frame_index):
+        """Moves the cursor to ``frame_index``. Returns its preview if cached; on_frame follows either way."""
+        frame = self.get(frame_index)
+        with self._lock:
+            self._wanted = frame_index
+            self._wake.notify()
+        return frame
+
+    def close(self):
+        """Stops the worker after its current frame; it releases the capture itself."""
+        with self._lock:
+            self._closed = True
+            self._wake.notify()
+
+    def _run(self):
+        cap = cv2.VideoCapture(self.path)
+        position = 0
+        try:
+            while True:
+                with self._lock:
+                    while self._wanted is None and not self._closed: self._wake.wait()
+                    if self._closed: return
+                    cursor, self._wanted = self._wanted, None
+                for target in range(cursor, cursor + self.prefetch + 1):
+                    if target > cursor and (self._wanted is not None or self._closed): break # Superseded
+                    if self.get(target) is None:
+                        position, frame = self._decode(cap, position, target)
+                        if frame is None: break # Past the end
+                        with self._lock:
+                            self._cache[target] = frame
+                            while len(self._cache) > self.cache_frames: self._cache.popitem(last=False)
+                    if target == cursor and self.on_frame: self.on_frame(target)
+        except Exception as e:
+            print(f"Preview decoding stopped: {e}")
+        finally:
+            cap.release()
+
+    def _decode(self, cap, position, target):
+        """(new position, downscaled frame ``target``), or (None, None) when it cannot be read."""
+        if position is None or target < position:
+            cap.set(cv2.CAP_PROP_POS_FRAMES, 0) # _advance_to only moves forward: restart, it seeks from there
+            position = 0
+        new_position = _advance_to(cap, position, target, self.index)
+        if new_position is None: return None, None # Position unknown: the next move restarts
+        ret, frame = cap.read()
+        if not ret: return None, None
+        self.decoded_count += 1
+        height, width = frame.shape[:2]
+        scale = min(self.max_size[0] / width, self.max_size[1] / height, 1.0)
+        if scale < 1.0:
+            size = (max(1, int(width * scale)), max(1, int(height * scale)))
+            frame = cv2.resize(frame, size, interpolation=cv2.INTER_AREA)
+        return new_position + 1, frame
+
+
+def thumbnail_frames(total_frames, count, index=None):
+    """Frame numbers of ``count`` evenly spaced thumbnails (the middle of each slice).
+
+    With a FrameIndex each moves to the nearest keyframe, which decodes
+    without any frames before it; duplicates are kept so the strip stays
+    evenly laid out.
+    """
+    frames = [min(total_frames - 1, int((i + 0.5) * total_frames / count)) for i in range(count)] if total_frames > 0 else []
+    if index is None or len(index.keyframes) == 0: return frames
+    nearest = []
+    for frame in frames:
+        pos = int(np.searchsorted(index.keyframes, frame))
+        candidates = index.keyframes[max(0, pos - 1):pos + 1]
+        nearest.append(int(candidates[np.argmin(np.abs(candidates - frame))]))
+    return nearest
+
+
+def thumbnail_cache_path(path, count, height):
+    """Cache file of the ``count`` x ``height`` thumbnail strip of this version (size, mtime) of ``path``."""
+    key = '|'.join(str(v) for v in file_signature(path) + (count, height))
+    return os.path.join(default_cache_dir(), 'thumbnails', hashlib.sha1(key.encode('utf-8')).hexdigest() + '.jpg')
+
+
+def thumbnail_strip(path, count, height, index=None, on_thumbnail=None, stop=None):
+    """``count`` thumbnails ``height`` pixels high, evenly spread over ``path``.
+
+    Served from the on-disk cache when this version of the file was done
+    before; otherwise each thumbnail is decoded after a seek (short gaps are
+    grabbed through) and only its frame is retrieve()d. ``on_thumbnail(i,
+    image)`` is called as each one is ready, also for cached strips, so a
+    caller on another thread can fill in progressively. ``stop`` is an
+    optional threading.Event that abandons the work. Returns the list, with
+    None for thumbnails that could not be read; complete strips are cached.
+    """
+    cache_path = thumbnail_cache_path(path, count, height)
+    strip = cv2.imread(cache_path) if os.path.exists(cache_path) else None
+    if strip is not None and strip.shape[0] == height and strip.shape[1] % count == 0:
+        thumbnails = np.split(strip, count, axis=1)
+        if on_thumbnail:
+            for i, thumbnail in enumerate(thumbnails): on_thumbnail(i, thumbnail)
+        return thumbnails
+
+    info = probe_video(path)
+    frames = thumbnail_frames(index.frame_count if index is not None else info.total_frames, count, index)
+    thumbnails = [None] * len(frames)
+    cap = cv2.VideoCapture(path)
+    try:
+        if not cap.isOpened(): raise IOError(f"Cannot open input: {path}")
+        position = 0
+        for i, frame_index in enumerate(frames):
+            if stop is not None and stop.is_set(): return thumbnails
+            if i and frame_index == frames[i - 1]:
+                thumbnails[i] = thumbnails[i - 1]
+            else:
+                position = _advance_to(cap, position, frame_index, index) # Frames never decrease
+                ret = position is not None and cap.grab()
+                ret, frame = cap.retrieve() if ret else (False, None)
+                if not ret: break
+                position += 1
+                width = max(1, round(frame.shape[1] * height / frame.shape[0]))
+                thumbnails[i] = cv2.resize(frame, (width, height), interpolation=cv2.INTER_AREA)
+            if on_thumbnail and thumbnails[i] is not None: on_thumbnail(i, thumbnails[i])
+    finally:
+        cap.release()
+
+    if thumbnails and all(t is not None for t in thumbnails):
+        try:
+            os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+            tmp_path = f"{cache_path}.{os.getpid()}.{threading.get_ident()}.tmp.jpg" # Unique per writer thread
+            cv2.imwrite(tmp_path, np.hstack(thumbnails), [cv2.IMWRITE_JPEG_QUALITY, THUMBNAIL_CACHE_QUALITY])
+            os.replace(tmp_path, cache_path)
+        except (OSError, cv2.error) as e:
+            print(f"Warning: Could not cache thumbnails in {cache_path}: {e}")
+    return thumbnails
+
+
+# --- Batch Queue ---
+
+BATCH_STATUSES = ('queued', 'running', 'done', 'failed', 'cancelled')
+
+
+def expand_inputs(patterns):
+    """Turns command-line style inputs into a list of files.
+
+    Each entry is a path, a glob pattern (``clips/*.mp4``, ``**`` recurses) or
+    ``@list.txt`` naming a file with one entry per line (blank lines and
+    ``#`` comments skipped). Order is kept and duplicates dropped.
+    """
+    paths = []
+    for pattern in patterns:
+        if pattern.startswith('@'):
+            with open(pattern[1:], encoding='utf-8') as f:
+                lines = [line.strip() for line in f]
+            found = expand_inputs([line for line in lines if line and not line.startswith('#')])
+        elif any(c in pattern for c in '*?['):
+            found = sorted(p for p in glob.glob(pattern, recursive=True) if os.path.isfile(p))
+        else:
+            found = [pattern]
+        paths.extend(p for p in found if p not in paths)
+    return paths
+
+
+def thread_budget(concurrent_jobs, cpus=None):
+    """Splits the CPUs between ``concurrent_jobs`` jobs running side by side.
+
+    Returns ``(workers, cv_threads)``: the cap on each job's own worker
+    threads (pipeline transform or image writer threads, 0 = run
+    sequentially) and the size of OpenCV's internal thread pool, which is
+    shared by the whole process.
+    """
+    cpus = cpus or os.cpu_count() or 1
+    share = max(1, cpus // max(1, concurrent_jobs))
+    return min(4, share - 1), share
+
+
+def _budgeted_job(job, workers, concurrent_jobs):
+    """``job`` with its worker counts capped to one share of the thread budget."""
+    if isinstance(job, ExtractJob):
+        return replace(job, writer_workers=min(job.writer_workers, workers))
+    if job.extract is not None: job = replace(job, extract=_budgeted_job(job.extract, workers, concurrent_jobs))
+    return replace(job, pipeline_workers=min(job.pipeline_workers, workers),
+                   segment_workers=job.segment_workers if concurrent_jobs == 1 else 0) # The batch is the parallelism
+
+
+def run_job(job, progress=None, on_warning=None, cache=None, use_index=False, timer=None):
+    """Probes, plans and runs one ProcessJob or ExtractJob. Returns the frames written."""
+    info = probe_video(job.input_path, cache)
+    index = load_frame_index(job.input_path, build=True) if use_index else None
+    if isinstance(job, ExtractJob):
+        plan = plan_frame_extraction(job, info, index)
+        if plan.end_capped: _notify(on_warning, 'error_invalid_frame_range', f"End frame capped to {plan.end_frame}")
+        return extract_frames(job, plan, info.total_frames, progress, on_warning, timer)
+    plan = plan_video_processing(job, info, index)
+    if plan.end_capped: _notify(on_warning, 'warning_end_time_capped', format_time(info.duration))
+    if plan.extract and plan.extract.end_capped:
+        _notify(on_warning, 'error_invalid_frame_range', f"End frame capped to {plan.extract.end_frame}")
+    return process_video(job, plan, progress, on_warning, timer)
+
+
+@dataclass(eq=False)
+class BatchItem:
+    """One job of a JobQueue and its live status."""
+    job: object # ProcessJob or ExtractJob
+    status: str = 'queued' # One of BATCH_STATUSES
+    progress: ProgressTracker = field(default_factory=ProgressTracker)
+    result: int = 0 # Frames written
+    error: Optional[Exception] = None
+    warnings: list = field(default_factory=list) # (key, *params) tuples
+
+
+class JobQueue:
+    """Runs many jobs, at most ``max_concurrent`` of them at a time.
+
+    While the queue runs, OpenCV's thread pool and each job's worker threads
+    are sized by thread_budget() so N parallel jobs share the CPUs instead of
+    each one sizing itself for the whole machine. ``on_change(item)`` is
+    called from the worker threads whenever an item changes status. A
+    StageTimer given as ``timer`` collects the stages of all the jobs.
+    """
+    def __init__(self, max_concurrent=1, cache=None, use_index=False, on_change=None, timer=None):
+        self.max_concurrent = max(1, max_concurrent)
+        self.cache = cache
+        self.use_index = use_index
+        self.on_change = on_change
+        self.timer = timer
+        self.items = []
+        self._cancelled = threading.Event()
+        self._executor = None
+        self._futures = []
+        self._saved_cv_threads = None
+
+    def add(self, job):
+        item = BatchItem(job)
+        self.items.append(item)
+        return item
+
+    def start(self):
+        """Starts the queued items in the background; wait() collects them."""
+        workers, cv_threads = thread_budget(self.max_concurrent)
+        self._saved_cv_threads = cv2.getNumThreads()
+        cv2.setNumThreads(cv_threads)
+        self._executor = ThreadPoolExecutor(self.max_concurrent, thread_name_prefix='cropvideo-job')
+        self._futures = [self._executor.submit(self._run, item, workers)
+                         for item in self.items if item.status == 'queued']
+
+    def wait(self):
+        try:
+            for future in self._futures: future.result()
+        finally:
+            self._executor.shutdown()
+            cv2.setNumThreads(self._saved_cv_threads)
+        return self.items
+
+    def run(self):
+        self.start()
+        return self.wait()
+
+    def cancel(self):
+        """Items not started yet are cancelled; running ones finish."""
+        self._cancelled.set()
+
+    def counts(self):
+        return {status: sum(item.status == status for item in self.items) for status in BATCH_STATUSES}
+
+    def _set_status(self, item, status):
+        item.status = status
+        _notify(self.on_change, item)
+
+    def _run(self, item, workers):
+        if self._cancelled.is_set():
+            self._set_status(item, 'cancelled'); return
+        self._set_status(item, 'running')
+        def on_warning(key, *params): item.warnings.append((key, *params))
+        try:
+            job = _budgeted_job(item.job, workers, self.max_concurrent)
+            item.result = run_job(job, item.progress, on_warning, self.cache, self.use_index, self.timer)
+            status = 'done'
+        except Exception as e:
+            print(f"Batch job failed for {item.job.input_path}: {e}")
+            item.error = e
+            status = 'failed'
+        item.progress.finish()
+        self._set_status(item, status)